@@ -3,14 +3,20 @@ Email Redirection Tool - Flask Application
 View existing email forwarding for Namecheap domains
 """
 
-from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_from_directory, flash, get_flashed_messages
+from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_from_directory, flash, get_flashed_messages, Response, stream_with_context
 from flask_cors import CORS
+import hashlib
 import json
 import os
+import threading
 from datetime import datetime
 from functools import wraps
-from namecheap_client import EmailRedirectionManager, NamecheapAPIClient
+from namecheap_client import EmailRedirectionManager, NamecheapAPIClient, rate_limit_state, get_thread_api_calls, get_account_rate_limit, share_request_counts
 from models import Database
+from jobs import JobRunner, payload_hash
+from scheduler import Scheduler
+from snapshot_writer import SnapshotWriter
+from dns_changes import add_records, remove_records, diff_records, is_noop, redirections_from_records
 import time
 app = Flask(__name__, static_folder='frontend/build/static', static_url_path='/static')
 app.secret_key = os.environ.get('SECRET_KEY', 'change-in-production-email-redirect-tool')
@@ -1548,6 +1554,11 @@ Click Intelligence	http://clickintelligence.co.uk/"
 
 # Initialize database
 db = Database()
+# Budgets and rate limit status count the API calls of the web workers and the job worker alike
+share_request_counts(db)
+
+# Sync jobs hand fetched host lists to this writer, which commits them in batches
+snapshot_writer = SnapshotWriter(db)
 
 # Lazy initialization - don't connect to Namecheap on startup
 email_manager = None
@@ -1565,6 +1576,8 @@ def get_email_manager():
             print(f"  NAMECHEAP_CLIENT_IP: {os.environ.get('NAMECHEAP_CLIENT_IP', 'Not set')}")
 
             email_manager = EmailRedirectionManager()
+            # Record sets written with setHosts are stored in the app database
+            email_manager.api_client.hosts_db = db
             print("✅ Email Redirection Manager initialized successfully")
         except Exception as e:
             print(f"❌ Error: Could not initialize Email Redirection Manager: {e}")
@@ -1574,6 +1587,35 @@ def get_email_manager():
             return None
     return email_manager
 
+# Email managers of the additional Namecheap accounts, keyed by account id
+account_managers = {}
+account_managers_lock = threading.Lock()
+
+def get_account_manager(account_id=None):
+    """Get the email manager of an account, None meaning the environment account"""
+    if account_id is None:
+        return get_email_manager()
+
+    with account_managers_lock:
+        if account_id not in account_managers:
+            account = db.get_account(account_id)
+            if not account:
+                raise Exception(f"Unknown Namecheap account {account_id}")
+            manager = EmailRedirectionManager(account)
+            manager.api_client.hosts_db = db
+            account_managers[account_id] = manager
+        return account_managers[account_id]
+
+def account_rate_limit(account_id=None):
+    """Get the rate limiter of an account without building its API client, None meaning the environment account"""
+    account = db.get_account(account_id) if account_id is not None else None
+    return get_account_rate_limit(account) if account else rate_limit_state
+
+def get_api_client(domain_name):
+    """Get the API client of the Namecheap account a domain belongs to"""
+    manager = get_account_manager(db.get_domain_accounts([domain_name])[domain_name])
+    return manager.api_client if manager else None
+
 # Authentication decorator
 def require_auth(f):
     @wraps(f)
@@ -1583,6 +1625,59 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Duplicate requests with the same Idempotency-Key within this window replay the first response
+IDEMPOTENCY_WINDOW = int(os.environ.get('IDEMPOTENCY_WINDOW_HOURS', 24)) * 3600
+
+# Idempotency decorator for endpoints that start quota-spending jobs
+def idempotent(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key') or (request.get_json(silent=True) or {}).get('idempotency_key')
+        if not key:
+            return f(*args, **kwargs)
+
+        endpoint = request.path
+        # Key order and whitespace of the JSON body do not make a different request
+        request_hash = hashlib.sha256(
+            json.dumps(request.get_json(silent=True), sort_keys=True).encode()
+        ).hexdigest()
+
+        earlier = db.claim_idempotency_key(endpoint, key, request_hash, IDEMPOTENCY_WINDOW)
+        if earlier is not None and earlier['response'] is None:
+            # A double click that arrived while the first request is still queuing its job
+            response = jsonify({"error": "A request with this idempotency key is still being processed"})
+            response.status_code = 409
+            response.headers['Retry-After'] = '1'
+            return response
+
+        if earlier is not None:
+            if earlier['request_hash'] != request_hash:
+                return jsonify({"error": "Idempotency key was already used for a different request"}), 422
+
+            body = json.loads(earlier['response'])
+            if isinstance(body, dict) and body.get("job_id"):
+                job = db.get_job(body["job_id"])
+                body["job_status"] = job['status'] if job else None
+            body["replayed"] = True
+            response = jsonify(body)
+            response.status_code = earlier['status_code']
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            db.release_idempotency_key(endpoint, key)
+            raise
+
+        if 200 <= response.status_code < 300 and response.is_json:
+            db.store_idempotent_response(endpoint, key, response.status_code, response.get_data(as_text=True))
+        else:
+            # Errors and conflicts are not remembered - a retry runs the request again
+            db.release_idempotency_key(endpoint, key)
+        return response
+    return decorated_function
+
 # Login template
 LOGIN_TEMPLATE = """
 <!DOCTYPE html>
@@ -1826,6 +1921,34 @@ bulk_dns_remove_progress = {
     "remove_criteria": None
 }
 
+# Global variable to track bulk redirect update progress
+bulk_update_progress = {
+    "status": "idle",
+    "processed": 0,
+    "total": 0,
+    "current_domain": "",
+    "successful": 0,
+    "errors": [],
+    "results": [],
+    "should_stop": False,
+    "paused_at_index": None,
+    "rate_limit_message": None,
+    "paused_domains": None,
+    "verify": False
+}
+
+# Global variable to track the domain inventory pass
+inventory_progress = {
+    "status": "idle",
+    "total": 0,
+    "new": [],
+    "removed": [],
+    "expired": [],
+    "hosts_sync_job_id": None,
+    "errors": [],
+    "should_stop": False
+}
+
 dns_check_progress = {
     "status": "idle",
     "processed": 0,
@@ -1840,11 +1963,107 @@ dns_check_progress = {
     "pause_until": None
 }
 
+# Global variable to track DNS history retention and compaction
+compaction_progress = {
+    "status": "idle",
+    "deleted_versions": 0,
+    "deleted_snapshots": 0,
+    "reclaimed_bytes": 0,
+    "errors": [],
+    "should_stop": False
+}
+
 import threading
 import time
 
-def background_sync_with_rate_limiting(resume_from_index=None):
-    """Background sync with improved rate limiting and error handling - uses upsert to preserve data"""
+# Background jobs run in this process (JOB_RUNNER=inline) or in `python -m worker` (JOB_RUNNER=external)
+job_runner = JobRunner(db, globals())
+
+def current_progress(progress_key):
+    """Get the latest progress dict for a job family, wherever its job is running"""
+    latest_job = db.get_latest_job(progress_key)
+    if not latest_job or not latest_job['progress']:
+        return globals()[progress_key]
+
+    # Only the process executing the job keeps its dict current - a web process that
+    # merely queued it for the worker has to read the mirrored progress
+    return job_runner.running_progress(latest_job['id']) or latest_job['progress']
+
+def job_in_progress(progress_key):
+    """Whether a job of the family is queued or running - a queued job stays "starting" until a worker claims it"""
+    return db.has_unfinished_job(progress_key, job_runner.heartbeat_timeout)
+
+def new_sync_progress(domains):
+    """Fresh sync_progress for a sync of the given domains"""
+    return {
+        "status": "starting",
+        "processed": 0,
+        "total": len(domains),
+        "current_domain": "",
+        "domains_added": 0,
+        "domains_updated": 0,
+        "errors": [],
+        "should_stop": False,
+        "paused_at_index": None,
+        "rate_limit_message": None,
+        "paused_domains": domains
+    }
+
+def skip_unmanaged_domains(items, progress, domain_of=lambda item: item):
+    """
+    Drop expired and non-Namecheap-DNS domains from a job's work list before any API call
+
+    Skipped domains are reported in progress["skipped"] instead of being retried,
+    and the progress total / resume list are switched to the remaining items.
+    """
+    unmanaged = db.get_unmanaged_domains([domain_of(item) for item in items])
+    if not unmanaged:
+        return items
+
+    remaining = []
+    skipped = progress.setdefault("skipped", [])
+    for item in items:
+        domain_name = domain_of(item)
+        if domain_name in unmanaged:
+            skipped.append({"domain": domain_name, "reason": unmanaged[domain_name]})
+        else:
+            remaining.append(item)
+
+    print(f"⏭️ Skipping {len(items) - len(remaining)} expired or externally hosted domains")
+    progress["total"] = len(remaining)
+    progress["paused_domains"] = remaining
+    return remaining
+
+def request_job_stop(progress):
+    """Ask the job reporting into a progress dict to stop"""
+    progress["should_stop"] = True
+    if progress.get("job_id"):
+        db.request_job_stop(progress["job_id"])
+
+# Incremental sync freshness policy - domains synced more recently than this are skipped
+SYNC_MAX_AGE = int(os.environ.get('SYNC_MAX_AGE_HOURS', 24)) * 3600
+SYNC_ISSUES_MAX_AGE = int(os.environ.get('SYNC_ISSUES_MAX_AGE_HOURS', 6)) * 3600
+
+
+def sync_snapshot_failed(progress):
+    """Snapshot writer on_error callback recording failed domains in the progress of the submitting job
+
+    The callback runs on the writer thread, possibly after the global sync_progress
+    has been rebound to a later job, so the job's own progress dict is bound here.
+    """
+    def on_error(domain_name, error):
+        progress["errors"].append(f"{domain_name}: Database error - {str(error)}")
+        db.add_or_update_domain(domain_name)
+        db.update_domain_sync_status(domain_name, 'not_synced')
+
+    return on_error
+
+def background_sync_with_rate_limiting(resume_from_index=None, incremental=False):
+    """Background sync with improved rate limiting and error handling - uses upsert to preserve data
+
+    With incremental=True only domains that are stale under the freshness policy are
+    refetched, most urgent first.
+    """
     global sync_progress
 
     try:
@@ -1867,7 +2086,9 @@ def background_sync_with_rate_limiting(resume_from_index=None):
 
             while retry_count < max_retries:
                 try:
-                    namecheap_domains = get_email_manager().get_all_domains()
+                    # getList metadata is stored on the way, so expired/external domains can be skipped
+                    inventory, _ = fetch_account_inventories()
+                    namecheap_domains = [domain['name'] for domain in inventory]
                     if namecheap_domains:
                         break
                     retry_count += 1
@@ -1885,6 +2106,17 @@ def background_sync_with_rate_limiting(resume_from_index=None):
                 sync_progress["error"] = "No domains found in Namecheap after retries"
                 return
 
+            namecheap_domains = skip_unmanaged_domains(namecheap_domains, sync_progress)
+
+            if incremental:
+                stale_domains = db.get_domains_needing_sync(namecheap_domains, SYNC_MAX_AGE, SYNC_ISSUES_MAX_AGE)
+                sync_progress["skipped_fresh"] = len(namecheap_domains) - len(stale_domains)
+                print(f"🔄 Incremental sync: {len(stale_domains)} stale domains, {sync_progress['skipped_fresh']} still fresh")
+                namecheap_domains = stale_domains
+
+            # Resume and restart recovery index into exactly the list iterated below
+            sync_progress["paused_domains"] = namecheap_domains
+            sync_progress["total"] = len(namecheap_domains)
             start_index = 0
         
         sync_progress["total"] = len(namecheap_domains)
@@ -1905,18 +2137,12 @@ def background_sync_with_rate_limiting(resume_from_index=None):
             try:
                 print(f"Processing {i}/{sync_progress['total']}: {domain_name}")
 
-                # Add or update domain (existing domains keep their client assignments in DB)
-                try:
-                    is_existing = domain_name in existing_domain_names
-                    db.add_or_update_domain(domain_name)
-                    if is_existing:
-                        sync_progress["domains_updated"] += 1
-                    else:
-                        sync_progress["domains_added"] += 1
-                except Exception as domain_error:
-                    print(f"⚠️ Error adding domain {domain_name}: {domain_error}")
-                    sync_progress["errors"].append(f"{domain_name}: Database error - {str(domain_error)}")
-                
+                # Existing domains keep their client assignments in DB
+                if domain_name in existing_domain_names:
+                    sync_progress["domains_updated"] += 1
+                else:
+                    sync_progress["domains_added"] += 1
+
                 # Get redirections and DNS records with retry logic for rate limits
                 redirections_fetched = False
                 redirect_retry = 0
@@ -1925,37 +2151,14 @@ def background_sync_with_rate_limiting(resume_from_index=None):
                 while redirect_retry < max_redirect_retries and not redirections_fetched:
                     try:
                         # Fetch all DNS records (includes redirections, TXT, MX, etc.)
-                        all_dns_records = get_email_manager().api_client._get_all_hosts(domain_name)
+                        all_dns_records = get_api_client(domain_name)._get_all_hosts(domain_name, raise_errors=True)
                         redirections_fetched = True
 
+                        # Domain, DNS records, redirections, DNS issues and sync status, committed in batches
+                        snapshot_writer.submit(domain_name, all_dns_records or [], on_error=sync_snapshot_failed(sync_progress))
                         if all_dns_records:
-                            # Store all DNS records in database
-                            db.backup_dns_records(domain_name, all_dns_records)
-                            print(f"  📋 Stored {len(all_dns_records)} DNS records for {domain_name}")
-
-                            # Extract URL redirections from DNS records
-                            redirections = []
-                            for record in all_dns_records:
-                                if isinstance(record, dict):
-                                    record_type = record.get('Type', '').upper()
-                                    if record_type in ['URL', 'URL301', 'URL302', 'REDIRECT']:
-                                        redirections.append({
-                                            'type': 'URL Redirect (301)' if record_type == 'URL301' else 'URL Redirect',
-                                            'target': record.get('Address', ''),
-                                            'name': record.get('Name', '@')
-                                        })
-
-                            if redirections:
-                                db.update_redirections(domain_name, redirections)
-                                print(f"  ✅ Added {len(redirections)} redirections for {domain_name}")
-
-                            # Check and update DNS issues
-                            dns_issues = db.check_dns_records_for_domain(domain_name)
-                            db.update_domain_dns_issues(domain_name, dns_issues)
-
-                            db.update_domain_sync_status(domain_name, 'synced')
+                            print(f"  📋 Queued {len(all_dns_records)} DNS records and {len(redirections_from_records(all_dns_records))} redirections for {domain_name}")
                         else:
-                            db.update_domain_sync_status(domain_name, 'synced')
                             print(f"  ℹ️ No DNS records found for {domain_name}")
 
                     except Exception as redirect_error:
@@ -1988,6 +2191,7 @@ def background_sync_with_rate_limiting(resume_from_index=None):
                                 return  # Exit the sync function
                         else:
                             print(f"  ⚠️ Error getting redirections for {domain_name}: {redirect_error}")
+                            db.add_or_update_domain(domain_name)
                             db.update_domain_sync_status(domain_name, 'not_synced')
                             sync_progress["errors"].append(f"{domain_name}: {str(redirect_error)}")
                             break
@@ -2020,6 +2224,8 @@ def background_sync_with_rate_limiting(resume_from_index=None):
                 
                 continue
         
+        # Report completion only once every fetched host list is committed
+        snapshot_writer.flush()
         sync_progress["status"] = "completed"
         sync_progress["current_domain"] = ""
         print(f"✅ Background sync completed: {sync_progress['domains_added']} added, {sync_progress['domains_updated']} updated, {len(sync_progress['errors'])} errors")
@@ -2028,6 +2234,125 @@ def background_sync_with_rate_limiting(resume_from_index=None):
         print(f"❌ Background sync failed: {e}")
         sync_progress["status"] = "error"
         sync_progress["error"] = str(e)
+    finally:
+        # Stopped, paused and failed syncs keep what they fetched
+        snapshot_writer.flush()
+
+def fetch_account_inventories():
+    """
+    List the domains of every Namecheap account concurrently and store each inventory
+
+    Returns:
+        Tuple of the combined inventory and the merged new/removed/expired changes
+
+    Raises:
+        Exception: If any account's domain list could not be fetched completely
+    """
+    account_ids = [None] + [account['id'] for account in db.get_accounts()]
+    inventories = {}
+    failures = {}
+
+    def fetch(account_id):
+        try:
+            inventories[account_id] = get_account_manager(account_id).get_domain_inventory()
+        except Exception as e:
+            failures[account_id] = e
+
+    threads = [threading.Thread(target=fetch, args=(account_id,)) for account_id in account_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if failures:
+        account_id, error = next(iter(failures.items()))
+        raise Exception(f"Domain list of account {account_id or 'default'} failed: {error}")
+
+    inventory = []
+    changes = {'new': [], 'removed': [], 'expired': []}
+    # Additional accounts first, so domains moved off the default account are tagged before its diff
+    for account_id in account_ids[1:] + [None]:
+        inventory.extend(inventories[account_id])
+        for key, domain_names in db.apply_domain_inventory(inventories[account_id], account_id).items():
+            changes[key].extend(domain_names)
+
+    return inventory, changes
+
+def background_inventory_sync(queue_hosts_sync=True):
+    """Background inventory pass - getList only, stores domain metadata and diffs it against the last pass"""
+    global inventory_progress, sync_progress
+
+    try:
+        inventory_progress["status"] = "running"
+        print("📒 Starting domain inventory pass...")
+
+        inventory, changes = fetch_account_inventories()
+        inventory_progress["total"] = len(inventory)
+        inventory_progress.update(changes)
+        print(f"📒 Inventory: {len(inventory)} domains, {len(changes['new'])} new, {len(changes['removed'])} removed, {len(changes['expired'])} newly expired")
+
+        # Only new domains need their hosts fetched - known ones are kept fresh by the incremental sync
+        if queue_hosts_sync and changes['new']:
+            if job_in_progress("sync_progress"):
+                inventory_progress["errors"].append("Hosts sync for new domains skipped: a sync is already running")
+            else:
+                sync_progress = new_sync_progress(changes['new'])
+                inventory_progress["hosts_sync_job_id"] = job_runner.submit(
+                    'sync_selected', args=(changes['new'],), progress=sync_progress
+                )
+
+        inventory_progress["status"] = "completed"
+
+    except Exception as e:
+        print(f"❌ Inventory pass failed: {e}")
+        inventory_progress["status"] = "error"
+        inventory_progress["error"] = str(e)
+
+@app.route('/api/sync-inventory', methods=['POST'])
+@require_auth
+def sync_inventory():
+    """Start a domain inventory pass (getList only) that reports new, removed and expired domains"""
+    global inventory_progress
+
+    try:
+        if job_in_progress("inventory_progress"):
+            return jsonify({"error": "Inventory pass already in progress"}), 409
+
+        data = request.get_json(silent=True) or {}
+        queue_hosts_sync = bool(data.get('queue_hosts_sync', True))
+
+        inventory_progress = {
+            "status": "starting",
+            "total": 0,
+            "new": [],
+            "removed": [],
+            "expired": [],
+            "hosts_sync_job_id": None,
+            "errors": [],
+            "should_stop": False
+        }
+        job_id = job_runner.submit('inventory', args=(queue_hosts_sync,), progress=inventory_progress)
+
+        return jsonify({"status": "started", "job_id": job_id})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/inventory-progress', methods=['GET'])
+def get_inventory_progress():
+    """Get the result of the latest domain inventory pass"""
+    inventory_progress = current_progress("inventory_progress")
+
+    return jsonify({
+        "status": inventory_progress["status"],
+        "total": inventory_progress["total"],
+        "new": inventory_progress["new"],
+        "removed": inventory_progress["removed"],
+        "expired": inventory_progress["expired"],
+        "hosts_sync_job_id": inventory_progress.get("hosts_sync_job_id"),
+        "errors": inventory_progress["errors"],
+        "error": inventory_progress.get("error")
+    })
 
 @app.route('/api/sync-all-domains', methods=['POST'])
 def sync_all_domains():
@@ -2040,24 +2365,33 @@ def sync_all_domains():
             return jsonify({"error": "Email manager not initialized"}), 503
         
         # Check if sync is already running
-        if sync_progress["status"] == "running":
+        if job_in_progress("sync_progress"):
             return jsonify({"error": "Sync already in progress"}), 409
         
-        # Get all domains from Namecheap
-        namecheap_domains = get_email_manager().get_all_domains()
-        
-        if not namecheap_domains:
-            return jsonify({"error": "No domains found in Namecheap"}), 404
-        
-        # Start background sync task
-        sync_thread = threading.Thread(target=background_sync_task, args=(namecheap_domains,))
-        sync_thread.daemon = True
-        sync_thread.start()
+        # Incremental by default, {"mode": "full"} refetches every domain
+        data = request.get_json(silent=True) or {}
+        incremental = data.get('mode', 'incremental') != 'full'
+
+        # Queue background sync job - it lists every account and sets total after the inventory pass
+        sync_progress = {
+            "status": "starting",
+            "processed": 0,
+            "total": 0,
+            "current_domain": "",
+            "domains_added": 0,
+            "domains_updated": 0,
+            "errors": [],
+            "should_stop": False,
+            "paused_at_index": None,
+            "rate_limit_message": None,
+            "paused_domains": None
+        }
+        job_id = job_runner.submit('sync_all', args=(None, incremental), progress=sync_progress)
         
         return jsonify({
             "status": "started",
-            "total_domains": len(namecheap_domains),
-            "processing_count": len(namecheap_domains),
+            "job_id": job_id,
+            "mode": "incremental" if incremental else "full",
             "message": "Domain sync started in background"
         })
         
@@ -2098,7 +2432,7 @@ def add_domain_redirection():
 @app.route('/api/sync-domains-progress', methods=['GET'])
 def sync_domains_progress():
     """Get real-time progress of domain sync"""
-    global sync_progress
+    sync_progress = current_progress("sync_progress")
 
     return jsonify({
         "status": sync_progress["status"],
@@ -2107,16 +2441,18 @@ def sync_domains_progress():
         "current_domain": sync_progress["current_domain"],
         "domains_added": sync_progress["domains_added"],
         "domains_updated": sync_progress["domains_updated"],
+        "skipped_fresh": sync_progress.get("skipped_fresh", 0),
         "errors": sync_progress["errors"][-5:] if sync_progress["errors"] else [],  # Last 5 errors
         "total_errors": len(sync_progress["errors"]) if sync_progress["errors"] else 0,
         "rate_limit_message": sync_progress.get("rate_limit_message"),
-        "paused_at_index": sync_progress.get("paused_at_index")
+        "paused_at_index": sync_progress.get("paused_at_index"),
+        "skipped": sync_progress.get("skipped") or []
     })
 
 @app.route('/api/sync-errors', methods=['GET'])
 def get_sync_errors():
     """Get detailed sync errors"""
-    global sync_progress
+    sync_progress = current_progress("sync_progress")
 
     return jsonify({
         "errors": sync_progress["errors"] if sync_progress["errors"] else [],
@@ -2168,7 +2504,7 @@ def debug_dns_records(domain_name):
         print(f"🔍 DEBUGGING DNS for domain: {domain_name}")
 
         # Get all DNS records
-        dns_records = get_email_manager().api_client._get_all_hosts(domain_name)
+        dns_records = get_api_client(domain_name)._get_all_hosts(domain_name)
 
         print(f"📋 Retrieved {len(dns_records)} DNS records")
 
@@ -2275,10 +2611,10 @@ def restore_database():
 @app.route('/api/stop-sync', methods=['POST'])
 def stop_sync():
     """Stop the current sync process"""
-    global sync_progress
+    sync_progress = current_progress("sync_progress")
 
     if sync_progress["status"] == "running":
-        sync_progress["should_stop"] = True
+        request_job_stop(sync_progress)
         return jsonify({"status": "stopping"})
     else:
         return jsonify({"error": "No sync in progress"}), 400
@@ -2287,6 +2623,7 @@ def stop_sync():
 def resume_sync():
     """Resume a paused sync process"""
     global sync_progress
+    sync_progress = current_progress("sync_progress")
 
     if sync_progress["status"] != "rate_limited":
         return jsonify({"error": "No paused sync to resume"}), 400
@@ -2306,26 +2643,26 @@ def resume_sync():
         paused_domains = sync_progress.get("paused_domains")
         if paused_domains and len(paused_domains) != len(sync_progress.get("all_domains", [])):
             # This is a selected domains sync - use the specialized function
-            sync_thread = threading.Thread(
-                target=background_sync_selected_domains,
-                args=(paused_domains, sync_progress["paused_at_index"])
+            job_id = job_runner.submit(
+                'sync_selected',
+                args=(paused_domains, sync_progress["paused_at_index"]),
+                progress=sync_progress
             )
         else:
             # This is a full sync - use the main sync function
-            sync_thread = threading.Thread(
-                target=background_sync_with_rate_limiting,
-                args=(sync_progress["paused_at_index"],)
+            job_id = job_runner.submit(
+                'sync_all',
+                args=(sync_progress["paused_at_index"],),
+                progress=sync_progress
             )
 
-        sync_thread.daemon = True
-        sync_thread.start()
-
-        return jsonify({"status": "resumed", "message": "Sync resumed successfully"})
+        return jsonify({"status": "resumed", "job_id": job_id, "message": "Sync resumed successfully"})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/sync-selected-domains', methods=['POST'])
+@idempotent
 def sync_selected_domains():
     """Sync only selected domains"""
     global sync_progress
@@ -2338,7 +2675,7 @@ def sync_selected_domains():
             return jsonify({"error": "No domains selected"}), 400
 
         # Check if sync is already running
-        if sync_progress["status"] == "running":
+        if job_in_progress("sync_progress"):
             return jsonify({"error": "Sync already in progress"}), 409
 
         # Reset progress
@@ -2356,15 +2693,10 @@ def sync_selected_domains():
             "paused_domains": selected_domains
         }
 
-        # Start background sync for selected domains
-        def sync_selected():
-            background_sync_selected_domains(selected_domains)
-
-        thread = threading.Thread(target=sync_selected)
-        thread.daemon = True
-        thread.start()
+        # Queue background sync for selected domains
+        job_id = job_runner.submit('sync_selected', args=(selected_domains,), progress=sync_progress)
 
-        return jsonify({"status": "started", "total": len(selected_domains)})
+        return jsonify({"status": "started", "job_id": job_id, "total": len(selected_domains)})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -2376,6 +2708,8 @@ def background_sync_selected_domains(selected_domains, resume_from_index=None):
     try:
         sync_progress["status"] = "running"
         start_index = resume_from_index if resume_from_index is not None else 0
+        if resume_from_index is None:
+            selected_domains = skip_unmanaged_domains(selected_domains, sync_progress)
 
         for i, domain_name in enumerate(selected_domains[start_index:], start_index + 1):
             # Check if sync should stop
@@ -2396,41 +2730,18 @@ def background_sync_selected_domains(selected_domains, resume_from_index=None):
                 while retry < max_retries and not synced:
                     try:
                         # Fetch all DNS records (includes redirections, TXT, MX, etc.)
-                        all_dns_records = get_email_manager().api_client._get_all_hosts(domain_name)
+                        all_dns_records = get_api_client(domain_name)._get_all_hosts(domain_name, raise_errors=True)
 
                         if all_dns_records is not None and len(all_dns_records) > 0:
-                            # Update domain in database
-                            db.add_or_update_domain(domain_name)
+                            # Domain, DNS records, redirections, DNS issues and sync status, committed in batches
+                            snapshot_writer.submit(domain_name, all_dns_records, on_error=sync_snapshot_failed(sync_progress))
+                            print(f"  📋 Queued {len(all_dns_records)} DNS records and {len(redirections_from_records(all_dns_records))} redirections for {domain_name}")
 
-                            # Store all DNS records in database
-                            db.backup_dns_records(domain_name, all_dns_records)
-                            print(f"  📋 Stored {len(all_dns_records)} DNS records for {domain_name}")
-
-                            # Extract URL redirections from DNS records
-                            redirections = []
-                            for record in all_dns_records:
-                                if isinstance(record, dict):
-                                    record_type = record.get('Type', '').upper()
-                                    if record_type in ['URL', 'URL301', 'URL302', 'REDIRECT']:
-                                        redirections.append({
-                                            'type': 'URL Redirect (301)' if record_type == 'URL301' else 'URL Redirect',
-                                            'target': record.get('Address', ''),
-                                            'name': record.get('Name', '@')
-                                        })
-
-                            if redirections:
-                                db.update_redirections(domain_name, redirections)
-                                print(f"  ✅ Added {len(redirections)} redirections for {domain_name}")
-
-                            # Check and update DNS issues
-                            dns_issues = db.check_dns_records_for_domain(domain_name)
-                            db.update_domain_dns_issues(domain_name, dns_issues)
-
-                            db.update_domain_sync_status(domain_name, 'synced')
                             sync_progress["domains_updated"] += 1
                             synced = True
                         else:
                             db.update_domain_sync_status(domain_name, 'not_synced')
+                            break
 
                     except Exception as e:
                         retry += 1
@@ -2471,6 +2782,8 @@ def background_sync_selected_domains(selected_domains, resume_from_index=None):
             except Exception as e:
                 sync_progress["errors"].append(f"{domain_name}: {str(e)}")
 
+        # Report completion only once every fetched host list is committed
+        snapshot_writer.flush()
         sync_progress["status"] = "completed"
         sync_progress["current_domain"] = ""
 
@@ -2478,6 +2791,9 @@ def background_sync_selected_domains(selected_domains, resume_from_index=None):
         print(f"Error in background sync: {e}")
         sync_progress["status"] = "error"
         sync_progress["errors"].append(f"Sync error: {str(e)}")
+    finally:
+        # Stopped, paused and failed syncs keep what they fetched
+        snapshot_writer.flush()
 
 @app.route('/api/sync-single-domain', methods=['POST'])
 @require_auth
@@ -2490,42 +2806,17 @@ def sync_single_domain():
         if not domain_name:
             return jsonify({"error": "Domain name required"}), 400
         
-        # Add/update domain in database
-        domain_number = db.add_or_update_domain(domain_name)
-
         # Fetch all DNS records (includes redirections, TXT, MX, etc.)
-        all_dns_records = get_email_manager().api_client._get_all_hosts(domain_name)
-
-        # Store all DNS records in database
-        if all_dns_records:
-            db.backup_dns_records(domain_name, all_dns_records)
-
-            # Extract URL redirections from DNS records
-            redirections = []
-            for record in all_dns_records:
-                if isinstance(record, dict):
-                    record_type = record.get('Type', '').upper()
-                    if record_type in ['URL', 'URL301', 'URL302', 'REDIRECT']:
-                        redirections.append({
-                            'type': 'URL Redirect (301)' if record_type == 'URL301' else 'URL Redirect',
-                            'target': record.get('Address', ''),
-                            'name': record.get('Name', '@')
-                        })
-
-            # Update redirections in database
-            db.update_redirections(domain_name, redirections)
-
-            # Check and update DNS issues
-            dns_issues = db.check_dns_records_for_domain(domain_name)
-            db.update_domain_dns_issues(domain_name, dns_issues)
-        else:
-            redirections = []
+        all_dns_records = get_api_client(domain_name)._get_all_hosts(domain_name, raise_errors=True)
+
+        # Domain, DNS records, redirections, DNS issues and sync status in one transaction
+        snapshot = db.apply_domain_snapshot(domain_name, all_dns_records or [])
 
         return jsonify({
             "status": "success",
             "domain_name": domain_name,
-            "domain_number": domain_number,
-            "redirections_count": len(redirections),
+            "domain_number": snapshot["domain_number"],
+            "redirections_count": snapshot["redirections"],
             "dns_records_count": len(all_dns_records) if all_dns_records else 0
         })
         
@@ -2633,25 +2924,105 @@ def update_domain():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# Largest page the domain list endpoint returns per request
+MAX_DOMAINS_PAGE_SIZE = int(os.environ.get('MAX_DOMAINS_PAGE_SIZE', 500))
+
 @app.route('/api/domains-from-db', methods=['GET'])
 @require_auth
 def get_domains_from_db():
-    """Get all domains from database with client info"""
+    """Get domains from database with client info, filtered, sorted and paged in SQL
+
+    Query parameters: client_id, sync_status, dns_issues ('unchecked' for never checked),
+    q (domain name substring), missing ('spf', 'dmarc', 'dkim' or 'google_verification'),
+    sort, order ('asc' or 'desc'), cursor and limit.
+    Without limit all matching domains are returned.
+    """
     try:
-        domains = db.get_all_domains_with_redirections()
+        client_id = request.args.get('client_id', type=int)
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_DOMAINS_PAGE_SIZE))
+
+        try:
+            page = db.get_domains_page(
+                client_id=client_id,
+                sync_status=request.args.get('sync_status'),
+                dns_issues=request.args.get('dns_issues'),
+                search=request.args.get('q'),
+                missing=request.args.get('missing'),
+                sort=request.args.get('sort', 'domain_number'),
+                descending=request.args.get('order', 'asc').lower() == 'desc',
+                cursor=request.args.get('cursor'),
+                limit=limit
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         clients = db.get_all_clients()
         
         return jsonify({
             "status": "success",
-            "domains": domains,
+            "domains": page['domains'],
             "clients": clients,
-            "total_count": len(domains)
+            "total_count": page['total_count'],
+            "next_cursor": page['next_cursor'],
+            "dns_issues_options": db.get_dns_issue_values()
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/domain-summary', methods=['GET'])
+@require_auth
+def get_domain_summary():
+    """Domain counts per client, sync status and DNS issues, and per missing DNS record"""
+    try:
+        return jsonify({
+            "status": "success",
+            **db.get_domain_summary(),
+            "missing_dns_records": db.get_missing_dns_record_counts()
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Largest number of matches the search endpoint returns per request
+MAX_SEARCH_RESULTS = int(os.environ.get('MAX_SEARCH_RESULTS', 1000))
+
+@app.route('/api/search-domains', methods=['GET'])
+@require_auth
+def search_domains():
+    """Full-text search over domain names, redirect targets and current DNS record values
+
+    Query parameters: q (search terms), field ('domain', 'redirect' or 'dns') and limit.
+    The returned domain names can be passed as the domains of the bulk jobs.
+    """
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), MAX_SEARCH_RESULTS))
+        try:
+            matches = db.search_domains(request.args.get('q', ''), field=request.args.get('field'), limit=limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify({
+            "status": "success",
+            "matches": matches,
+            "domains": [match['domain_name'] for match in matches],
+            "total_count": len(matches)
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def domains_from_search(data):
+    """Domain names of a bulk job request - its 'domains' list, or every match of its 'search' query"""
+    if data.get('domains') or not data.get('search'):
+        return data.get('domains', [])
+    matches = db.search_domains(data['search'], field=data.get('search_field'), limit=None)
+    return [match['domain_name'] for match in matches]
+
+
 @app.route('/api/assign-client', methods=['POST'])
 def assign_client():
     """Assign domain to client"""
@@ -2670,64 +3041,226 @@ def assign_client():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def background_bulk_update(updates, resume_from_index=None, verify=False):
+    """Background function to update redirects for many domains, one result per domain"""
+    global bulk_update_progress
+
+    try:
+        bulk_update_progress["status"] = "running"
+        start_index = resume_from_index if resume_from_index is not None else 0
+        if resume_from_index is None:
+            updates = skip_unmanaged_domains(updates, bulk_update_progress, lambda update: update.get('domain_name'))
+
+        print(f"🔄 Starting bulk redirect update for {len(updates)} domains from index {start_index}")
+
+        def update_key(update):
+            return payload_hash("redirect_update", [update.get('name', '@'), update.get('target')])
+
+        applied = find_already_applied(
+            "redirect_update",
+            {update.get('domain_name'): update_key(update) for update in updates[start_index:]},
+            bulk_update_progress
+        )
+
+        for i, update in enumerate(updates[start_index:], start_index + 1):
+            if bulk_update_progress["should_stop"]:
+                bulk_update_progress["status"] = "stopped"
+                bulk_update_progress["current_domain"] = ""
+                print(f"⏹ Bulk redirect update stopped by user at domain {i}/{len(updates)}")
+                return
+
+            domain_name = update.get('domain_name', 'unknown')
+            name = update.get('name', '@')
+            target = update.get('target')
+
+            bulk_update_progress["processed"] = i
+            bulk_update_progress["current_domain"] = domain_name
+
+            if domain_name in applied:
+                skip_already_applied(domain_name, applied[domain_name], bulk_update_progress)
+                continue
+
+            result = {"domain_name": domain_name, "success": False, "verified": False, "processed": i, "total": len(updates)}
+            calls_before = get_thread_api_calls()
+            try:
+                # Use SAFE redirect update with DNS backup/restore
+                print(f"🔄 Safe bulk update {i}/{len(updates)} for {domain_name} -> {target}")
+                api_client = get_api_client(domain_name)
+                success = api_client.set_domain_redirection(domain_name, name, target)
+
+                if not success and api_client.rate_limit.get_status()["is_paused"]:
+                    # The failure was the rate limit - keep this domain for the resume
+                    record_domain_operation(bulk_update_progress, domain_name, "redirect_update", update_key(update),
+                                            "rate_limited", get_thread_api_calls() - calls_before)
+                    print(f"🚫 Rate limit detected at domain {domain_name}. Pausing bulk update...")
+                    bulk_update_progress["status"] = "rate_limited"
+                    bulk_update_progress["paused_at_index"] = i - 1
+                    bulk_update_progress["paused_domains"] = updates
+                    bulk_update_progress["rate_limit_message"] = f"Namecheap rate limit exceeded at domain {domain_name}. Please wait and click Resume to continue."
+                    return
+
+                result["success"] = success
+                if success and verify:
+                    # Verify the redirection was actually set correctly
+                    time.sleep(2)  # Small delay to allow Namecheap to process
+                    result["verified"] = get_api_client(domain_name).verify_domain_redirection(domain_name, name, target)
+                    db.update_domain_sync_status(domain_name, 'synced' if result["verified"] else 'not_synced')
+                elif not success and verify:
+                    db.update_domain_sync_status(domain_name, 'not_synced')
+
+                if success:
+                    bulk_update_progress["successful"] += 1
+                    result["message"] = f"Successfully updated redirect for {domain_name}"
+                else:
+                    result["error"] = "Failed to update redirect"
+                    bulk_update_progress["errors"].append(f"{domain_name}: Failed to update redirect")
+
+            except Exception as update_error:
+                if verify:
+                    db.update_domain_sync_status(domain_name, 'not_synced')
+                result["error"] = str(update_error)
+                bulk_update_progress["errors"].append(f"{domain_name}: {str(update_error)}")
+
+            record_domain_operation(bulk_update_progress, domain_name, "redirect_update", update_key(update),
+                                    "successful" if result["success"] else "failed",
+                                    get_thread_api_calls() - calls_before)
+            bulk_update_progress["results"].append(result)
+
+            # Small delay between domains
+            time.sleep(0.6)
+
+        bulk_update_progress["status"] = "completed"
+        bulk_update_progress["current_domain"] = ""
+        print(f"✅ Bulk redirect update completed: {bulk_update_progress['successful']} successful, {len(bulk_update_progress['errors'])} errors")
+
+    except Exception as e:
+        print(f"❌ Bulk redirect update failed: {e}")
+        bulk_update_progress["status"] = "error"
+        bulk_update_progress["error"] = str(e)
+
+def start_bulk_update(updates, verify=False, force=False):
+    """Queue a bulk redirect update job, returns the job id or None if one is already running"""
+    global bulk_update_progress
+
+    if job_in_progress("bulk_update_progress"):
+        return None
+
+    bulk_update_progress = {
+        "status": "starting",
+        "processed": 0,
+        "total": len(updates),
+        "current_domain": "",
+        "successful": 0,
+        "errors": [],
+        "results": [],
+        "should_stop": False,
+        "paused_at_index": None,
+        "rate_limit_message": None,
+        "paused_domains": updates,
+        "verify": verify,
+        "force": force,
+        "api_calls": 0
+    }
+    return job_runner.submit('bulk_update', args=(updates, None, verify), progress=bulk_update_progress)
+
 @app.route('/api/bulk-update', methods=['POST'])
+@idempotent
 def bulk_update():
-    """Bulk update domains with progress tracking"""
+    """Start a background bulk redirect update"""
     try:
         data = request.get_json()
         updates = data.get('updates', [])  # List of {domain_name, name, target}
+
+        # Or one redirect for every domain matching a search
+        if not updates and data.get('search') and data.get('target'):
+            updates = [{"domain_name": domain_name, "name": data.get('name', '@'), "target": data['target']}
+                       for domain_name in domains_from_search(data)]
         
         if not updates:
             return jsonify({"error": "No updates provided"}), 400
-        
-        # Process updates with delays
-        results = []
-        
-        for i, update in enumerate(updates):
-            try:
-                domain_name = update.get('domain_name')
-                name = update.get('name', '@')
-                target = update.get('target')
-                
-                # Use SAFE redirect update with DNS backup/restore
-                print(f"🔄 Safe bulk update for {domain_name} -> {target}")
-                success = get_email_manager().api_client.set_domain_redirection(domain_name, '@', target)
 
-                if success:
-                    results.append({
-                        "domain_name": domain_name,
-                        "success": True,
-                        "message": f"Successfully updated redirect for {domain_name}",
-                        "processed": i + 1,
-                        "total": len(updates)
-                    })
-                else:
-                    results.append({
-                        "domain_name": domain_name,
-                        "success": False,
-                        "error": "Failed to update redirect",
-                        "processed": i + 1,
-                        "total": len(updates)
-                    })
-
-            except Exception as update_error:
-                results.append({
-                    "domain_name": update.get('domain_name', 'unknown'),
-                    "success": False,
-                    "error": str(update_error),
-                    "processed": i + 1,
-                    "total": len(updates)
-                })
+        job_id = start_bulk_update(updates, force=bool(data.get('force')))
+        if job_id is None:
+            return jsonify({"error": "Bulk update already in progress"}), 409
 
         return jsonify({
-            "status": "success",
-            "results": results,
-            "total_processed": len(results)
+            "status": "started",
+            "job_id": job_id,
+            "total": len(updates)
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/bulk-update-progress', methods=['GET'])
+def get_bulk_update_progress():
+    """Get bulk redirect update progress with per-domain results"""
+    bulk_update_progress = current_progress("bulk_update_progress")
+
+    return jsonify({
+        "status": bulk_update_progress["status"],
+        "processed": bulk_update_progress["processed"],
+        "total": bulk_update_progress["total"],
+        "current_domain": bulk_update_progress["current_domain"],
+        "successful": bulk_update_progress["successful"],
+        "errors": bulk_update_progress["errors"][-5:] if bulk_update_progress["errors"] else [],
+        "total_errors": len(bulk_update_progress["errors"]) if bulk_update_progress["errors"] else 0,
+        "results": bulk_update_progress.get("results") or [],
+        "rate_limit_message": bulk_update_progress.get("rate_limit_message"),
+        "paused_at_index": bulk_update_progress.get("paused_at_index"),
+        "skipped": bulk_update_progress.get("skipped") or [],
+        "api_calls": bulk_update_progress.get("api_calls", 0)
+    })
+
+@app.route('/api/stop-bulk-update', methods=['POST'])
+@require_auth
+def stop_bulk_update():
+    """Stop bulk redirect update"""
+    bulk_update_progress = current_progress("bulk_update_progress")
+
+    if bulk_update_progress["status"] == "running":
+        request_job_stop(bulk_update_progress)
+        return jsonify({"status": "stopping"})
+    else:
+        return jsonify({"error": "No bulk update in progress"}), 400
+
+@app.route('/api/resume-bulk-update', methods=['POST'])
+@require_auth
+def resume_bulk_update():
+    """Resume a paused or stopped bulk redirect update"""
+    global bulk_update_progress
+    bulk_update_progress = current_progress("bulk_update_progress")
+
+    if bulk_update_progress["status"] not in ("rate_limited", "stopped"):
+        return jsonify({"error": "No paused bulk update to resume"}), 400
+
+    if not bulk_update_progress.get("paused_domains"):
+        return jsonify({"error": "No resume point found"}), 400
+
+    try:
+        # Continue after the last domain that has a result
+        resume_index = bulk_update_progress.get("paused_at_index")
+        if resume_index is None:
+            resume_index = len(bulk_update_progress.get("results") or [])
+
+        bulk_update_progress["status"] = "running"
+        bulk_update_progress["should_stop"] = False
+        bulk_update_progress["rate_limit_message"] = None
+        bulk_update_progress["paused_at_index"] = None
+
+        print(f"🔄 Resuming bulk redirect update from index {resume_index}")
+
+        job_id = job_runner.submit(
+            'bulk_update',
+            args=(bulk_update_progress["paused_domains"], resume_index, bulk_update_progress.get("verify", False)),
+            progress=bulk_update_progress
+        )
+
+        return jsonify({"status": "resumed", "job_id": job_id, "message": "Bulk update resumed successfully"})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/domains-with-redirections', methods=['GET'])
 @require_auth
 def get_domains_with_redirections():
@@ -2837,7 +3370,7 @@ def update_redirection():
             }), 400
         
         # Update the redirection using Namecheap API
-        success = get_email_manager().api_client.set_domain_redirection(domain, name, target)
+        success = get_api_client(domain).set_domain_redirection(domain, name, target)
         
         if success:
             return jsonify({
@@ -3254,6 +3787,9 @@ def sync_domains_form():
         
         # Start background sync task
         global sync_progress
+        if job_in_progress("sync_progress"):
+            return redirect(url_for('dashboard'))
+
         sync_progress = {
             "status": "starting",
             "processed": 0,
@@ -3268,9 +3804,8 @@ def sync_domains_form():
             "paused_domains": None
         }
         
-        sync_thread = threading.Thread(target=background_sync_with_rate_limiting)
-        sync_thread.daemon = True
-        sync_thread.start()
+        incremental = request.form.get('mode', 'incremental') != 'full'
+        job_runner.submit('sync_all', args=(None, incremental), progress=sync_progress)
         
         return redirect(url_for('dashboard'))
         
@@ -3309,7 +3844,7 @@ def update_redirect_form():
 
         while save_retry < max_save_retries and not success:
             try:
-                success = get_email_manager().api_client.set_domain_redirection(domain, '@', target)
+                success = get_api_client(domain).set_domain_redirection(domain, '@', target)
                 if success:
                     break  # Success, exit retry loop
                 else:
@@ -3344,7 +3879,7 @@ def update_redirect_form():
             # Verify the redirection was actually set correctly
             import time
             time.sleep(2)  # Small delay to allow Namecheap to process
-            verified = get_email_manager().api_client.verify_domain_redirection(domain, '@', target)
+            verified = get_api_client(domain).verify_domain_redirection(domain, '@', target)
 
             if verified:
                 # Ensure domain exists in database
@@ -3355,7 +3890,7 @@ def update_redirect_form():
 
                 # Fetch and store the actual redirections from Namecheap to database
                 try:
-                    redirections = get_email_manager().api_client.get_domain_redirections(domain)
+                    redirections = get_api_client(domain).get_domain_redirections(domain)
                     if redirections:
                         db.update_redirections(domain, redirections)
                         print(f"✅ Updated database with {len(redirections)} redirections for {domain}")
@@ -3430,34 +3965,10 @@ def bulk_update_form():
             if not bulk_target:
                 return "Target URL is required", 400
         
-        # Process bulk updates
-        results = []
-        for domain in selected_domains:
-            try:
-                success = get_email_manager().api_client.set_domain_redirection(domain, '@', bulk_target)
-
-                verified = False
-                if success:
-                    # Verify the redirection was actually set correctly
-                    import time
-                    time.sleep(2)  # Small delay to allow Namecheap to process
-                    verified = get_email_manager().api_client.verify_domain_redirection(domain, '@', bulk_target)
-
-                    # Update sync status based on verification
-                    if verified:
-                        db.update_domain_sync_status(domain, 'synced')
-                    else:
-                        db.update_domain_sync_status(domain, 'not_synced')
-                else:
-                    db.update_domain_sync_status(domain, 'not_synced')
-
-                results.append({'domain': domain, 'success': success, 'verified': verified})
-                # Add delay between updates
-                import time
-                time.sleep(0.6)
-            except Exception as e:
-                db.update_domain_sync_status(domain, 'not_synced')
-                results.append({'domain': domain, 'success': False, 'error': str(e)})
+        # Process bulk updates in the background, progress is shown on the dashboard
+        updates = [{'domain_name': domain, 'name': '@', 'target': bulk_target} for domain in selected_domains]
+        if start_bulk_update(updates, verify=True) is None:
+            return "Bulk update already in progress", 409
         
         return redirect(url_for('dashboard'))
         
@@ -3566,169 +4077,403 @@ def catch_all(path):
     except FileNotFoundError:
         return "React app not built", 404
 
-def background_bulk_dns_update(domains, records_data, resume_from_index=None):
+# Optimistic bulk writes build setHosts from stored records younger than this instead of reading first
+OPTIMISTIC_MAX_AGE = int(os.environ.get('OPTIMISTIC_MAX_AGE_MINUTES', 60)) * 60
+# Every Nth optimistic domain is still read first to detect records changed outside the tool
+OPTIMISTIC_VERIFY_EVERY = int(os.environ.get('OPTIMISTIC_VERIFY_EVERY', 10))
+
+def load_optimistic_snapshots(domains, progress):
+    """Fresh stored record sets for an optimistic bulk write, tracked in progress["optimistic"]"""
+    state = progress.get("optimistic")
+    if state and not state["enabled"]:
+        # A resumed job keeps optimistic mode off once a conflict was found
+        return {}
+
+    fresh = db.get_domains_with_fresh_dns_records(domains, OPTIMISTIC_MAX_AGE)
+    snapshots = {
+        domain_name: snapshot['records']
+        for domain_name, snapshot in db.get_current_dns_snapshots(sorted(fresh)).items()
+    }
+    if not state:
+        progress["optimistic"] = {
+            "enabled": True,
+            "fresh": 0,
+            "used": 0,
+            "reads_saved": 0,
+            "verified": 0,
+            "conflicts": [],
+            "unverified": [],
+            "at_risk": []
+        }
+    progress["optimistic"]["fresh"] = len(snapshots)
+    print(f"⚡ Optimistic mode: {len(snapshots)}/{len(domains)} domains have records newer than {OPTIMISTIC_MAX_AGE // 60} min")
+    return snapshots
+
+# Guards the optimistic counters while domains of several accounts are written at once
+optimistic_lock = threading.Lock()
+
+def get_hosts_for_write(domain_name, snapshots, progress, api_client):
+    """
+    Current host records to build a setHosts call on
+
+    Without optimistic mode this is a getHosts call. In optimistic mode a fresh stored
+    snapshot is used instead, except for every OPTIMISTIC_VERIFY_EVERY-th one, which is
+    read and compared. A mismatch turns optimistic mode off for the rest of the job and
+    queues the domains written since the last good check for a re-sync.
+    """
+    state = progress.get("optimistic")
+    with optimistic_lock:
+        snapshot = snapshots.pop(domain_name, None) if state and state["enabled"] else None
+
+        if snapshot is not None:
+            state["used"] += 1
+            if state["used"] % OPTIMISTIC_VERIFY_EVERY != 0:
+                state["reads_saved"] += 1
+                state["unverified"].append(domain_name)
+                return snapshot
+
+    # A failed read must not look like an empty record set that the update then overwrites
+    existing_hosts = api_client._get_all_hosts(domain_name, raise_errors=True)
+
+    if snapshot is None:
+        return existing_hosts
+
+    with optimistic_lock:
+        state["verified"] += 1
+        if is_noop(diff_records(snapshot, existing_hosts)):
+            state["unverified"] = []
+        else:
+            print(f"⚠️ Stored records for {domain_name} are out of date, turning optimistic mode off")
+            state["enabled"] = False
+            state["conflicts"].append(domain_name)
+            # Writes since the last good check may have been built on outdated records too
+            state["at_risk"].extend(state["unverified"])
+            for at_risk_domain in state["unverified"]:
+                db.update_domain_sync_status(at_risk_domain, 'not_synced')
+            state["unverified"] = []
+
+    return existing_hosts
+
+def plan_bulk_dns_change(domains, records_data=None, record_type=None, host_name=None, record_value=None):
+    """
+    Dry-run a bulk DNS update (records_data) or removal (record_type/host_name) against
+    the stored DNS records, without any Namecheap API call
+
+    Returns:
+        Dict with a per-domain plan ('changed', 'no-op', 'unknown' when no records are
+        stored, 'skipped' for unmanaged domains), a summary, the estimated API calls of
+        the full run and of a run restricted to domains_to_apply
+    """
+    unmanaged = db.get_unmanaged_domains(domains)
+    snapshots = db.get_current_dns_snapshots([domain for domain in domains if domain not in unmanaged])
+
+    plans = []
+    summary = {"changed": 0, "no-op": 0, "unknown": 0, "skipped": 0}
+    domains_to_apply = []
+    full_run_calls = 0
+    for domain_name in domains:
+        if domain_name in unmanaged:
+            plans.append({"domain": domain_name, "status": "skipped", "reason": unmanaged[domain_name]})
+            summary["skipped"] += 1
+            continue
+
+        snapshot = snapshots.get(domain_name)
+        if not snapshot:
+            # Nothing stored to plan against - the real run has to read and write
+            plans.append({"domain": domain_name, "status": "unknown", "api_calls": 2})
+            summary["unknown"] += 1
+            domains_to_apply.append(domain_name)
+            full_run_calls += 2
+            continue
+
+        before = snapshot['records']
+        if records_data is not None:
+            after = add_records(before, records_data)
+        else:
+            after, _ = remove_records(before, record_type, host_name, record_value)
+
+        changes = diff_records(before, after)
+        if is_noop(changes):
+            status = "no-op"
+            # Removals skip setHosts when nothing matches, updates always write
+            api_calls = 2 if records_data is not None else 1
+        else:
+            status = "changed"
+            api_calls = 2
+            domains_to_apply.append(domain_name)
+
+        plans.append({"domain": domain_name, "status": status, "api_calls": api_calls,
+                      "snapshot_at": snapshot['stored_at'], **changes})
+        summary[status] += 1
+        full_run_calls += api_calls
+
+    return {
+        "domains": plans,
+        "summary": summary,
+        "domains_to_apply": domains_to_apply,
+        "estimated_api_calls": full_run_calls,
+        "estimated_api_calls_changed_only": 2 * len(domains_to_apply)
+    }
+
+def restrict_to_planned_domains(domains, plan):
+    """Keep only domains with a non-empty (or unknown) plan, returns (domains, skipped entries)"""
+    to_apply = set(plan["domains_to_apply"])
+    skipped = []
+    for entry in plan["domains"]:
+        if entry["domain"] in to_apply:
+            continue
+        reason = entry.get("reason") or "no changes according to stored DNS records"
+        skipped.append({"domain": entry["domain"], "reason": reason})
+    return [domain for domain in domains if domain in to_apply], skipped
+
+@app.route('/api/bulk-dns-plan', methods=['POST'])
+@require_auth
+def bulk_dns_plan():
+    """Preview a bulk DNS update or removal from stored DNS records, without API calls"""
+    try:
+        data = request.get_json()
+        domains = domains_from_search(data)
+        action = data.get('action', 'update')
+
+        if not domains:
+            return jsonify({"error": "No domains provided"}), 400
+
+        if action == 'update':
+            records_data = data.get('records', [])
+            if not records_data:
+                return jsonify({"error": "No records data provided"}), 400
+
+            required_fields = ['type', 'name', 'address', 'ttl']
+            for record_data in records_data:
+                for field in required_fields:
+                    if field not in record_data:
+                        return jsonify({"error": f"Missing required field: {field}"}), 400
+
+            plan = plan_bulk_dns_change(domains, records_data=records_data)
+        elif action == 'remove':
+            record_type = data.get('record_type')
+            host_name = data.get('host_name')
+            if not record_type or not host_name:
+                return jsonify({"error": "Record type and host name are required"}), 400
+
+            plan = plan_bulk_dns_change(domains, record_type=record_type, host_name=host_name,
+                                        record_value=data.get('record_value'))
+        else:
+            return jsonify({"error": "Action must be 'update' or 'remove'"}), 400
+
+        return jsonify({"action": action, **plan})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# A successful ledger entry younger than this lets a job skip the same payload on the same domain
+LEDGER_REUSE_MAX_AGE = int(os.environ.get('LEDGER_REUSE_MAX_AGE_HOURS', 24)) * 3600
+ledger_lock = threading.Lock()
+
+def find_already_applied(operation, payload_hashes, progress):
+    """Domains where an earlier job already applied the same payload, unless the job was started with force"""
+    if progress.get("force"):
+        return {}
+    return db.get_completed_operations(operation, payload_hashes, LEDGER_REUSE_MAX_AGE)
+
+def skip_already_applied(domain_name, job_id, progress):
+    """Report a domain left out because the operation ledger shows it is already done"""
+    print(f"  ⏭️ {domain_name}: already applied by job {job_id}")
+    progress.setdefault("skipped", []).append({"domain": domain_name, "reason": f"already applied by job {job_id}"})
+
+def record_domain_operation(progress, domain_name, operation, payload_key, outcome, api_calls):
+    """Append a domain's outcome to the operation ledger and add its API calls to the job total"""
+    with ledger_lock:
+        progress["api_calls"] = progress.get("api_calls", 0) + api_calls
+    try:
+        db.record_operation(progress.get("job_id"), domain_name, operation, payload_key, outcome, api_calls)
+    except Exception as e:
+        print(f"⚠️ Could not record {operation} for {domain_name} in the ledger: {e}")
+
+def order_by_account(domains, progress):
+    """Interleave a job's domains round-robin across Namecheap accounts, so each round keeps every account busy"""
+    accounts = db.get_domain_accounts(domains)
+    queues = {}
+    for domain_name in domains:
+        queues.setdefault(accounts[domain_name], []).append(domain_name)
+    if len(queues) <= 1:
+        return domains
+
+    ordered = []
+    for position in range(max(len(queue) for queue in queues.values())):
+        ordered.extend(queue[position] for queue in queues.values() if position < len(queue))
+
+    print(f"🔀 Spreading {len(domains)} domains over {len(queues)} Namecheap accounts")
+    progress["paused_domains"] = ordered
+    return ordered
+
+def run_account_rounds(domains, start_index, progress, process_domain, label, operation=None, payload_key=None):
+    """
+    Process a job's domains from start_index, domains of different Namecheap accounts concurrently
+
+    Domains are taken in rounds of consecutive entries with distinct accounts, so the
+    processed count stays a prefix of the list and paused_at_index resumes exactly.
+    Each account's calls are paced by its own rate limiter.
+
+    Args:
+        domains: The job's domain list (see order_by_account)
+        start_index: 0-based index to start from
+        progress: The job's progress dict
+        process_domain: Called with (index, domain_name, api_client), returns
+            'successful', 'failed' or 'rate_limited'
+        label: Job name used in log lines
+        operation: Ledger operation name - every domain's outcome and API calls are
+            recorded, and domains that already succeeded with payload_key are skipped
+        payload_key: payload_hash of what the job applies to each domain
+
+    Returns:
+        str: 'completed', 'stopped' or 'rate_limited'
+    """
+    accounts = db.get_domain_accounts(domains[start_index:])
+    applied = {}
+    if operation:
+        applied = find_already_applied(operation, {domain_name: payload_key for domain_name in domains[start_index:]}, progress)
+    index = start_index
+
+    while index < len(domains):
+        # Check if the job should stop
+        if progress["should_stop"]:
+            progress["status"] = "stopped"
+            progress["current_domain"] = ""
+            print(f"⏹ {label} stopped by user at domain {index + 1}/{progress['total']}")
+            return "stopped"
+
+        batch = []
+        batch_accounts = set()
+        while index + len(batch) < len(domains):
+            domain_name = domains[index + len(batch)]
+            if accounts[domain_name] in batch_accounts:
+                break
+            batch_accounts.add(accounts[domain_name])
+            batch.append((index + len(batch) + 1, domain_name))
+
+        progress["processed"] = batch[-1][0]
+        progress["current_domain"] = ", ".join(domain_name for _, domain_name in batch)
+
+        outcomes = {}
+
+        def run(position, domain_name):
+            if domain_name in applied:
+                skip_already_applied(domain_name, applied[domain_name], progress)
+                outcomes[position] = "skipped"
+                return
+
+            calls_before = get_thread_api_calls()
+            outcome = "failed"
+            try:
+                api_client = get_account_manager(accounts[domain_name]).api_client
+                outcome = process_domain(position, domain_name, api_client)
+            except Exception as e:
+                print(f"  ⚠️ Error processing {domain_name}: {e}")
+                progress["errors"].append(f"{domain_name}: {str(e)}")
+            finally:
+                outcomes[position] = outcome
+                if operation:
+                    record_domain_operation(progress, domain_name, operation, payload_key, outcome,
+                                            get_thread_api_calls() - calls_before)
+
+        if len(batch) == 1:
+            run(*batch[0])
+        else:
+            threads = [threading.Thread(target=run, args=entry) for entry in batch]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        progress["successful"] += sum(1 for outcome in outcomes.values() if outcome == "successful")
+
+        rate_limited = sorted(position for position, outcome in outcomes.items() if outcome == "rate_limited")
+        if rate_limited:
+            domain_name = domains[rate_limited[0] - 1]
+            print(f"🚫 Rate limit detected at domain {domain_name}. Pausing {label}...")
+            progress["status"] = "rate_limited"
+            progress["current_domain"] = domain_name
+            progress["paused_at_index"] = rate_limited[0] - 1
+            progress["paused_domains"] = domains
+            progress["rate_limit_message"] = f"Namecheap rate limit exceeded at domain {domain_name}. Please wait and click Resume to continue."
+            return "rate_limited"
+
+        index += len(batch)
+
+        # Small delay between rounds that called the API
+        if any(outcome != "skipped" for outcome in outcomes.values()):
+            time.sleep(1.5)
+
+    return "completed"
+
+def is_rate_limit_error(error):
+    """Check an API error for rate limiting indicators"""
+    error_msg = str(error)
+    return (
+        "too many requests" in error_msg.lower() or
+        "rate limit" in error_msg.lower() or
+        "connection/timeout error" in error_msg.lower() or
+        "502" in error_msg or "503" in error_msg or "504" in error_msg
+    )
+
+def background_bulk_dns_update(domains, records_data, resume_from_index=None, optimistic=False):
     """Background function to handle bulk DNS updates with rate limiting"""
     global bulk_dns_progress
 
     try:
         bulk_dns_progress["status"] = "running"
         start_index = resume_from_index if resume_from_index is not None else 0
+        if resume_from_index is None:
+            domains = skip_unmanaged_domains(domains, bulk_dns_progress)
+            domains = order_by_account(domains, bulk_dns_progress)
+        snapshots = load_optimistic_snapshots(domains[start_index:], bulk_dns_progress) if optimistic else {}
 
         print(f"🌐 Starting bulk DNS update for {len(domains)} domains from index {start_index}")
         print(f"📝 Records: {len(records_data)} record(s) to add")
         for record in records_data:
             print(f"   - {record['type']} {record['name']} -> {record['address']}")
 
-        # Process domains with rate limiting
-        for i, domain_name in enumerate(domains[start_index:], start_index + 1):
-            # Check if update should stop
-            if bulk_dns_progress["should_stop"]:
-                bulk_dns_progress["status"] = "stopped"
-                bulk_dns_progress["current_domain"] = ""
-                print(f"⏹ Bulk DNS update stopped by user at domain {i}/{bulk_dns_progress['total']}")
-                return
-
-            bulk_dns_progress["processed"] = i
-            bulk_dns_progress["current_domain"] = domain_name
-
+        def update_domain(i, domain_name, api_client):
+            """Add the records to one domain with retry logic for rate limits"""
             print(f"🌐 Processing DNS {i}/{bulk_dns_progress['total']}: {domain_name}")
 
-            # Add DNS record with retry logic for rate limits
-            dns_updated = False
             dns_retry = 0
             max_dns_retries = 3
-
-            while dns_retry < max_dns_retries and not dns_updated:
+            while dns_retry < max_dns_retries:
                 try:
-                    # Get current DNS records
-                    existing_hosts = get_email_manager().api_client._get_all_hosts(domain_name)
-
-                    if existing_hosts is None:
-                        raise Exception("Could not fetch existing DNS records")
-
-                    # Start with existing records
-                    all_records = list(existing_hosts)
-
-                    # Add each new record
-                    for record_data in records_data:
-                        new_record = {
-                            'Name': record_data['name'],
-                            'Type': record_data['type'],
-                            'Address': record_data['address'],
-                            'TTL': record_data['ttl']
-                        }
+                    # Get current DNS records (from the stored snapshot in optimistic mode)
+                    existing_hosts = get_hosts_for_write(domain_name, snapshots, bulk_dns_progress, api_client)
 
-                        # Add MXPref for MX records
-                        if record_data['type'] == 'MX' and record_data.get('mx_pref'):
-                            new_record['MXPref'] = record_data['mx_pref']
-
-                        # For TXT records, only remove exact duplicates (same name, type, and value)
-                        # For other record types, remove existing records with same name and type
-                        if record_data['type'] == 'TXT':
-                            # Only remove if exact duplicate (same name, type, and address)
-                            all_records = [
-                                host for host in all_records
-                                if not (host.get('Name') == record_data['name'] and
-                                       host.get('Type') == record_data['type'] and
-                                       host.get('Address') == record_data['address'])
-                            ]
-                        else:
-                            # For non-TXT records, replace existing records with same name and type
-                            all_records = [
-                                host for host in all_records
-                                if not (host.get('Name') == record_data['name'] and host.get('Type') == record_data['type'])
-                            ]
-
-                        # Add the new record
-                        all_records.append(new_record)
-
-                    # Update DNS via setHosts API
-                    domain_parts = domain_name.split('.')
-                    if len(domain_parts) < 2:
-                        raise Exception(f"Invalid domain format: {domain_name}")
-
-                    sld = domain_parts[0]
-                    tld = '.'.join(domain_parts[1:])
-
-                    # Handle common multi-part TLDs
-                    common_tlds = ['co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au']
-                    for common_tld in common_tlds:
-                        if domain_name.endswith('.' + common_tld):
-                            sld = domain_name.replace('.' + common_tld, '')
-                            tld = common_tld
-                            break
+                    # Apply the new records on top of the existing ones
+                    all_records = add_records(existing_hosts, records_data)
 
-                    # Build setHosts parameters
-                    params = {'SLD': sld, 'TLD': tld}
-
-                    for idx, record in enumerate(all_records, 1):
-                        params[f'HostName{idx}'] = record['Name']
-                        params[f'RecordType{idx}'] = record['Type']
-                        params[f'Address{idx}'] = record['Address']
-                        params[f'TTL{idx}'] = record['TTL']
-                        if record.get('MXPref'):
-                            params[f'MXPref{idx}'] = record['MXPref']
-
-                    # Make API call
-                    response = get_email_manager().api_client._make_request('namecheap.domains.dns.setHosts', **params)
-
-                    # Check response
-                    command_response = None
-                    for key, value in response.items():
-                        if 'CommandResponse' in key:
-                            command_response = value
-                            break
-
-                    if command_response:
-                        hosts_result = None
-                        for key, value in command_response.items():
-                            if 'DomainDNSSetHostsResult' in key:
-                                hosts_result = value
-                                break
-
-                        if hosts_result and hosts_result.get('IsSuccess') == 'true':
-                            print(f"  ✅ DNS record added for {domain_name}")
-                            bulk_dns_progress["successful"] += 1
-                            dns_updated = True
-                        else:
-                            raise Exception(f"Namecheap API returned failure: {hosts_result}")
-                    else:
-                        raise Exception("Unexpected response format from Namecheap")
+                    # Update DNS via setHosts API (also stores the new record set locally)
+                    api_client.set_hosts(domain_name, all_records)
+                    print(f"  ✅ DNS record added for {domain_name}")
+                    return "successful"
 
                 except Exception as dns_error:
                     dns_retry += 1
-                    error_msg = str(dns_error)
 
-                    # Check for rate limiting indicators
-                    is_rate_limited = (
-                        "too many requests" in error_msg.lower() or
-                        "rate limit" in error_msg.lower() or
-                        "connection/timeout error" in error_msg.lower() or
-                        "502" in error_msg or "503" in error_msg or "504" in error_msg
-                    )
-
-                    if is_rate_limited:
-                        if dns_retry <= 2:  # Only retry twice, then pause
-                            wait_time = 5 * dns_retry
-                            print(f"  ⏳ Rate limited for {domain_name}, waiting {wait_time}s")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            # Rate limit hit, pause the update
-                            print(f"🚫 Rate limit detected at domain {domain_name}. Pausing DNS update...")
-                            bulk_dns_progress["status"] = "rate_limited"
-                            bulk_dns_progress["current_domain"] = domain_name
-                            bulk_dns_progress["paused_at_index"] = i - 1
-                            bulk_dns_progress["paused_domains"] = domains
-                            bulk_dns_progress["rate_limit_message"] = f"Namecheap rate limit exceeded at domain {domain_name}. Please wait and click Resume to continue."
-                            return
-                    else:
+                    if not is_rate_limit_error(dns_error):
                         print(f"  ⚠️ Error updating DNS for {domain_name}: {dns_error}")
                         bulk_dns_progress["errors"].append(f"{domain_name}: {str(dns_error)}")
-                        break
+                        return "failed"
 
-            # Small delay between domains
-            time.sleep(1.5)
+                    if dns_retry > 2:  # Only retry twice, then pause
+                        return "rate_limited"
+
+                    wait_time = 5 * dns_retry
+                    print(f"  ⏳ Rate limited for {domain_name}, waiting {wait_time}s")
+                    time.sleep(wait_time)
+
+            return "failed"
+
+        outcome = run_account_rounds(domains, start_index, bulk_dns_progress, update_domain, "bulk DNS update",
+                                     operation="dns_update", payload_key=payload_hash("dns_update", records_data))
+        if outcome != "completed":
+            return
 
         bulk_dns_progress["status"] = "completed"
         bulk_dns_progress["current_domain"] = ""
@@ -3741,13 +4486,14 @@ def background_bulk_dns_update(domains, records_data, resume_from_index=None):
 
 @app.route('/api/bulk-dns-update', methods=['POST'])
 @require_auth
+@idempotent
 def bulk_dns_update():
     """Start bulk DNS record update"""
     global bulk_dns_progress
 
     try:
         data = request.get_json()
-        domains = data.get('domains', [])
+        domains = domains_from_search(data)
         records_data = data.get('records', [])
 
         if not domains:
@@ -3764,9 +4510,17 @@ def bulk_dns_update():
                     return jsonify({"error": f"Missing required field: {field}"}), 400
 
         # Check if update is already running
-        if bulk_dns_progress["status"] == "running":
+        if job_in_progress("bulk_dns_progress"):
             return jsonify({"error": "Bulk DNS update already in progress"}), 409
 
+        # Optionally leave out domains whose stored records already match
+        skipped = []
+        if data.get('only_changed'):
+            domains, skipped = restrict_to_planned_domains(
+                domains, plan_bulk_dns_change(domains, records_data=records_data))
+            if not domains:
+                return jsonify({"status": "nothing_to_do", "total": 0, "skipped": skipped})
+
         # Reset progress
         bulk_dns_progress = {
             "status": "starting",
@@ -3779,17 +4533,25 @@ def bulk_dns_update():
             "paused_at_index": None,
             "rate_limit_message": None,
             "paused_domains": domains,
-            "records_data": records_data
+            "records_data": records_data,
+            "skipped": skipped,
+            "optimistic_mode": bool(data.get('optimistic')),
+            "force": bool(data.get('force')),
+            "api_calls": 0
         }
 
-        # Start background update
-        dns_thread = threading.Thread(target=background_bulk_dns_update, args=(domains, records_data))
-        dns_thread.daemon = True
-        dns_thread.start()
+        # Queue background update
+        job_id = job_runner.submit(
+            'bulk_dns_update',
+            args=(domains, records_data, None, bulk_dns_progress["optimistic_mode"]),
+            progress=bulk_dns_progress
+        )
 
         return jsonify({
             "status": "started",
+            "job_id": job_id,
             "total": len(domains),
+            "skipped": len(skipped),
             "record_type": record_data['type']
         })
 
@@ -3799,6 +4561,8 @@ def bulk_dns_update():
 @app.route('/api/bulk-dns-progress', methods=['GET'])
 def get_bulk_dns_progress():
     """Get bulk DNS update progress"""
+    bulk_dns_progress = current_progress("bulk_dns_progress")
+
     return jsonify({
         "status": bulk_dns_progress["status"],
         "processed": bulk_dns_progress["processed"],
@@ -3808,17 +4572,20 @@ def get_bulk_dns_progress():
         "errors": bulk_dns_progress["errors"][-5:] if bulk_dns_progress["errors"] else [],
         "total_errors": len(bulk_dns_progress["errors"]) if bulk_dns_progress["errors"] else 0,
         "rate_limit_message": bulk_dns_progress.get("rate_limit_message"),
-        "paused_at_index": bulk_dns_progress.get("paused_at_index")
+        "paused_at_index": bulk_dns_progress.get("paused_at_index"),
+        "skipped": bulk_dns_progress.get("skipped") or [],
+        "api_calls": bulk_dns_progress.get("api_calls", 0),
+        "optimistic": bulk_dns_progress.get("optimistic")
     })
 
 @app.route('/api/stop-bulk-dns', methods=['POST'])
 @require_auth
 def stop_bulk_dns():
     """Stop bulk DNS update"""
-    global bulk_dns_progress
+    bulk_dns_progress = current_progress("bulk_dns_progress")
 
     if bulk_dns_progress["status"] == "running":
-        bulk_dns_progress["should_stop"] = True
+        request_job_stop(bulk_dns_progress)
         return jsonify({"status": "stopping"})
     else:
         return jsonify({"error": "No bulk DNS update in progress"}), 400
@@ -3828,6 +4595,7 @@ def stop_bulk_dns():
 def resume_bulk_dns():
     """Resume a paused bulk DNS update"""
     global bulk_dns_progress
+    bulk_dns_progress = current_progress("bulk_dns_progress")
 
     if bulk_dns_progress["status"] != "rate_limited":
         return jsonify({"error": "No paused bulk DNS update to resume"}), 400
@@ -3843,174 +4611,82 @@ def resume_bulk_dns():
 
         print(f"🔄 Resuming bulk DNS update from index {bulk_dns_progress['paused_at_index']}")
 
-        # Start background thread to resume
-        dns_thread = threading.Thread(
-            target=background_bulk_dns_update,
-            args=(bulk_dns_progress["paused_domains"], bulk_dns_progress["records_data"], bulk_dns_progress["paused_at_index"])
+        # Queue a job that continues from the pause point
+        job_id = job_runner.submit(
+            'bulk_dns_update',
+            args=(bulk_dns_progress["paused_domains"], bulk_dns_progress["records_data"],
+                  bulk_dns_progress["paused_at_index"], bulk_dns_progress.get("optimistic_mode", False)),
+            progress=bulk_dns_progress
         )
-        dns_thread.daemon = True
-        dns_thread.start()
 
-        return jsonify({"status": "resumed", "message": "Bulk DNS update resumed successfully"})
+        return jsonify({"status": "resumed", "job_id": job_id, "message": "Bulk DNS update resumed successfully"})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def background_bulk_dns_remove(domains, record_type, host_name, record_value=None, resume_from_index=None):
+def background_bulk_dns_remove(domains, record_type, host_name, record_value=None, resume_from_index=None,
+                               optimistic=False):
     """Background function to handle bulk DNS record removal with rate limiting"""
     global bulk_dns_remove_progress
 
     try:
         bulk_dns_remove_progress["status"] = "running"
         start_index = resume_from_index if resume_from_index is not None else 0
+        if resume_from_index is None:
+            domains = skip_unmanaged_domains(domains, bulk_dns_remove_progress)
+            domains = order_by_account(domains, bulk_dns_remove_progress)
+        snapshots = load_optimistic_snapshots(domains[start_index:], bulk_dns_remove_progress) if optimistic else {}
 
         print(f"🗑️ Starting bulk DNS removal for {len(domains)} domains from index {start_index}")
         print(f"📝 Removing: {record_type} {host_name} {record_value if record_value else '(all values)'}")
 
-        # Process domains with rate limiting
-        for i, domain_name in enumerate(domains[start_index:], start_index + 1):
-            # Check if removal should stop
-            if bulk_dns_remove_progress["should_stop"]:
-                bulk_dns_remove_progress["status"] = "stopped"
-                bulk_dns_remove_progress["current_domain"] = ""
-                print(f"⏹ Bulk DNS removal stopped by user at domain {i}/{bulk_dns_remove_progress['total']}")
-                return
-
-            bulk_dns_remove_progress["processed"] = i
-            bulk_dns_remove_progress["current_domain"] = domain_name
-
+        def remove_from_domain(i, domain_name, api_client):
+            """Remove the matching records from one domain with retry logic for rate limits"""
             print(f"🗑️ Processing DNS removal {i}/{bulk_dns_remove_progress['total']}: {domain_name}")
 
-            # Remove DNS record with retry logic for rate limits
-            dns_removed = False
             dns_retry = 0
             max_dns_retries = 3
-
-            while dns_retry < max_dns_retries and not dns_removed:
+            while dns_retry < max_dns_retries:
                 try:
-                    # Get current DNS records
-                    existing_hosts = get_email_manager().api_client._get_all_hosts(domain_name)
-
-                    if existing_hosts is None:
-                        raise Exception("Could not fetch existing DNS records")
+                    # Get current DNS records (from the stored snapshot in optimistic mode)
+                    existing_hosts = get_hosts_for_write(domain_name, snapshots, bulk_dns_remove_progress, api_client)
 
                     # Filter out records to remove
-                    filtered_hosts = []
-                    removed_count = 0
-
-                    for host in existing_hosts:
-                        should_remove = False
-
-                        # Check if this record matches removal criteria
-                        if host.get('Type') == record_type and host.get('Name') == host_name:
-                            if record_value:
-                                # Remove only if value matches
-                                if host.get('Address') == record_value:
-                                    should_remove = True
-                                    removed_count += 1
-                            else:
-                                # Remove all records matching type and host
-                                should_remove = True
-                                removed_count += 1
-
-                        if not should_remove:
-                            filtered_hosts.append(host)
+                    filtered_hosts, removed_count = remove_records(existing_hosts, record_type, host_name, record_value)
 
                     if removed_count == 0:
                         print(f"  ℹ️ No matching records found for {domain_name}")
-                        bulk_dns_remove_progress["successful"] += 1
-                        dns_removed = True
-                        continue
+                        return "successful"
 
                     print(f"  🗑️ Removing {removed_count} DNS record(s) from {domain_name}")
 
-                    # Update DNS via setHosts API with remaining records
-                    domain_parts = domain_name.split('.')
-                    if len(domain_parts) < 2:
-                        raise Exception(f"Invalid domain format: {domain_name}")
-
-                    sld = domain_parts[0]
-                    tld = '.'.join(domain_parts[1:])
-
-                    # Handle common multi-part TLDs
-                    common_tlds = ['co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au']
-                    for common_tld in common_tlds:
-                        if domain_name.endswith('.' + common_tld):
-                            sld = domain_name.replace('.' + common_tld, '')
-                            tld = common_tld
-                            break
-
-                    # Build setHosts parameters with remaining records
-                    params = {'SLD': sld, 'TLD': tld}
-
-                    for idx, record in enumerate(filtered_hosts, 1):
-                        params[f'HostName{idx}'] = record['Name']
-                        params[f'RecordType{idx}'] = record['Type']
-                        params[f'Address{idx}'] = record['Address']
-                        params[f'TTL{idx}'] = record['TTL']
-                        if record.get('MXPref'):
-                            params[f'MXPref{idx}'] = record['MXPref']
-
-                    # Make API call
-                    response = get_email_manager().api_client._make_request('namecheap.domains.dns.setHosts', **params)
-
-                    # Check response
-                    command_response = None
-                    for key, value in response.items():
-                        if 'CommandResponse' in key:
-                            command_response = value
-                            break
-
-                    if command_response:
-                        hosts_result = None
-                        for key, value in command_response.items():
-                            if 'DomainDNSSetHostsResult' in key:
-                                hosts_result = value
-                                break
-
-                        if hosts_result and hosts_result.get('IsSuccess') == 'true':
-                            print(f"  ✅ DNS records removed from {domain_name}")
-                            bulk_dns_remove_progress["successful"] += 1
-                            dns_removed = True
-                        else:
-                            raise Exception(f"Namecheap API returned failure: {hosts_result}")
-                    else:
-                        raise Exception("Unexpected response format from Namecheap")
+                    # Update DNS via setHosts API with remaining records (also stores them locally)
+                    api_client.set_hosts(domain_name, filtered_hosts)
+                    print(f"  ✅ DNS records removed from {domain_name}")
+                    return "successful"
 
                 except Exception as dns_error:
                     dns_retry += 1
-                    error_msg = str(dns_error)
-
-                    # Check for rate limiting indicators
-                    is_rate_limited = (
-                        "too many requests" in error_msg.lower() or
-                        "rate limit" in error_msg.lower() or
-                        "connection/timeout error" in error_msg.lower() or
-                        "502" in error_msg or "503" in error_msg or "504" in error_msg
-                    )
 
-                    if is_rate_limited:
-                        if dns_retry <= 2:  # Only retry twice, then pause
-                            wait_time = 5 * dns_retry
-                            print(f"  ⏳ Rate limited for {domain_name}, waiting {wait_time}s")
-                            time.sleep(wait_time)
-                            continue
-                        else:
-                            # Rate limit hit, pause the removal
-                            print(f"🚫 Rate limit detected at domain {domain_name}. Pausing DNS removal...")
-                            bulk_dns_remove_progress["status"] = "rate_limited"
-                            bulk_dns_remove_progress["current_domain"] = domain_name
-                            bulk_dns_remove_progress["paused_at_index"] = i - 1
-                            bulk_dns_remove_progress["paused_domains"] = domains
-                            bulk_dns_remove_progress["rate_limit_message"] = f"Namecheap rate limit exceeded at domain {domain_name}. Please wait and click Resume to continue."
-                            return
-                    else:
+                    if not is_rate_limit_error(dns_error):
                         print(f"  ⚠️ Error removing DNS from {domain_name}: {dns_error}")
                         bulk_dns_remove_progress["errors"].append(f"{domain_name}: {str(dns_error)}")
-                        break
+                        return "failed"
 
-            # Small delay between domains
-            time.sleep(1.5)
+                    if dns_retry > 2:  # Only retry twice, then pause
+                        return "rate_limited"
+
+                    wait_time = 5 * dns_retry
+                    print(f"  ⏳ Rate limited for {domain_name}, waiting {wait_time}s")
+                    time.sleep(wait_time)
+
+            return "failed"
+
+        outcome = run_account_rounds(domains, start_index, bulk_dns_remove_progress, remove_from_domain, "bulk DNS removal",
+                                     operation="dns_remove",
+                                     payload_key=payload_hash("dns_remove", [record_type, host_name, record_value]))
+        if outcome != "completed":
+            return
 
         bulk_dns_remove_progress["status"] = "completed"
         bulk_dns_remove_progress["current_domain"] = ""
@@ -4029,7 +4705,7 @@ def bulk_dns_remove():
 
     try:
         data = request.get_json()
-        domains = data.get('domains', [])
+        domains = domains_from_search(data)
         record_type = data.get('record_type')
         host_name = data.get('host_name')
         record_value = data.get('record_value')
@@ -4044,9 +4720,18 @@ def bulk_dns_remove():
             return jsonify({"error": "Host name is required"}), 400
 
         # Check if removal is already running
-        if bulk_dns_remove_progress["status"] == "running":
+        if job_in_progress("bulk_dns_remove_progress"):
             return jsonify({"error": "Bulk DNS removal already in progress"}), 409
 
+        # Optionally leave out domains without a matching stored record
+        skipped = []
+        if data.get('only_changed'):
+            domains, skipped = restrict_to_planned_domains(
+                domains, plan_bulk_dns_change(domains, record_type=record_type, host_name=host_name,
+                                              record_value=record_value))
+            if not domains:
+                return jsonify({"status": "nothing_to_do", "total": 0, "skipped": skipped})
+
         # Reset progress
         bulk_dns_remove_progress = {
             "status": "starting",
@@ -4063,20 +4748,25 @@ def bulk_dns_remove():
                 "type": record_type,
                 "host": host_name,
                 "value": record_value
-            }
+            },
+            "skipped": skipped,
+            "optimistic_mode": bool(data.get('optimistic')),
+            "force": bool(data.get('force')),
+            "api_calls": 0
         }
 
-        # Start background removal
-        dns_thread = threading.Thread(
-            target=background_bulk_dns_remove,
-            args=(domains, record_type, host_name, record_value)
+        # Queue background removal
+        job_id = job_runner.submit(
+            'bulk_dns_remove',
+            args=(domains, record_type, host_name, record_value, None, bulk_dns_remove_progress["optimistic_mode"]),
+            progress=bulk_dns_remove_progress
         )
-        dns_thread.daemon = True
-        dns_thread.start()
 
         return jsonify({
             "status": "started",
+            "job_id": job_id,
             "total": len(domains),
+            "skipped": len(skipped),
             "record_type": record_type,
             "host_name": host_name
         })
@@ -4087,6 +4777,8 @@ def bulk_dns_remove():
 @app.route('/api/bulk-dns-remove-progress', methods=['GET'])
 def get_bulk_dns_remove_progress():
     """Get bulk DNS removal progress"""
+    bulk_dns_remove_progress = current_progress("bulk_dns_remove_progress")
+
     return jsonify({
         "status": bulk_dns_remove_progress["status"],
         "processed": bulk_dns_remove_progress["processed"],
@@ -4096,17 +4788,20 @@ def get_bulk_dns_remove_progress():
         "errors": bulk_dns_remove_progress["errors"][-5:] if bulk_dns_remove_progress["errors"] else [],
         "total_errors": len(bulk_dns_remove_progress["errors"]) if bulk_dns_remove_progress["errors"] else 0,
         "rate_limit_message": bulk_dns_remove_progress.get("rate_limit_message"),
-        "paused_at_index": bulk_dns_remove_progress.get("paused_at_index")
+        "paused_at_index": bulk_dns_remove_progress.get("paused_at_index"),
+        "skipped": bulk_dns_remove_progress.get("skipped") or [],
+        "api_calls": bulk_dns_remove_progress.get("api_calls", 0),
+        "optimistic": bulk_dns_remove_progress.get("optimistic")
     })
 
 @app.route('/api/stop-bulk-dns-remove', methods=['POST'])
 @require_auth
 def stop_bulk_dns_remove():
     """Stop bulk DNS removal"""
-    global bulk_dns_remove_progress
+    bulk_dns_remove_progress = current_progress("bulk_dns_remove_progress")
 
     if bulk_dns_remove_progress["status"] == "running":
-        bulk_dns_remove_progress["should_stop"] = True
+        request_job_stop(bulk_dns_remove_progress)
         return jsonify({"status": "stopping"})
     else:
         return jsonify({"error": "No bulk DNS removal in progress"}), 400
@@ -4116,6 +4811,7 @@ def stop_bulk_dns_remove():
 def resume_bulk_dns_remove():
     """Resume a paused bulk DNS removal"""
     global bulk_dns_remove_progress
+    bulk_dns_remove_progress = current_progress("bulk_dns_remove_progress")
 
     if bulk_dns_remove_progress["status"] != "rate_limited":
         return jsonify({"error": "No paused bulk DNS removal to resume"}), 400
@@ -4133,21 +4829,21 @@ def resume_bulk_dns_remove():
 
         criteria = bulk_dns_remove_progress.get("remove_criteria", {})
 
-        # Start background thread to resume
-        dns_thread = threading.Thread(
-            target=background_bulk_dns_remove,
+        # Queue a job that continues from the pause point
+        job_id = job_runner.submit(
+            'bulk_dns_remove',
             args=(
                 bulk_dns_remove_progress["paused_domains"],
                 criteria.get("type"),
                 criteria.get("host"),
                 criteria.get("value"),
-                bulk_dns_remove_progress["paused_at_index"]
-            )
+                bulk_dns_remove_progress["paused_at_index"],
+                bulk_dns_remove_progress.get("optimistic_mode", False)
+            ),
+            progress=bulk_dns_remove_progress
         )
-        dns_thread.daemon = True
-        dns_thread.start()
 
-        return jsonify({"status": "resumed", "message": "Bulk DNS removal resumed successfully"})
+        return jsonify({"status": "resumed", "job_id": job_id, "message": "Bulk DNS removal resumed successfully"})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -4156,7 +4852,6 @@ def resume_bulk_dns_remove():
 def check_dns_for_domain(domain_name):
     """Check stored DNS records for a domain and update DNS issues column"""
     try:
-        db = Database()
         issues = db.check_dns_records_for_domain(domain_name)
         db.update_domain_dns_issues(domain_name, issues)
 
@@ -4168,10 +4863,19 @@ def check_dns_for_domain(domain_name):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-def _wait_for_rate_limit_resume(rate_limit_state, progress_dict, domain_index):
-    """Wait for rate limit pause to end, updating progress. Returns True if should stop."""
+def _wait_for_rate_limit_resume(rate_limit_state, progress_dict, domain_index, account_id=None):
+    """Wait for rate limit pause to end, updating progress. Returns True if should stop.
+
+    account_id names the account whose limiter paused, so the resume endpoint can end
+    the pause; a resume requested on the job row ends it from another process.
+    """
     progress_dict["status"] = "paused"
     progress_dict["paused_at_index"] = domain_index
+    progress_dict["paused_account_id"] = account_id
+    job_id = progress_dict.get("job_id")
+    if job_id:
+        # A resume requested before this pause does not end it
+        db.take_job_resume_request(job_id)
     rate_status = rate_limit_state.get_status()
     progress_dict["pause_until"] = rate_status["pause_until"]
     progress_dict["rate_limit_message"] = f"Rate limit hit. Auto-resuming in {int(rate_status['time_until_resume'])}s"
@@ -4180,7 +4884,10 @@ def _wait_for_rate_limit_resume(rate_limit_state, progress_dict, domain_index):
         if progress_dict["should_stop"]:
             progress_dict["status"] = "stopped"
             return True
-        time.sleep(10)
+        if job_id and db.take_job_resume_request(job_id):
+            rate_limit_state.resume()
+            break
+        time.sleep(5)
         remaining = rate_limit_state.get_status()["time_until_resume"]
         progress_dict["rate_limit_message"] = f"Rate limit hit. Auto-resuming in {int(remaining)}s"
 
@@ -4190,13 +4897,31 @@ def _wait_for_rate_limit_resume(rate_limit_state, progress_dict, domain_index):
     return False
 
 
+# Stored DNS records younger than this answer a DNS check without calling the API
+DNS_CHECK_MAX_AGE = int(os.environ.get('DNS_CHECK_MAX_AGE_HOURS', 24)) * 3600
+
+
 def background_dns_check(domains, start_index=0):
     """Background function to check DNS records with rate limiting and pause/resume"""
     global dns_check_progress
-    from namecheap_client import rate_limit_state
 
     try:
         dns_check_progress["status"] = "running"
+
+        if start_index == 0:
+            domains = skip_unmanaged_domains(domains, dns_check_progress)
+
+            # Answer domains with fresh stored records first; only the rest cost API calls.
+            # The reordered list is kept so paused_at_index stays valid on resume.
+            fresh_domains = db.get_domains_with_fresh_dns_records(domains, DNS_CHECK_MAX_AGE)
+            domains = [d for d in domains if d in fresh_domains] + [d for d in domains if d not in fresh_domains]
+            dns_check_progress["from_stored_records"] = len(fresh_domains)
+            dns_check_progress["api_fetches"] = len(domains) - len(fresh_domains)
+            print(f"DNS check: {len(fresh_domains)} domains from stored records, {len(domains) - len(fresh_domains)} need an API fetch")
+        else:
+            # Keep the resumed order, but remaining domains with fresh records still need no API call
+            fresh_domains = db.get_domains_with_fresh_dns_records(domains[start_index:], DNS_CHECK_MAX_AGE)
+
         dns_check_progress["total"] = len(domains)
         dns_check_progress["paused_domains"] = domains
 
@@ -4207,35 +4932,42 @@ def background_dns_check(domains, start_index=0):
                 print(f"DNS check stopped by user at domain {i}/{len(domains)}")
                 return
 
-            if rate_limit_state.get_status()["is_paused"]:
+            dns_check_progress["processed"] = i
+            dns_check_progress["current_domain"] = domain_name
+
+            if domain_name in fresh_domains:
+                issues = db.check_dns_records_for_domain(domain_name)
+                db.update_domain_dns_issues(domain_name, issues)
+                dns_check_progress["successful"] += 1
+                continue
+
+            # Pauses and 429s belong to the Namecheap account that owns the domain
+            account_id = db.get_domain_accounts([domain_name])[domain_name]
+            api_client = get_account_manager(account_id).api_client
+            account_rate_limit_state = api_client.rate_limit
+
+            if account_rate_limit_state.get_status()["is_paused"]:
                 print(f"DNS check paused due to rate limit at domain {i}/{len(domains)}")
-                if _wait_for_rate_limit_resume(rate_limit_state, dns_check_progress, i - 1):
+                if _wait_for_rate_limit_resume(account_rate_limit_state, dns_check_progress, i - 1, account_id):
                     return
                 print("DNS check resuming after rate limit pause")
 
-            dns_check_progress["processed"] = i
-            dns_check_progress["current_domain"] = domain_name
-
             print(f"Checking DNS {i}/{len(domains)}: {domain_name}")
 
             max_retries = 3
             for retry in range(max_retries):
                 try:
-                    thread_db = Database()
-                    issues = thread_db.check_dns_records_for_domain(domain_name)
-
-                    if issues is None:
-                        print(f"No DNS records in DB for {domain_name}, fetching from API...")
-                        dns_records = get_email_manager().api_client._get_all_hosts(domain_name)
+                    # Stored records are missing or stale - refresh them from the API
+                    dns_records = api_client._get_all_hosts(domain_name, raise_errors=True)
 
-                        if dns_records:
-                            thread_db.backup_dns_records(domain_name, dns_records)
-                            print(f"Stored {len(dns_records)} DNS records for {domain_name}")
-                            issues = thread_db.check_dns_records_for_domain(domain_name)
-                        else:
-                            issues = "No DNS records found"
+                    if dns_records:
+                        db.backup_dns_records(domain_name, dns_records)
+                        print(f"Stored {len(dns_records)} DNS records for {domain_name}")
+                        issues = db.check_dns_records_for_domain(domain_name)
+                    else:
+                        issues = db.check_dns_records_for_domain(domain_name) or "No DNS records found"
 
-                    thread_db.update_domain_dns_issues(domain_name, issues)
+                    db.update_domain_dns_issues(domain_name, issues)
                     dns_check_progress["successful"] += 1
                     print(f"DNS check for {domain_name}: {issues}")
                     break
@@ -4250,8 +4982,8 @@ def background_dns_check(domains, start_index=0):
 
                     if is_rate_limited:
                         print(f"Rate limit hit on {domain_name}, pausing for 15 minutes...")
-                        rate_limit_state.set_paused(900, f"Rate limit at {domain_name}")
-                        if _wait_for_rate_limit_resume(rate_limit_state, dns_check_progress, i - 1):
+                        account_rate_limit_state.set_paused(900, f"Rate limit at {domain_name}")
+                        if _wait_for_rate_limit_resume(account_rate_limit_state, dns_check_progress, i - 1, account_id):
                             return
                         continue
 
@@ -4279,12 +5011,13 @@ def check_dns_for_selected():
 
     try:
         data = request.json
-        domains = data.get('domains', [])
+        # Any number of domains - the job paces API calls through the rate limiter
+        domains = list(dict.fromkeys(data.get('domains', [])))
 
         if not domains:
             return jsonify({"error": "No domains provided"}), 400
 
-        if dns_check_progress["status"] == "running":
+        if job_in_progress("dns_check_progress") or current_progress("dns_check_progress")["status"] == "paused":
             return jsonify({"error": "DNS check already in progress"}), 400
 
         dns_check_progress = {
@@ -4301,12 +5034,11 @@ def check_dns_for_selected():
             "pause_until": None
         }
 
-        thread = threading.Thread(target=background_dns_check, args=(domains,))
-        thread.daemon = True
-        thread.start()
+        job_id = job_runner.submit('dns_check', args=(domains,), progress=dns_check_progress)
 
         return jsonify({
             "status": "started",
+            "job_id": job_id,
             "message": f"Started DNS check for {len(domains)} domains",
             "total": len(domains)
         })
@@ -4321,9 +5053,9 @@ def check_dns_for_selected():
 @app.route('/api/dns-check-progress', methods=['GET'])
 def get_dns_check_progress():
     """Get DNS check progress including pause status"""
-    from namecheap_client import rate_limit_state
-
-    rate_status = rate_limit_state.get_status()
+    dns_check_progress = current_progress("dns_check_progress")
+    # Status of the limiter of the account the check last paused on
+    rate_status = account_rate_limit(dns_check_progress.get("paused_account_id")).get_status()
 
     return jsonify({
         "status": dns_check_progress["status"],
@@ -4336,6 +5068,7 @@ def get_dns_check_progress():
         "rate_limit_message": dns_check_progress.get("rate_limit_message"),
         "paused_at_index": dns_check_progress.get("paused_at_index"),
         "pause_until": dns_check_progress.get("pause_until"),
+        "skipped": dns_check_progress.get("skipped") or [],
         "rate_limit_status": rate_status
     })
 
@@ -4343,10 +5076,10 @@ def get_dns_check_progress():
 @app.route('/api/dns-check-stop', methods=['POST'])
 def stop_dns_check():
     """Stop the DNS check process"""
-    global dns_check_progress
+    dns_check_progress = current_progress("dns_check_progress")
 
     if dns_check_progress["status"] in ["running", "paused"]:
-        dns_check_progress["should_stop"] = True
+        request_job_stop(dns_check_progress)
         return jsonify({"status": "stopping"})
 
     return jsonify({"status": "not_running"})
@@ -4356,23 +5089,29 @@ def stop_dns_check():
 def resume_dns_check():
     """Resume DNS check after rate limit pause"""
     global dns_check_progress
-    from namecheap_client import rate_limit_state
 
-    if dns_check_progress["status"] != "paused":
+    dns_check_progress = current_progress("dns_check_progress")
+    if dns_check_progress["status"] not in ["paused", "rate_limited"]:
         return jsonify({"error": "DNS check not paused"}), 400
 
-    rate_limit_state.resume()
+    account_rate_limit(dns_check_progress.get("paused_account_id")).resume()
+    paused_index = dns_check_progress.get("paused_at_index") or 0
+
+    # A job still waiting out its pause may be in the worker process, whose limiters
+    # this process cannot reach - it picks the resume up from the job row
+    job = db.get_job(dns_check_progress["job_id"]) if dns_check_progress.get("job_id") else None
+    if job and job['status'] == 'running':
+        db.request_job_resume(job['id'])
+        return jsonify({"status": "resumed", "from_index": paused_index})
+
     dns_check_progress["status"] = "running"
     dns_check_progress["should_stop"] = False
     dns_check_progress["rate_limit_message"] = None
 
-    paused_index = dns_check_progress.get("paused_at_index", 0)
     domains = dns_check_progress.get("paused_domains", [])
 
     if domains:
-        thread = threading.Thread(target=background_dns_check, args=(domains, paused_index))
-        thread.daemon = True
-        thread.start()
+        job_runner.submit('dns_check', args=(domains, paused_index), progress=dns_check_progress)
 
     return jsonify({"status": "resumed", "from_index": paused_index})
 
@@ -4383,6 +5122,411 @@ def get_rate_limit_status():
     from namecheap_client import rate_limit_state
     return jsonify(rate_limit_state.get_status())
 
+@app.route('/api/jobs/<int:job_id>/operations', methods=['GET'])
+@require_auth
+def get_job_operations(job_id):
+    """Per-domain operations a job performed, with outcome counts and the API calls it spent"""
+    job = db.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify({"job_id": job_id, "job_type": job['job_type'], "status": job['status'],
+                    **db.get_job_operations(job_id)})
+
+@app.route('/api/accounts', methods=['GET'])
+@require_auth
+def get_accounts():
+    """List Namecheap accounts with their domain counts and rate limit status (credentials masked)"""
+    domain_counts = db.get_account_domain_counts()
+
+    accounts = [{
+        "id": None,
+        "name": "default",
+        "api_user": os.environ.get('NAMECHEAP_API_USER'),
+        "domains": domain_counts.get(None, 0),
+        "rate_limit": rate_limit_state.get_status()
+    }]
+    for account in db.get_accounts():
+        accounts.append({
+            "id": account['id'],
+            "name": account['name'],
+            "api_user": account['api_user'],
+            "client_ip": account['client_ip'],
+            "domains": domain_counts.get(account['id'], 0),
+            "rate_limit": get_account_rate_limit(account).get_status()
+        })
+
+    return jsonify({"accounts": accounts})
+
+@app.route('/api/accounts', methods=['POST'])
+@require_auth
+def add_account():
+    """Add a Namecheap account; its domains are tagged by the next inventory pass"""
+    try:
+        data = request.get_json()
+        for field in ('name', 'api_user', 'api_key'):
+            if not data.get(field):
+                return jsonify({"error": f"Missing required field: {field}"}), 400
+
+        account_id = db.add_account(
+            data['name'],
+            data['api_user'],
+            data['api_key'],
+            username=data.get('username'),
+            client_ip=data.get('client_ip'),
+            requests_per_minute=int(data.get('requests_per_minute', 20)),
+            requests_per_hour=int(data.get('requests_per_hour', 700)),
+            requests_per_day=int(data.get('requests_per_day', 8000))
+        )
+        return jsonify({"status": "success", "id": account_id})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/accounts/<int:account_id>/domains', methods=['POST'])
+@require_auth
+def assign_account_domains(account_id):
+    """Tag domains with an account by hand (the inventory pass does this automatically)"""
+    try:
+        if not db.get_account(account_id):
+            return jsonify({"error": "Account not found"}), 404
+
+        domains = (request.get_json() or {}).get('domains', [])
+        if not domains:
+            return jsonify({"error": "No domains provided"}), 400
+
+        db.assign_domains_to_account(domains, account_id)
+        return jsonify({"status": "success", "assigned": len(domains)})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# DNS snapshot history retention - a version is kept while it is one of the newest N of its
+# domain or was current within the last X days
+DNS_HISTORY_KEEP_VERSIONS = int(os.environ.get('DNS_HISTORY_KEEP_VERSIONS', 10))
+DNS_HISTORY_KEEP_DAYS = int(os.environ.get('DNS_HISTORY_KEEP_DAYS', 90))
+# Rows deleted per transaction, so syncs can write between batches
+COMPACTION_BATCH_SIZE = 500
+
+
+def new_compaction_progress(keep_versions, keep_days):
+    """Fresh compaction_progress for a retention run"""
+    return {
+        "status": "starting",
+        "keep_versions": keep_versions,
+        "keep_days": keep_days,
+        "deleted_versions": 0,
+        "deleted_snapshots": 0,
+        "reclaimed_bytes": 0,
+        "errors": [],
+        "should_stop": False
+    }
+
+def background_history_compaction(keep_versions, keep_days):
+    """Background retention pass - deletes expired DNS snapshot versions in small batches, then compacts the database"""
+    global compaction_progress
+
+    try:
+        compaction_progress["status"] = "running"
+        print(f"🧹 Compacting DNS history (keeping {keep_versions} versions or {keep_days} days per domain)...")
+
+        for key, delete_batch in (
+                ("deleted_versions", lambda: db.delete_expired_dns_versions(keep_versions, keep_days, COMPACTION_BATCH_SIZE)),
+                ("deleted_snapshots", lambda: db.delete_orphaned_dns_snapshots(COMPACTION_BATCH_SIZE))):
+            while True:
+                if compaction_progress["should_stop"]:
+                    compaction_progress["status"] = "stopped"
+                    return
+                deleted = delete_batch()
+                compaction_progress[key] += deleted
+                if deleted < COMPACTION_BATCH_SIZE:
+                    break
+                time.sleep(0.05)
+
+        result = db.compact_database()
+        compaction_progress.update(result)
+        compaction_progress["status"] = "completed"
+        print(f"✅ DNS history compacted: {compaction_progress['deleted_versions']} versions and "
+              f"{compaction_progress['deleted_snapshots']} snapshots deleted, "
+              f"{result['reclaimed_bytes'] / 1024 / 1024:.2f} MB reclaimed ({result['vacuum']} vacuum)")
+
+    except Exception as e:
+        print(f"❌ DNS history compaction failed: {e}")
+        compaction_progress["status"] = "error"
+        compaction_progress["error"] = str(e)
+
+@app.route('/api/compact-history', methods=['POST'])
+@require_auth
+def compact_history():
+    """Start a DNS history retention and compaction pass, optionally with its own keep_versions/keep_days"""
+    global compaction_progress
+
+    try:
+        if job_in_progress("compaction_progress"):
+            return jsonify({"error": "Compaction already in progress"}), 409
+
+        data = request.get_json(silent=True) or {}
+        keep_versions = int(data.get('keep_versions', DNS_HISTORY_KEEP_VERSIONS))
+        keep_days = int(data.get('keep_days', DNS_HISTORY_KEEP_DAYS))
+        if keep_versions < 1 or keep_days < 0:
+            return jsonify({"error": "keep_versions must be at least 1 and keep_days at least 0"}), 400
+
+        compaction_progress = new_compaction_progress(keep_versions, keep_days)
+        job_id = job_runner.submit('history_compaction', args=(keep_versions, keep_days), progress=compaction_progress)
+
+        return jsonify({"status": "started", "job_id": job_id})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/compaction-progress', methods=['GET'])
+def get_compaction_progress():
+    """Get the result of the latest DNS history compaction, with the current database size"""
+    return jsonify({**current_progress("compaction_progress"), "database": db.get_database_size()})
+
+# Progress streams (Server-Sent Events) - push job state to the browser instead of 1s polling
+PROGRESS_STREAMS = {
+    'sync': 'sync_progress',
+    'bulk-dns': 'bulk_dns_progress',
+    'bulk-dns-remove': 'bulk_dns_remove_progress',
+    'dns-check': 'dns_check_progress',
+    'bulk-update': 'bulk_update_progress',
+    'inventory': 'inventory_progress',
+    'compaction': 'compaction_progress'
+}
+# Keys that are only needed by the job itself and would bloat every event
+STREAM_HIDDEN_KEYS = {'paused_domains', 'all_domains', 'records_data', 'should_stop'}
+# Growing lists that are sent incrementally; their lengths make up the event id
+STREAM_APPEND_KEYS = ('errors', 'results', 'skipped')
+# Statuses after which nothing changes until the user starts or resumes a job
+FINISHED_STATUSES = {'completed', 'error', 'stopped', 'idle', 'rate_limited'}
+# The job runner stores progress at most once a second, so checking more often finds nothing new
+STREAM_CHECK_INTERVAL = 1.5
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_MAX_SECONDS = 300
+
+
+def _parse_last_event_id(last_event_id):
+    """Split a progress event id ("<job_id>:<errors>:<results>:<skipped>") into the job id and list cursors"""
+    cursors = {key: 0 for key in STREAM_APPEND_KEYS}
+    try:
+        job_id, *counts = last_event_id.split(':')
+        for key, count in zip(STREAM_APPEND_KEYS, counts):
+            cursors[key] = int(count)
+        return (int(job_id) if job_id else None), cursors
+    except (AttributeError, ValueError):
+        return None, {key: 0 for key in STREAM_APPEND_KEYS}
+
+
+def _progress_event(progress, cursors):
+    """Build the state of one progress event and the list items the client has not seen yet"""
+    state = {key: value for key, value in progress.items()
+             if key not in STREAM_HIDDEN_KEYS and key not in STREAM_APPEND_KEYS}
+    new_items = {}
+    for key in STREAM_APPEND_KEYS:
+        items = progress.get(key) or []
+        state[f"total_{key}"] = len(items)
+        new_items[f"new_{key}"] = items[cursors[key]:]
+    # Same shape as the JSON progress endpoints
+    state["errors"] = (progress.get("errors") or [])[-5:]
+    return state, new_items
+
+
+@app.route('/api/progress-stream/<stream_name>', methods=['GET'])
+def progress_stream(stream_name):
+    """Stream progress of a background job family as Server-Sent Events"""
+    progress_key = PROGRESS_STREAMS.get(stream_name)
+    if not progress_key:
+        return jsonify({"error": f"Unknown progress stream: {stream_name}"}), 404
+
+    last_job_id, cursors = _parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+
+    def generate():
+        nonlocal last_job_id, cursors
+        last_snapshot = None
+        last_version = ()
+        last_sent = time.time()
+        started = time.time()
+
+        # Tell the browser how long to wait before reconnecting
+        yield "retry: 2000\n\n"
+
+        while time.time() - started < STREAM_MAX_SECONDS:
+            # Only load and decode the progress once the job's status or progress_version moved
+            version = db.get_latest_job_version(progress_key)
+            if version != last_version:
+                last_version = version
+                progress = current_progress(progress_key)
+                job_id = progress.get("job_id")
+                if job_id != last_job_id:
+                    # A different job started since the client's last event
+                    last_job_id = job_id
+                    cursors = {key: 0 for key in STREAM_APPEND_KEYS}
+
+                state, new_items = _progress_event(progress, cursors)
+                snapshot = json.dumps(state, default=str, sort_keys=True)
+                if snapshot != last_snapshot:
+                    cursors = {key: state[f"total_{key}"] for key in STREAM_APPEND_KEYS}
+                    last_snapshot = snapshot
+                    last_sent = time.time()
+                    event_id = ':'.join([str(job_id or '')] + [str(cursors[key]) for key in STREAM_APPEND_KEYS])
+                    data = json.dumps({**state, **new_items}, default=str)
+                    yield f"id: {event_id}\nevent: progress\ndata: {data}\n\n"
+
+                    if progress.get("status") in FINISHED_STATUSES:
+                        return
+
+            if time.time() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                last_sent = time.time()
+                yield ": keepalive\n\n"
+
+            time.sleep(STREAM_CHECK_INTERVAL)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+job_runner.register('sync_all', background_sync_with_rate_limiting, 'sync_progress')
+job_runner.register('sync_selected', background_sync_selected_domains, 'sync_progress')
+job_runner.register('bulk_dns_update', background_bulk_dns_update, 'bulk_dns_progress')
+job_runner.register('bulk_dns_remove', background_bulk_dns_remove, 'bulk_dns_remove_progress')
+job_runner.register('dns_check', background_dns_check, 'dns_check_progress')
+job_runner.register('bulk_update', background_bulk_update, 'bulk_update_progress')
+job_runner.register('inventory', background_inventory_sync, 'inventory_progress')
+job_runner.register('history_compaction', background_history_compaction, 'compaction_progress')
+
+if not job_runner.external:
+    # Jobs of a previous inline process died with it
+    job_runner.recover_stale_jobs()
+
+# Periodic refresh work, queued by whichever process executes jobs
+STALENESS_REFRESH_MINUTES = 30
+
+
+def take_within_account_budgets(domains, budget, allowance):
+    """
+    Keep the domains, in order, that one API call each still fits on their own account
+
+    Args:
+        domains: Candidate domain names, most urgent first
+        budget: Scheduler budget of the environment account
+        allowance: Maps an account's {"hour", "day"} budget to the calls this run may spend on it
+    """
+    domain_accounts = db.get_domain_accounts(domains)
+    allowances = {}
+    batch = []
+    for domain_name in domains:
+        account_id = domain_accounts.get(domain_name)
+        if account_id not in allowances:
+            account_budget = budget if account_id is None else account_rate_limit(account_id).get_budget(scheduler.headroom)
+            allowances[account_id] = allowance(account_budget)
+        if allowances[account_id] > 0:
+            allowances[account_id] -= 1
+            batch.append(domain_name)
+    return batch
+
+
+def plan_nightly_inventory(budget):
+    """Inventory pass - a few getList pages, queues hosts syncs for new domains"""
+    if budget["day"] < 50:
+        return None
+    return 'inventory', (True,), {
+        "status": "starting",
+        "total": 0,
+        "new": [],
+        "removed": [],
+        "expired": [],
+        "hosts_sync_job_id": None,
+        "errors": [],
+        "should_stop": False,
+        "scheduled": True
+    }
+
+
+def plan_staleness_refresh(budget):
+    """Incremental sync of the most urgent stale domains, one getHosts call each"""
+    now = datetime.now()
+    minutes_left_today = 24 * 60 - (now.hour * 60 + now.minute)
+    runs_left_today = max(1, minutes_left_today // STALENESS_REFRESH_MINUTES)
+    runs_per_hour = 60 // STALENESS_REFRESH_MINUTES
+
+    domains = db.get_account_domain_names()
+    unmanaged = db.get_unmanaged_domains(domains)
+    stale = db.get_domains_needing_sync([d for d in domains if d not in unmanaged], SYNC_MAX_AGE, SYNC_ISSUES_MAX_AGE)
+
+    # Spread what is left of each account's day evenly over the remaining runs
+    batch = take_within_account_budgets(
+        stale, budget, lambda account_budget: min(account_budget["hour"] // runs_per_hour,
+                                                  account_budget["day"] // runs_left_today)
+    )
+    if not batch:
+        return None
+
+    progress = new_sync_progress(batch)
+    progress["scheduled"] = True
+    return 'sync_selected', (batch,), progress
+
+
+def plan_weekly_dns_check(budget):
+    """DNS compliance check - fresh stored records are free, stale ones cost one getHosts call each"""
+    domains = db.get_account_domain_names()
+    unmanaged = db.get_unmanaged_domains(domains)
+    domains = [d for d in domains if d not in unmanaged]
+    if not domains:
+        return None
+
+    fresh = db.get_domains_with_fresh_dns_records(domains, DNS_CHECK_MAX_AGE)
+    stale = [d for d in domains if d not in fresh]
+
+    # Stale domains cost a getHosts call on their own account - half its daily budget, at most its hourly one
+    fetched = take_within_account_budgets(
+        stale, budget, lambda account_budget: min(account_budget["hour"], account_budget["day"] // 2)
+    )
+
+    batch = [d for d in domains if d in fresh] + fetched
+    return 'dns_check', (batch,), {
+        "status": "starting",
+        "processed": 0,
+        "total": len(batch),
+        "current_domain": "",
+        "successful": 0,
+        "errors": [],
+        "should_stop": False,
+        "paused_at_index": None,
+        "rate_limit_message": None,
+        "paused_domains": batch,
+        "pause_until": None,
+        "scheduled": True
+    }
+
+
+def plan_history_compaction(budget):
+    """DNS history retention - database only, no API calls"""
+    return 'history_compaction', (DNS_HISTORY_KEEP_VERSIONS, DNS_HISTORY_KEEP_DAYS), {
+        **new_compaction_progress(DNS_HISTORY_KEEP_VERSIONS, DNS_HISTORY_KEEP_DAYS),
+        "scheduled": True
+    }
+
+
+scheduler = Scheduler(db, job_runner, rate_limit_state)
+scheduler.add('nightly-inventory', '15 2 * * *', plan_nightly_inventory, 'inventory_progress')
+scheduler.add('staleness-refresh', f'*/{STALENESS_REFRESH_MINUTES} * * * *', plan_staleness_refresh, 'sync_progress')
+scheduler.add('weekly-dns-check', '0 4 * * 0', plan_weekly_dns_check, 'dns_check_progress')
+scheduler.add('nightly-history-compaction', '45 3 * * *', plan_history_compaction, 'compaction_progress')
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+if SCHEDULER_ENABLED and not job_runner.external:
+    scheduler.start()
+
+
+@app.route('/api/scheduler-status', methods=['GET'])
+def get_scheduler_status():
+    """Get the periodic schedules, their last runs and the API budget left for background work"""
+    return jsonify(scheduler.get_status())
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug_mode = os.environ.get('FLASK_ENV', 'production') == 'development'
@@ -3,12 +3,26 @@
 Database utilities for backup, restore, and maintenance
 """
 
+import io
 import os
-import shutil
 import sqlite3
+import tempfile
+import time
+from contextlib import redirect_stdout
 from datetime import datetime
 import json
 
+
+def _copy_database(source_path, target_path):
+    """Copy a database with sqlite's backup API, which includes pages still in the WAL file"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
 def backup_database(source_path=None, backup_dir=None):
     """Create a backup of the database"""
     if not source_path:
@@ -26,7 +40,7 @@ def backup_database(source_path=None, backup_dir=None):
     backup_path = os.path.join(backup_dir, backup_name)
 
     try:
-        shutil.copy2(source_path, backup_path)
+        _copy_database(source_path, backup_path)
         print(f"✅ Database backed up to: {backup_path}")
         return backup_path
     except Exception as e:
@@ -46,11 +60,11 @@ def restore_database(backup_path, target_path=None):
         # Create a safety backup of current database if it exists
         if os.path.exists(target_path):
             safety_backup = f"{target_path}.before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            shutil.copy2(target_path, safety_backup)
+            _copy_database(target_path, safety_backup)
             print(f"💾 Created safety backup: {safety_backup}")
 
         # Restore from backup
-        shutil.copy2(backup_path, target_path)
+        _copy_database(backup_path, target_path)
         print(f"✅ Database restored from: {backup_path}")
         return True
     except Exception as e:
@@ -72,8 +86,8 @@ def export_database_to_json(db_path=None, output_path=None):
 
         export_data = {}
 
-        # Export all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        # Export all tables - the search index is rebuilt by its triggers on import
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'domain_search%'")
         tables = cursor.fetchall()
 
         for table_row in tables:
@@ -122,6 +136,8 @@ def import_database_from_json(json_path, db_path=None):
         for table_name, rows in import_data.items():
             if table_name == 'sqlite_sequence':
                 continue  # Skip system table
+            if table_name.startswith('domain_search'):
+                continue  # Search index, kept up to date by its triggers
 
             for row in rows:
                 # Build INSERT query
@@ -139,6 +155,9 @@ def import_database_from_json(json_path, db_path=None):
         conn.commit()
         conn.close()
 
+        # INSERT OR REPLACE does not fire the delete triggers that keep the counters current
+        db.recount_domains()
+
         print(f"✅ Database imported from: {json_path}")
         return True
     except Exception as e:
@@ -186,6 +205,163 @@ def check_database_health(db_path=None):
         print(f"❌ Health check failed: {e}")
         return False
 
+def benchmark_domain_writes(domain_count=200):
+    """
+    Measure per-domain write latency of the sync loop, with a new connection per
+    call (rollback journal), persistent per-thread WAL connections, WAL with the
+    single-transaction apply_domain_snapshot, and WAL with the group-commit writer
+    """
+    from models import Database
+    from snapshot_writer import SnapshotWriter
+
+    class PerCallConnectionDatabase(Database):
+        def get_connection(self):
+            return sqlite3.connect(self.db_path)
+
+    records = [
+        {'Name': '@', 'Type': 'URL301', 'Address': 'https://example.com', 'TTL': '1800'},
+        {'Name': '@', 'Type': 'TXT', 'Address': 'v=spf1 include:_spf.google.com ~all', 'TTL': '1800'},
+        {'Name': '_dmarc', 'Type': 'TXT', 'Address': 'v=DMARC1; p=none', 'TTL': '1800'},
+        {'Name': 'google._domainkey', 'Type': 'TXT', 'Address': 'v=DKIM1; k=rsa; p=MIIB', 'TTL': '1800'},
+    ]
+    redirections = [{'type': 'URL Redirect (301)', 'target': 'https://example.com', 'name': '@'}]
+
+    def write_separately(db, domain_name):
+        # The calls the sync loop made for every domain before apply_domain_snapshot
+        db.add_or_update_domain(domain_name)
+        db.get_domain_id(domain_name)
+        db.backup_dns_records(domain_name, records)
+        db.update_redirections(domain_name, redirections)
+        db.update_domain_dns_issues(domain_name, db.check_dns_records_for_domain(domain_name))
+        db.update_domain_sync_status(domain_name, 'synced')
+
+    def write_snapshot(db, domain_name):
+        db.apply_domain_snapshot(domain_name, records)
+
+    def write_group_commit(db, domain_name):
+        if not hasattr(db, 'snapshot_writer'):
+            db.snapshot_writer = SnapshotWriter(db)
+        db.snapshot_writer.submit(domain_name, records)
+
+    results = {}
+    for label, database_class, write_domain in (
+            ('per-call connections', PerCallConnectionDatabase, write_separately),
+            ('persistent WAL connections', Database, write_separately),
+            ('persistent WAL connections, single transaction', Database, write_snapshot),
+            ('persistent WAL connections, group commit', Database, write_group_commit)):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with redirect_stdout(io.StringIO()):
+                db = database_class(os.path.join(temp_dir, 'benchmark.db'))
+                started = time.perf_counter()
+                for index in range(domain_count):
+                    write_domain(db, f"benchmark-{index}.com")
+                if hasattr(db, 'snapshot_writer'):
+                    db.snapshot_writer.flush()
+                elapsed = time.perf_counter() - started
+                db.close()
+        results[label] = elapsed * 1000 / domain_count
+        print(f"⏱️ {label}: {results[label]:.2f} ms per domain ({domain_count} domains)")
+
+    return results
+
+# Hot queries and the tables or partial indexes each may read in full - any other SCAN in their plan is a regression
+QUERY_PLAN_CHECKS = {
+    'domains with redirections': ('''
+        SELECT d.id, c.client_name, r.redirect_name
+        FROM domains d
+        LEFT JOIN clients c ON d.client_id = c.id
+        LEFT JOIN redirections r ON d.id = r.domain_id
+        ORDER BY d.domain_number, d.id
+    ''', (), {'d'}),
+    'replace redirections': ('DELETE FROM redirections WHERE domain_id = ?', (1,), set()),
+    'domain id lookup': ('SELECT id FROM domains WHERE domain_name = ?', ('example.com',), set()),
+    'current DNS snapshot': ('''
+        SELECT v.domain_name, s.records, v.checked_at
+        FROM dns_snapshot_versions v
+        JOIN dns_snapshots s ON s.content_hash = v.content_hash
+        WHERE v.domain_name IN (?, ?)
+          AND v.version = (SELECT MAX(version) FROM dns_snapshot_versions WHERE domain_name = v.domain_name)
+    ''', ('example.com', 'example.org'), set()),
+    'DNS backup history': ('''
+        SELECT v.created_at, s.record_count
+        FROM dns_snapshot_versions v
+        JOIN dns_snapshots s ON s.content_hash = v.content_hash
+        WHERE v.domain_name = ?
+        ORDER BY v.version DESC LIMIT 10
+    ''', ('example.com',), set()),
+    'client domains': ('UPDATE domains SET client_id = ? WHERE client_id = ?', (1, 2), set()),
+    'sync status': ('SELECT COUNT(*) FROM domains WHERE sync_status = ?', ('not_synced',), set()),
+    'domains missing DKIM': ('SELECT id FROM domains WHERE has_dkim = 0 ORDER BY domain_number LIMIT 200', (),
+                             {'idx_domains_missing_dkim'}),
+    'missing DNS record count': ('SELECT COUNT(*) FROM domains WHERE has_spf = 0', (), {'idx_domains_missing_spf'}),
+    'domain summary': ('SELECT dimension, value, count FROM domain_counters WHERE count > 0', (), {'domain_counters'}),
+    'domain search': ('''
+        SELECT d.domain_name, s.rank
+        FROM domain_search s
+        JOIN domains d ON d.id = s.rowid
+        WHERE domain_search MATCH ?
+        ORDER BY s.rank LIMIT 100
+    ''', ('"example"*',), {'s'}),
+    'API request counts': ('SELECT COUNT(*) FROM api_requests WHERE account_id IS ? AND requested_at > ?', (None, 0),
+                           set()),
+}
+
+# The next page of the domain list as built by Database.get_domains_page, per filter and sort
+DOMAINS_PAGE_QUERY = '''
+    SELECT d.id, d.domain_name, c.client_name
+    FROM domains d
+    LEFT JOIN clients c ON d.client_id = c.id
+    WHERE {conditions}({sort}, d.id) > (?, ?)
+    ORDER BY {sort}, d.id LIMIT ?
+'''
+for name, conditions, sort, params, allowed_scans in [
+    ('domain page', '', 'd.domain_number', (), set()),
+    ('domain page by name', '', 'd.domain_name', (), set()),
+    ('domain page by client name', '', "COALESCE(c.client_name, 'Unassigned')", (), {'d'}),
+    ('client domain page', 'd.client_id = ?', 'd.domain_number', (1,), set()),
+    ('sync status domain page', "COALESCE(d.sync_status, 'unchanged') = ?", 'd.domain_number', ('synced',), set()),
+    ('DNS issue domain page', 'd.dns_issues = ?', 'd.domain_number', ('No SPF',), set()),
+    ('missing DMARC domain page', 'd.has_dmarc = 0', 'd.domain_number', (), set()),
+]:
+    QUERY_PLAN_CHECKS[name] = (
+        DOMAINS_PAGE_QUERY.format(conditions=f'{conditions} AND ' if conditions else '', sort=sort),
+        (*params, 0, 0, 51), allowed_scans)
+
+
+def check_query_plans(db_path=None):
+    """Check EXPLAIN QUERY PLAN of the hot queries, returns False if any of them reads a table in full"""
+    from models import Database
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if not db_path:
+            # An empty database migrated to the current schema
+            db_path = os.path.join(temp_dir, 'explain.db')
+            with redirect_stdout(io.StringIO()):
+                Database(db_path).close()
+        elif not os.path.exists(db_path):
+            print(f"❌ Database not found at: {db_path}")
+            return False
+
+        conn = sqlite3.connect(db_path)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'domains'").fetchone():
+            conn.close()
+            print(f"❌ No domains table in {db_path} - start the app once to migrate it")
+            return False
+
+        passed = True
+        for name, (query, params, allowed_scans) in QUERY_PLAN_CHECKS.items():
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+            scans = [step for step in plan
+                     if step.startswith('SCAN ') and not allowed_scans & set(step.split()[1:])]
+            if scans:
+                passed = False
+                print(f"❌ {name}: {'; '.join(scans)}")
+            else:
+                print(f"✅ {name}: {'; '.join(plan)}")
+        conn.close()
+
+    return passed
+
 if __name__ == "__main__":
     import sys
 
@@ -196,6 +372,8 @@ if __name__ == "__main__":
         print("  python db_utils.py export [db_path] [output_json]")
         print("  python db_utils.py import <json_path> [db_path]")
         print("  python db_utils.py health [db_path]")
+        print("  python db_utils.py benchmark [domain_count]")
+        print("  python db_utils.py explain [db_path]")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -230,6 +408,15 @@ if __name__ == "__main__":
         db_path = sys.argv[2] if len(sys.argv) > 2 else None
         check_database_health(db_path)
 
+    elif command == "benchmark":
+        domain_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        benchmark_domain_writes(domain_count)
+
+    elif command == "explain":
+        db_path = sys.argv[2] if len(sys.argv) > 2 else None
+        if not check_query_plans(db_path):
+            sys.exit(1)
+
     else:
         print(f"❌ Unknown command: {command}")
         sys.exit(1)
\ No newline at end of file
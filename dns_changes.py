@@ -0,0 +1,230 @@
+"""
+DNS record set changes for email redirect tool
+Pure functions shared by the bulk DNS jobs, the dry-run planner and the database,
+so plans, writes and stored snapshots all derive from the same record set logic
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+def build_host_record(record_data: Dict) -> Dict:
+    """Convert a bulk-update record ({type, name, address, ttl, mx_pref}) into Namecheap host format"""
+    record = {
+        'Name': record_data['name'],
+        'Type': record_data['type'],
+        'Address': record_data['address'],
+        'TTL': record_data['ttl']
+    }
+
+    # Add MXPref for MX records
+    if record_data['type'] == 'MX' and record_data.get('mx_pref'):
+        record['MXPref'] = record_data['mx_pref']
+
+    return record
+
+
+def add_records(existing_hosts: List[Dict], records_data: List[Dict]) -> List[Dict]:
+    """
+    Apply a bulk DNS update to a record set
+
+    TXT records only replace exact duplicates (same name, type and value), other
+    record types replace existing records with the same name and type.
+
+    Returns:
+        List[Dict]: The complete record set to send with setHosts
+    """
+    all_records = list(existing_hosts)
+
+    for record_data in records_data:
+        if record_data['type'] == 'TXT':
+            all_records = [
+                host for host in all_records
+                if not (host.get('Name') == record_data['name'] and
+                        host.get('Type') == record_data['type'] and
+                        host.get('Address') == record_data['address'])
+            ]
+        else:
+            all_records = [
+                host for host in all_records
+                if not (host.get('Name') == record_data['name'] and host.get('Type') == record_data['type'])
+            ]
+
+        all_records.append(build_host_record(record_data))
+
+    return all_records
+
+
+def remove_records(existing_hosts: List[Dict], record_type: str, host_name: str,
+                   record_value: Optional[str] = None) -> Tuple[List[Dict], int]:
+    """
+    Apply a bulk DNS removal to a record set
+
+    Returns:
+        Tuple of the remaining records and the number of records removed
+    """
+    remaining = []
+    removed_count = 0
+
+    for host in existing_hosts:
+        matches = host.get('Type') == record_type and host.get('Name') == host_name
+        if matches and (not record_value or host.get('Address') == record_value):
+            removed_count += 1
+        else:
+            remaining.append(host)
+
+    return remaining, removed_count
+
+
+def _record_key(record: Dict) -> Tuple:
+    """Comparable identity of a host record, including TTL and MX preference"""
+    return (
+        str(record.get('Name', '@')),
+        str(record.get('Type', '')).upper(),
+        str(record.get('Address', '')).strip(),
+        str(record.get('TTL') or '1800'),
+        str(record.get('MXPref') or '') if str(record.get('Type', '')).upper() == 'MX' else ''
+    )
+
+
+def diff_records(before: List[Dict], after: List[Dict]) -> Dict[str, List]:
+    """
+    Diff two record sets, grouped by host name and type
+
+    Returns:
+        Dict with 'add' (new name/type), 'replace' ({'from', 'to'} within an existing
+        name/type) and 'delete' (name/type no longer present) lists
+    """
+    before_keys = {_record_key(record): record for record in before}
+    after_keys = {_record_key(record): record for record in after}
+    removed = [record for key, record in before_keys.items() if key not in after_keys]
+    added = [record for key, record in after_keys.items() if key not in before_keys]
+
+    changes = {'add': [], 'replace': [], 'delete': []}
+    removed_groups = {}
+    for record in removed:
+        removed_groups.setdefault(_record_key(record)[:2], []).append(record)
+
+    for record in added:
+        group = removed_groups.get(_record_key(record)[:2])
+        if group:
+            changes['replace'].append({'from': group.pop(0), 'to': record})
+        else:
+            changes['add'].append(record)
+
+    for group in removed_groups.values():
+        changes['delete'].extend(group)
+
+    return changes
+
+
+def is_noop(changes: Dict[str, List]) -> bool:
+    """True when a diff contains no changes"""
+    return not (changes['add'] or changes['replace'] or changes['delete'])
+
+
+def canonical_records(records: List[Dict]) -> List[Dict]:
+    """Normalize a record set to Namecheap host format in a stable order, so equal zones compare equal"""
+    canonical = []
+    for record in records:
+        normalized = {
+            'Name': str(record.get('Name') or '@'),
+            'Type': str(record.get('Type') or ''),
+            'Address': str(record.get('Address') or ''),
+            'TTL': str(record.get('TTL') or '1800')
+        }
+        if normalized['Type'].upper() == 'MX' and record.get('MXPref'):
+            normalized['MXPref'] = str(record['MXPref'])
+        canonical.append(normalized)
+
+    return sorted(canonical, key=lambda record: (record['Type'], record['Name'], record['Address'],
+                                                 record['TTL'], record.get('MXPref', '')))
+
+
+def records_hash(records: List[Dict]) -> str:
+    """Content hash of a record set, independent of record order"""
+    content = json.dumps(canonical_records(records), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def redirections_from_records(records: List[Dict]) -> List[Dict]:
+    """Extract URL redirections from a record set, in the format stored in the redirections table"""
+    redirections = []
+    for record in records:
+        if isinstance(record, dict):
+            record_type = record.get('Type', '').upper()
+            if record_type in ['URL', 'URL301', 'URL302', 'REDIRECT']:
+                redirections.append({
+                    'type': 'URL Redirect (301)' if record_type == 'URL301' else 'URL Redirect',
+                    'target': record.get('Address', ''),
+                    'name': record.get('Name', '@')
+                })
+    return redirections
+
+
+# Compliance flags in the order missing records are listed in dns_issues
+DNS_COMPLIANCE_LABELS = {
+    'has_spf': 'SPF',
+    'has_google_verification': 'Google Verification',
+    'has_dmarc': 'DMARC',
+    'has_dkim': 'DKIM',
+}
+
+
+def dns_compliance_for_records(records: List[Dict]) -> Optional[Dict[str, bool]]:
+    """
+    Check a record set for the required email records
+
+    Checks for:
+    - SPF: TXT record containing "v=spf1"
+    - Google verification: TXT record containing "google-site-verification"
+    - DMARC: Record with hostname "_dmarc"
+    - DKIM: Record containing "v=DKIM1;"
+
+    Returns:
+        None for an empty record set, otherwise one flag per DNS_COMPLIANCE_LABELS key
+    """
+    if not records:
+        return None
+
+    compliance = dict.fromkeys(DNS_COMPLIANCE_LABELS, False)
+    for record in records:
+        record_name = str(record.get('Name') or '').lower()
+        record_address_lower = str(record.get('Address') or '').strip().lower()
+
+        if 'v=spf1' in record_address_lower:
+            compliance['has_spf'] = True
+
+        if 'google-site-verification' in record_address_lower:
+            compliance['has_google_verification'] = True
+
+        if record_name == '_dmarc':
+            compliance['has_dmarc'] = True
+
+        if 'v=dkim1;' in record_address_lower:
+            compliance['has_dkim'] = True
+
+    return compliance
+
+
+def dns_issues_from_compliance(compliance: Optional[Dict[str, bool]]) -> Optional[str]:
+    """'ok' if all records are present, otherwise a string describing the missing ones, None when unknown"""
+    if compliance is None:
+        return None
+
+    # Build list of missing records
+    missing_records = [label for flag, label in DNS_COMPLIANCE_LABELS.items() if not compliance[flag]]
+    if missing_records:
+        return f"Missing: {', '.join(missing_records)}"
+    return 'ok'
+
+
+def dns_issues_for_records(records: List[Dict]) -> Optional[str]:
+    """
+    Check a record set for the required email records, see dns_compliance_for_records
+
+    Returns:
+        None for an empty record set, 'ok' if all records found, otherwise a string describing missing records
+    """
+    return dns_issues_from_compliance(dns_compliance_for_records(records))
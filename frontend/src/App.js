@@ -1,10 +1,15 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import DomainTable from './components/DomainTable';
 import SyncProgress from './components/SyncProgress';
 import BulkUpdateModal from './components/BulkUpdateModal';
 import ClientManager from './components/ClientManager';
 import DNSModal from './components/DNSModal';
+import { subscribeToProgress } from './progressStream';
+import { idempotencyConfig } from './idempotency';
+
+// Domains per request, further pages are loaded with the cursor from the previous one
+const PAGE_SIZE = 200;
 
 function App() {
   const [domains, setDomains] = useState([]);
@@ -21,22 +26,56 @@ function App() {
   const [dnsCheckInProgress, setDnsCheckInProgress] = useState(false);
   const [dnsCheckProgress, setDnsCheckProgress] = useState('');
   const [dnsIssueFilter, setDnsIssueFilter] = useState('');
+  const [dnsIssueOptions, setDnsIssueOptions] = useState([]);
+  const [missingRecordFilter, setMissingRecordFilter] = useState('');
+  const [sortBy, setSortBy] = useState('domain_number');
+  const [sortOrder, setSortOrder] = useState('asc');
+  const [totalCount, setTotalCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [summary, setSummary] = useState(null);
+  // Responses of superseded filter requests are dropped
+  const requestCounter = useRef(0);
 
   // Load initial data
   useEffect(() => {
-    loadDomainsAndClients();
     checkSyncStatus();
   }, []);
 
+  // Filters and sorting run on the server - reload the first page when they change
+  useEffect(() => {
+    const timer = setTimeout(loadDomainsAndClients, 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery, clientFilter, dnsIssueFilter, missingRecordFilter, sortBy, sortOrder]);
+
+  const domainQueryParams = () => {
+    const params = { sort: sortBy, order: sortOrder };
+    if (searchQuery.trim()) params.q = searchQuery.trim();
+    if (clientFilter) params.client_id = clientFilter;
+    if (dnsIssueFilter) params.dns_issues = dnsIssueFilter;
+    if (missingRecordFilter) params.missing = missingRecordFilter;
+    return params;
+  };
+
   const loadDomainsAndClients = async () => {
+    const requestId = ++requestCounter.current;
     try {
-      const [domainsRes, clientsRes] = await Promise.all([
-        axios.get('/api/domains-from-db'),
-        axios.get('/api/clients')
+      const [domainsRes, clientsRes, summaryRes] = await Promise.all([
+        axios.get('/api/domains-from-db', { params: { ...domainQueryParams(), limit: PAGE_SIZE } }),
+        axios.get('/api/clients'),
+        axios.get('/api/domain-summary')
       ]);
+      if (requestId !== requestCounter.current) return;
+
+      if (summaryRes.data.status === 'success') {
+        setSummary(summaryRes.data);
+      }
 
       if (domainsRes.data.status === 'success') {
         setDomains(domainsRes.data.domains || []);
+        setTotalCount(domainsRes.data.total_count || 0);
+        setNextCursor(domainsRes.data.next_cursor || null);
+        setDnsIssueOptions(domainsRes.data.dns_issues_options || []);
       }
 
       if (clientsRes.data.status === 'success') {
@@ -45,11 +84,35 @@ function App() {
     } catch (error) {
       console.error('Error loading data:', error);
       setDomains([]);
+      setTotalCount(0);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMoreDomains = async () => {
+    if (!nextCursor) return;
+    const requestId = requestCounter.current;
+    try {
+      setLoadingMore(true);
+      const response = await axios.get('/api/domains-from-db', {
+        params: { ...domainQueryParams(), limit: PAGE_SIZE, cursor: nextCursor }
+      });
+      if (requestId !== requestCounter.current) return;
+
+      if (response.data.status === 'success') {
+        setDomains(current => [...current, ...(response.data.domains || [])]);
+        setTotalCount(response.data.total_count || 0);
+        setNextCursor(response.data.next_cursor || null);
+      }
+    } catch (error) {
+      console.error('Error loading more domains:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const checkSyncStatus = async () => {
     try {
       const response = await axios.get('/api/sync-domains-progress');
@@ -86,7 +149,8 @@ function App() {
         return;
       }
       setSyncInProgress(true);
-      await axios.post('/api/sync-selected-domains', { domains: selectedDomains });
+      const payload = { domains: selectedDomains };
+      await axios.post('/api/sync-selected-domains', payload, idempotencyConfig(payload));
     } catch (error) {
       console.error('Error syncing selected domains:', error);
       if (error.response?.data?.error === 'Sync already in progress') {
@@ -102,10 +166,13 @@ function App() {
     try {
       const response = await axios.post('/api/backup-database');
       if (response.data.status === 'success') {
+        // Every domain, not only the pages loaded so far
+        const domainsRes = await axios.get('/api/domains-from-db');
+
         // Store backup data in localStorage as a simple solution
         const backupData = {
           timestamp: new Date().toISOString(),
-          domains: domains,
+          domains: domainsRes.data.domains || [],
           clients: clients
         };
         localStorage.setItem('db_backup', JSON.stringify(backupData));
@@ -203,28 +270,31 @@ function App() {
         target: updateData.target
       }));
 
-      const response = await axios.post('/api/bulk-update', { updates });
+      const response = await axios.post('/api/bulk-update', { updates }, idempotencyConfig({ updates }));
 
-      if (response.data.status === 'success') {
-        // Store bulk update results for status display
+      if (response.data.status === 'started') {
+        // The update runs as a background job - collect per-domain results as they arrive
         const resultsMap = {};
-        response.data.results.forEach(result => {
-          resultsMap[result.domain_name] = {
-            success: result.success,
-            verified: result.verified,
-            timestamp: Date.now()
-          };
+        subscribeToProgress('bulk-update', (data) => {
+          (data.new_results || []).forEach(result => {
+            resultsMap[result.domain_name] = {
+              success: result.success,
+              verified: result.verified,
+              timestamp: Date.now()
+            };
+          });
+          setBulkUpdateResults({ ...resultsMap });
+
+          if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
+            // Clear results after 10 seconds
+            setTimeout(() => setBulkUpdateResults({}), 10000);
+            loadDomainsAndClients();
+          }
         });
-        setBulkUpdateResults(resultsMap);
-
-        // Clear results after 10 seconds
-        setTimeout(() => setBulkUpdateResults({}), 10000);
 
-        // Refresh domains
-        await loadDomainsAndClients();
         setSelectedDomains([]);
         setShowBulkModal(false);
-        return { success: true, results: response.data.results };
+        return { success: true, jobId: response.data.job_id };
       } else {
         return { success: false, error: response.data.error };
       }
@@ -268,56 +338,34 @@ function App() {
 
       setDnsCheckInProgress(true);
 
-      // If more than 40 domains, send in batches of 40 with 15-second interval
-      if (selectedDomains.length > 40) {
-        const batchSize = 40;
-        const totalBatches = Math.ceil(selectedDomains.length / batchSize);
-        let successfulBatches = 0;
-        let failedBatches = 0;
-
-        for (let i = 0; i < selectedDomains.length; i += batchSize) {
-          const batch = selectedDomains.slice(i, i + batchSize);
-          const batchNumber = Math.floor(i / batchSize) + 1;
-
-          setDnsCheckProgress(`Processing batch ${batchNumber}/${totalBatches} (${batch.length} domains)...`);
-
-          try {
-            const response = await axios.post('/api/check-dns-for-selected', {
-              domains: batch
-            });
-
-            if (response.data.status === 'success') {
-              successfulBatches++;
-              console.log(`Batch ${batchNumber}/${totalBatches} completed successfully`);
-            } else {
-              failedBatches++;
-              console.error(`Batch ${batchNumber}/${totalBatches} failed:`, response.data.error);
-            }
-          } catch (error) {
-            failedBatches++;
-            console.error(`Error in batch ${batchNumber}/${totalBatches}:`, error);
-          }
+      // The server queues the whole selection and paces the API calls itself
+      const response = await axios.post('/api/check-dns-for-selected', {
+        domains: selectedDomains
+      });
+
+      if (response.data.status !== 'started') {
+        alert('Error checking DNS records: ' + (response.data.error || 'Unknown error'));
+        return;
+      }
 
-          // Wait 15 seconds before next batch (except for the last batch)
-          if (i + batchSize < selectedDomains.length) {
-            setDnsCheckProgress(`Waiting 15 seconds before next batch...`);
-            await new Promise(resolve => setTimeout(resolve, 15000));
+      const result = await new Promise(resolve => {
+        subscribeToProgress('dns-check', (data) => {
+          if (data.status === 'paused') {
+            setDnsCheckProgress(data.rate_limit_message || 'Paused by rate limit...');
+          } else {
+            setDnsCheckProgress(`Checked ${data.processed || 0}/${data.total || selectedDomains.length} domains...`);
           }
-        }
 
-        setDnsCheckProgress('');
-        alert(`DNS check completed!\nTotal domains: ${selectedDomains.length}\nBatches processed: ${successfulBatches}/${totalBatches}\nFailed batches: ${failedBatches}`);
-      } else {
-        // For 40 or fewer domains, send all at once
-        const response = await axios.post('/api/check-dns-for-selected', {
-          domains: selectedDomains
+          if (['completed', 'error', 'stopped', 'idle', 'rate_limited'].includes(data.status)) {
+            resolve(data);
+          }
         });
+      });
 
-        if (response.data.status === 'success') {
-          alert(`DNS check completed for ${selectedDomains.length} domains`);
-        } else {
-          alert('Error checking DNS records: ' + (response.data.error || 'Unknown error'));
-        }
+      if (result.status === 'completed') {
+        alert(`DNS check completed!\nTotal domains: ${result.total}\nSuccessful: ${result.successful}\nErrors: ${result.total_errors || 0}`);
+      } else {
+        alert(`DNS check ${result.status}: ${result.processed || 0}/${result.total || 0} domains checked`);
       }
 
       // Refresh domains to show updated DNS status
@@ -332,24 +380,20 @@ function App() {
     }
   };
 
-  const dnsIssueOptions = React.useMemo(() => {
-    const issues = new Set();
-    domains.forEach(d => {
-      if (d.dns_issues) issues.add(d.dns_issues);
-    });
-    return Array.from(issues).sort();
-  }, [domains]);
-
-  const filteredDomains = domains.filter(domain => {
-    const matchesSearch = domain.domain_name.toLowerCase().includes(searchQuery.toLowerCase());
-    const matchesClient = !clientFilter || domain.client_id === parseInt(clientFilter);
-    const matchesDnsIssue = !dnsIssueFilter || domain.dns_issues === dnsIssueFilter;
-    return matchesSearch && matchesClient && matchesDnsIssue;
-  });
-
-  const exportToCsv = () => {
+  const exportToCsv = async () => {
+    // Every matching domain, not only the pages loaded so far
+    let exportDomains = domains;
+    try {
+      const response = await axios.get('/api/domains-from-db', { params: domainQueryParams() });
+      if (response.data.status === 'success') {
+        exportDomains = response.data.domains || [];
+      }
+    } catch (error) {
+      console.error('Error loading domains for export:', error);
+    }
+
     const headers = ['#', 'Domain', 'Redirect URL', 'Client', 'DNS Issues', 'Status'];
-    const rows = filteredDomains.map(d => [
+    const rows = exportDomains.map(d => [
       d.domain_number || '',
       d.domain_name,
       d.redirect_url || '',
@@ -390,6 +434,14 @@ function App() {
         <div className="card">
           <h1>Domain URL Redirection Management</h1>
           <p>Manage domain redirections for all your domains using Namecheap API with real-time sync and verification.</p>
+          {summary && (
+            <p style={{ color: '#6b7280', marginTop: '0.5rem' }}>
+              {summary.total} domains · {summary.by_client.length} clients
+              · ✅ DNS OK: {summary.by_dns_issues.ok || 0}
+              · Not checked: {summary.by_dns_issues.unchecked || 0}
+              {Object.entries(summary.by_sync_status).map(([status, count]) => ` · ${status}: ${count}`).join('')}
+            </p>
+          )}
         </div>
 
         {/* Controls */}
@@ -536,12 +588,44 @@ function App() {
                 </option>
               ))}
             </select>
+            <select
+              className="form-control"
+              value={missingRecordFilter}
+              onChange={(e) => setMissingRecordFilter(e.target.value)}
+              style={{ width: '200px' }}
+            >
+              <option value="">Any DNS Records</option>
+              <option value="spf">Missing SPF</option>
+              <option value="dmarc">Missing DMARC</option>
+              <option value="dkim">Missing DKIM</option>
+              <option value="google_verification">Missing Google Verification</option>
+            </select>
+            <select
+              className="form-control"
+              value={sortBy}
+              onChange={(e) => setSortBy(e.target.value)}
+              style={{ width: '180px' }}
+            >
+              <option value="domain_number">Sort by #</option>
+              <option value="domain_name">Sort by Domain</option>
+              <option value="client_name">Sort by Client</option>
+              <option value="dns_issues">Sort by DNS Issues</option>
+              <option value="sync_status">Sort by Sync Status</option>
+              <option value="updated_at">Sort by Last Updated</option>
+            </select>
+            <button
+              className="btn"
+              onClick={() => setSortOrder(sortOrder === 'asc' ? 'desc' : 'asc')}
+            >
+              {sortOrder === 'asc' ? '⬆️ Asc' : '⬇️ Desc'}
+            </button>
             <button
               className="btn"
               onClick={() => {
                 setSearchQuery('');
                 setClientFilter('');
                 setDnsIssueFilter('');
+                setMissingRecordFilter('');
               }}
             >
               Clear All
@@ -563,12 +647,13 @@ function App() {
         <div className="card">
           <h2>All Domains with URL Redirections</h2>
           <p style={{ color: '#6b7280', marginBottom: '1rem' }}>
-            Found {filteredDomains.length} domains
-            {(searchQuery || clientFilter) && ` (filtered${searchQuery ? ` by "${searchQuery}"` : ''}${clientFilter ? ` by client` : ''})`}
+            Found {totalCount} domains
+            {(searchQuery || clientFilter || dnsIssueFilter || missingRecordFilter) && ` (filtered${searchQuery ? ` by "${searchQuery}"` : ''}${clientFilter ? ` by client` : ''}${dnsIssueFilter ? ` by DNS issues` : ''}${missingRecordFilter ? ` by missing record` : ''})`}
+            {domains.length < totalCount && ` - showing ${domains.length}`}
           </p>
 
           <DomainTable
-            domains={filteredDomains}
+            domains={domains}
             clients={clients}
             selectedDomains={selectedDomains}
             onSelectionChange={setSelectedDomains}
@@ -576,6 +661,18 @@ function App() {
             onClientChange={handleClientChange}
             bulkUpdateResults={bulkUpdateResults}
           />
+
+          {nextCursor && (
+            <div className="flex gap-2 items-center" style={{ justifyContent: 'center', marginTop: '1rem' }}>
+              <button
+                className="btn"
+                onClick={loadMoreDomains}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Loading...' : `Load more (${totalCount - domains.length} remaining)`}
+              </button>
+            </div>
+          )}
         </div>
 
         {/* Bulk Update Modal with DNS Management */}
@@ -1,8 +1,11 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { subscribeToProgress } from '../progressStream';
+import { idempotencyConfig } from '../idempotency';
 
 const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
   const [activeTab, setActiveTab] = useState('redirect'); // 'redirect', 'dns-add', 'dns-remove'
+  const unsubscribeRef = useRef(null);
 
   // Redirect state
   const [updateType, setUpdateType] = useState('manual');
@@ -24,6 +27,7 @@ const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
   // Processing state
   const [isProcessing, setIsProcessing] = useState(false);
   const [progress, setProgress] = useState(null);
+  const [domainResults, setDomainResults] = useState([]);
 
   const recordTypes = [
     { value: 'A', label: 'A Record - IPv4 Address' },
@@ -121,37 +125,37 @@ const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
   };
 
   const pollProgress = (progressType) => {
-    const endpoint = progressType === 'redirect' ? '/api/bulk-update-progress' :
-                     progressType === 'dns' ? '/api/bulk-dns-progress' :
-                     '/api/bulk-dns-remove-progress';
-
-    const interval = setInterval(async () => {
-      try {
-        const response = await axios.get(endpoint);
-        const data = response.data;
-
-        setProgress(data);
-
-        if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
-          clearInterval(interval);
-          setIsProcessing(false);
-
-          if (data.status === 'completed') {
-            setTimeout(() => {
-              alert(`Operation completed!\nSuccessful: ${data.successful || data.processed}\nErrors: ${data.errors?.length || 0}`);
-              onClose();
-              window.location.reload();
-            }, 1000);
-          }
-        }
-      } catch (error) {
-        console.error('Error fetching progress:', error);
-        clearInterval(interval);
+    const streamName = progressType === 'redirect' ? 'bulk-update' :
+                       progressType === 'dns' ? 'bulk-dns' :
+                       'bulk-dns-remove';
+
+    if (unsubscribeRef.current) unsubscribeRef.current();
+
+    unsubscribeRef.current = subscribeToProgress(streamName, (data) => {
+      setProgress(data);
+      if (data.new_results && data.new_results.length > 0) {
+        setDomainResults(results => [...results, ...data.new_results]);
+      }
+
+      if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
         setIsProcessing(false);
+
+        if (data.status === 'completed') {
+          setTimeout(() => {
+            alert(`Operation completed!\nSuccessful: ${data.successful || data.processed}\nErrors: ${data.total_errors || 0}`);
+            onClose();
+            window.location.reload();
+          }, 1000);
+        }
       }
-    }, 2000);
+    });
   };
 
+  // Close the progress stream when the modal is closed
+  useEffect(() => () => {
+    if (unsubscribeRef.current) unsubscribeRef.current();
+  }, []);
+
   const handleRedirectSubmit = async () => {
     let targetUrl = '';
     if (updateType === 'manual') {
@@ -179,7 +183,7 @@ const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
         target: targetUrl
       }));
 
-      await axios.post('/api/bulk-update', { updates });
+      await axios.post('/api/bulk-update', { updates }, idempotencyConfig({ updates }));
       pollProgress('redirect');
     } catch (error) {
       console.error('Error starting bulk redirect update:', error);
@@ -226,10 +230,11 @@ const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
         mx_pref: recordType === 'MX' ? mxPref : undefined
       };
 
-      await axios.post('/api/bulk-dns-update', {
+      const payload = {
         domains: selectedDomains,
         record: recordData
-      });
+      };
+      await axios.post('/api/bulk-dns-update', payload, idempotencyConfig(payload));
 
       pollProgress('dns');
     } catch (error) {
@@ -761,7 +766,18 @@ const BulkUpdateModal = ({ selectedDomains, clients, onClose }) => {
 
             {progress.successful !== undefined && (
               <div style={{ fontSize: '0.875rem', color: '#374151' }}>
-                Successful: {progress.successful} | Errors: {progress.errors?.length || 0}
+                Successful: {progress.successful} | Errors: {progress.total_errors || 0}
+              </div>
+            )}
+
+            {domainResults.length > 0 && (
+              <div style={{ maxHeight: '150px', overflowY: 'auto', marginTop: '0.5rem', fontSize: '0.8rem' }}>
+                {domainResults.slice(-20).map((result, index) => (
+                  <div key={index} style={{ color: result.success ? '#059669' : '#dc2626' }}>
+                    {result.success ? '✅' : '❌'} {result.domain_name}
+                    {result.error && ` - ${result.error}`}
+                  </div>
+                ))}
               </div>
             )}
 
@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeToProgress } from '../progressStream';
+import { idempotencyConfig } from '../idempotency';
 
 const DNSModal = ({ selectedDomains, onClose }) => {
   const [activeTab, setActiveTab] = useState('dns-add');
@@ -38,30 +40,22 @@ const DNSModal = ({ selectedDomains, onClose }) => {
   ];
 
   useEffect(() => {
-    let interval;
-    if (isOperationActive) {
-      interval = setInterval(checkProgress, 1000);
-    }
-    return () => {
-      if (interval) clearInterval(interval);
-    };
-  }, [isOperationActive]);
+    if (!isOperationActive) return undefined;
 
-  const checkProgress = async () => {
-    try {
-      const endpoint = activeTab === 'dns-add' ? '/api/bulk-dns-progress' : '/api/bulk-dns-remove-progress';
-      const response = await axios.get(endpoint);
-      const data = response.data;
+    const streamName = activeTab === 'dns-add' ? 'bulk-dns' : 'bulk-dns-remove';
+    return subscribeToProgress(streamName, handleProgress);
+  }, [isOperationActive]);
 
-      setProgress(data);
+  const handleProgress = (data) => {
+    setProgress(data);
 
-      if (data.status === 'completed' || data.status === 'stopped') {
-        setIsOperationActive(false);
-        setIsSubmitting(false);
-        setTimeout(() => setProgress(null), 5000);
-      }
-    } catch (error) {
-      console.error('Error checking progress:', error);
+    if (data.status === 'completed' || data.status === 'stopped') {
+      setIsOperationActive(false);
+      setIsSubmitting(false);
+      setTimeout(() => setProgress(null), 5000);
+    } else if (data.status === 'error' || data.status === 'rate_limited') {
+      // The stream ends here, resuming subscribes again
+      setIsOperationActive(false);
     }
   };
 
@@ -110,7 +104,7 @@ const DNSModal = ({ selectedDomains, onClose }) => {
         }))
       };
 
-      const response = await axios.post('/api/bulk-dns-update', requestData);
+      const response = await axios.post('/api/bulk-dns-update', requestData, idempotencyConfig(requestData));
 
       if (response.data.status === 'started') {
         // Progress tracking will handle the rest
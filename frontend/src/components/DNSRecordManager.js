@@ -1,5 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { subscribeToProgress } from '../progressStream';
+import { idempotencyConfig } from '../idempotency';
 
 const DNSRecordManager = ({ domains, onClose }) => {
   const [selectedDomains, setSelectedDomains] = useState([]);
@@ -9,6 +11,7 @@ const DNSRecordManager = ({ domains, onClose }) => {
   const [ttl, setTtl] = useState('1800');
   const [mxPref, setMxPref] = useState('10');
   const [isProcessing, setIsProcessing] = useState(false);
+  const unsubscribeRef = useRef(null);
   const [progress, setProgress] = useState({
     status: 'ready',
     processed: 0,
@@ -186,10 +189,11 @@ const DNSRecordManager = ({ domains, onClose }) => {
         mx_pref: recordType === 'MX' ? mxPref : undefined
       };
 
-      await axios.post('/api/bulk-dns-update', {
+      const payload = {
         domains: selectedDomains,
         record: recordData
-      });
+      };
+      await axios.post('/api/bulk-dns-update', payload, idempotencyConfig(payload));
 
       // Start polling for progress
       pollProgress();
@@ -201,30 +205,27 @@ const DNSRecordManager = ({ domains, onClose }) => {
   };
 
   const pollProgress = () => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await axios.get('/api/bulk-dns-progress');
-        const data = response.data;
-
-        setProgress(data);
-
-        if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
-          clearInterval(interval);
-          setIsProcessing(false);
-          setTimeout(() => {
-            if (data.status === 'completed') {
-              alert(`Bulk DNS update completed!\nSuccessful: ${data.successful}\nErrors: ${data.errors.length}`);
-            }
-          }, 1000);
-        }
-      } catch (error) {
-        console.error('Error fetching progress:', error);
-        clearInterval(interval);
+    if (unsubscribeRef.current) unsubscribeRef.current();
+
+    unsubscribeRef.current = subscribeToProgress('bulk-dns', (data) => {
+      setProgress(data);
+
+      if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
         setIsProcessing(false);
+        setTimeout(() => {
+          if (data.status === 'completed') {
+            alert(`Bulk DNS update completed!\nSuccessful: ${data.successful}\nErrors: ${data.total_errors}`);
+          }
+        }, 1000);
       }
-    }, 2000);
+    });
   };
 
+  // Close the progress stream when the manager is closed
+  useEffect(() => () => {
+    if (unsubscribeRef.current) unsubscribeRef.current();
+  }, []);
+
   const stopBulkUpdate = async () => {
     try {
       await axios.post('/api/stop-bulk-dns');
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeToProgress } from '../progressStream';
 
 const SyncProgress = ({ onComplete }) => {
   const [progress, setProgress] = useState({
@@ -12,29 +13,27 @@ const SyncProgress = ({ onComplete }) => {
     errors: []
   });
 
+  // Bumped on resume to open a new progress stream
+  const [streamId, setStreamId] = useState(0);
+
   useEffect(() => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await axios.get('/api/sync-domains-progress');
-        const data = response.data;
-
-        setProgress(data);
-
-        if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
-          clearInterval(interval);
-          setTimeout(() => {
-            onComplete();
-          }, 3000); // Show completion for 3 seconds then refresh
-        }
-      } catch (error) {
-        console.error('Error fetching sync progress:', error);
-        clearInterval(interval);
-        onComplete();
+    let completeTimer = null;
+
+    const unsubscribe = subscribeToProgress('sync', (data) => {
+      setProgress(data);
+
+      if (data.status === 'completed' || data.status === 'error' || data.status === 'stopped') {
+        completeTimer = setTimeout(() => {
+          onComplete();
+        }, 3000); // Show completion for 3 seconds then refresh
       }
-    }, 1000); // Poll every second
+    });
 
-    return () => clearInterval(interval);
-  }, [onComplete]);
+    return () => {
+      unsubscribe();
+      if (completeTimer) clearTimeout(completeTimer);
+    };
+  }, [onComplete, streamId]);
 
   const getProgressPercentage = () => {
     if (progress.total === 0) return 0;
@@ -95,6 +94,12 @@ const SyncProgress = ({ onComplete }) => {
         {progress.status === 'completed' && (
           <>
             Successfully synced {progress.processed} of {progress.total} domains
+            {progress.skipped_fresh > 0 && (
+              <> ({progress.skipped_fresh} skipped, synced recently)</>
+            )}
+            {progress.total_skipped > 0 && (
+              <> ({progress.total_skipped} skipped, expired or not on Namecheap DNS)</>
+            )}
             <br />
             Added: {progress.domains_added} | Updated: {progress.domains_updated}
             {(progress.total_errors || progress.errors.length) > 0 && (
@@ -143,6 +148,7 @@ const SyncProgress = ({ onComplete }) => {
                 onClick={async () => {
                   try {
                     await axios.post('/api/resume-sync');
+                    setStreamId(id => id + 1);
                   } catch (error) {
                     alert('Failed to resume sync: ' + error.message);
                   }
@@ -0,0 +1,26 @@
+// Idempotency keys for requests that start bulk jobs.
+// Sending the same request again shortly after (double click, retry after a network
+// error) reuses its key, so the server replays the first job instead of starting another.
+const KEY_REUSE_MS = 60000;
+const recentKeys = new Map();
+
+const newKey = () => (
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
+export const idempotencyConfig = (payload) => {
+  const now = Date.now();
+  for (const [body, entry] of recentKeys) {
+    if (now - entry.createdAt >= KEY_REUSE_MS) recentKeys.delete(body);
+  }
+
+  const body = JSON.stringify(payload);
+  let entry = recentKeys.get(body);
+  if (!entry) {
+    entry = { key: newKey(), createdAt: now };
+    recentKeys.set(body, entry);
+  }
+  return { headers: { 'Idempotency-Key': entry.key } };
+};
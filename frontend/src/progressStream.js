@@ -0,0 +1,43 @@
+// Subscribe to a background job's progress over Server-Sent Events.
+// The browser reconnects on its own and sends the last event id, so the server
+// only replays errors we have not seen yet.
+const FINISHED_STATUSES = ['completed', 'error', 'stopped', 'idle', 'rate_limited'];
+const RECONNECT_DELAY = 2000;
+
+export const subscribeToProgress = (streamName, onProgress) => {
+  let source = null;
+  let closed = false;
+  let lastEventId = '';
+  let reconnectTimer = null;
+
+  const connect = () => {
+    const query = lastEventId ? `?last_event_id=${encodeURIComponent(lastEventId)}` : '';
+    source = new EventSource(`/api/progress-stream/${streamName}${query}`);
+
+    source.addEventListener('progress', (event) => {
+      lastEventId = event.lastEventId || lastEventId;
+      const data = JSON.parse(event.data);
+      onProgress(data);
+
+      if (FINISHED_STATUSES.includes(data.status)) {
+        unsubscribe();
+      }
+    });
+
+    source.onerror = () => {
+      // The browser retries by itself unless the connection was given up for good
+      if (source.readyState === EventSource.CLOSED && !closed) {
+        reconnectTimer = setTimeout(connect, RECONNECT_DELAY);
+      }
+    };
+  };
+
+  const unsubscribe = () => {
+    closed = true;
+    if (reconnectTimer) clearTimeout(reconnectTimer);
+    if (source) source.close();
+  };
+
+  connect();
+  return unsubscribe;
+};
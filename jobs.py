@@ -0,0 +1,216 @@
+"""
+Background job runner for email redirect tool
+Executes queued sync and bulk DNS jobs either inside the web process (inline)
+or in the standalone worker process started with `python -m worker` (external)
+"""
+
+import hashlib
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Callable, Dict, Optional
+
+# 'inline' runs jobs in a thread of the process that queued them,
+# 'external' leaves them in the jobs table for `python -m worker`
+JOB_RUNNER_MODE = os.environ.get('JOB_RUNNER', 'inline')
+
+
+def payload_hash(operation: str, payload) -> str:
+    """Stable hash of an operation and its payload, used to recognise repeated work in the operation ledger"""
+    return hashlib.sha256(json.dumps([operation, payload], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def mark_interrupted(progress: Dict) -> str:
+    """Turn the progress of a job killed by a worker restart into a resumable pause, returns the new status"""
+    if progress.get("paused_domains"):
+        progress["status"] = "rate_limited"
+        progress["paused_at_index"] = max((progress.get("processed") or 1) - 1, 0)
+        progress["rate_limit_message"] = "Job was interrupted by a worker restart. Click Resume to continue."
+    else:
+        progress["status"] = "error"
+        progress["error"] = "Job was interrupted by a worker restart"
+    progress["current_domain"] = ""
+    return progress["status"]
+
+
+class JobRunner:
+    """Runs registered background job functions and mirrors their progress into the jobs table"""
+
+    def __init__(self, db, namespace: Dict, concurrency: int = None, external: bool = None,
+                 mirror_interval: float = 1.0, poll_interval: float = 1.0, heartbeat_timeout: int = 60):
+        """
+        Args:
+            db: Database used for the jobs table
+            namespace: Module globals holding the job functions' progress dicts
+            concurrency: Maximum jobs executed at once by run_forever
+            external: Leave queued jobs to the standalone worker instead of running them here
+        """
+        self.db = db
+        self.namespace = namespace
+        self.concurrency = concurrency or int(os.environ.get('WORKER_CONCURRENCY', 2))
+        self.external = (JOB_RUNNER_MODE == 'external') if external is None else external
+        self.mirror_interval = mirror_interval
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers = {}
+        self._active = {}
+        self._active_lock = threading.Lock()
+        self._shutdown = threading.Event()
+
+    def register(self, job_type: str, func: Callable, progress_key: str):
+        """Register a job function and the name of the global progress dict it reports into"""
+        self.handlers[job_type] = (func, progress_key)
+
+    def submit(self, job_type: str, args=(), progress: Dict = None) -> int:
+        """
+        Queue a job and, in inline mode, start it right away
+
+        Args:
+            job_type: Registered job type
+            args: JSON-serializable positional arguments for the job function
+            progress: Initial progress dict (defaults to the current global one)
+
+        Returns:
+            int: The job id
+        """
+        func, progress_key = self.handlers[job_type]
+        if progress is None:
+            progress = self.namespace[progress_key]
+        self.namespace[progress_key] = progress
+
+        job_id = self.db.enqueue_job(job_type, progress_key, list(args), progress)
+        progress["job_id"] = job_id
+
+        if not self.external:
+            job = self.db.claim_job(self.worker_id, job_id)
+            if job:
+                thread = threading.Thread(target=self._execute, args=(job, progress))
+                thread.daemon = True
+                thread.start()
+
+        return job_id
+
+    def running_progress(self, job_id: int) -> Optional[Dict]:
+        """The live progress dict of a job executing in this process, None when it runs elsewhere or not at all"""
+        with self._active_lock:
+            return self._active.get(job_id)
+
+    def _execute(self, job: Dict, progress: Dict = None):
+        """Run a claimed job to completion, keeping its progress row up to date"""
+        func, progress_key = self.handlers[job['job_type']]
+
+        if progress is None:
+            # Running in the worker process - continue from the progress the web app stored
+            progress = job['progress'] or {}
+            self.namespace[progress_key] = progress
+        progress["job_id"] = job['id']
+
+        with self._active_lock:
+            self._active[job['id']] = progress
+
+        finished = threading.Event()
+        mirror = threading.Thread(target=self._mirror_progress, args=(job['id'], progress, finished))
+        mirror.daemon = True
+        mirror.start()
+
+        print(f"⚙️ Job {job['id']} ({job['job_type']}) started by {self.worker_id}")
+        try:
+            func(*job['args'])
+        except Exception as e:
+            print(f"❌ Job {job['id']} ({job['job_type']}) failed: {e}")
+            traceback.print_exc()
+            progress["status"] = "error"
+            progress["error"] = str(e)
+        finally:
+            finished.set()
+            mirror.join()
+            with self._active_lock:
+                self._active.pop(job['id'], None)
+
+            status = progress.get("status", "completed")
+            if status in ("running", "starting"):
+                status = progress["status"] = "completed"
+            elif status == "stopped" and self._shutdown.is_set():
+                # Stopped by a worker shutdown rather than by the user
+                status = mark_interrupted(progress)
+            self.db.finish_job(job['id'], status, progress)
+            print(f"⚙️ Job {job['id']} ({job['job_type']}) finished with status: {status}")
+
+    def _mirror_progress(self, job_id: int, progress: Dict, finished: threading.Event):
+        """Copy a running job's progress into the jobs table and pick up stop requests"""
+        last_snapshot = None
+        while not finished.wait(self.mirror_interval):
+            try:
+                snapshot = json.dumps(progress, default=str, sort_keys=True)
+                changed = snapshot != last_snapshot
+                if self.db.update_job_progress(job_id, progress if changed else None):
+                    progress["should_stop"] = True
+                last_snapshot = snapshot
+            except Exception as e:
+                print(f"⚠️ Could not store progress for job {job_id}: {e}")
+
+    def recover_stale_jobs(self):
+        """Mark jobs left running by a dead worker as interrupted, resumable where possible"""
+        for job in self.db.get_stale_running_jobs(self.heartbeat_timeout):
+            progress = job['progress'] or {}
+            self.db.finish_job(job['id'], mark_interrupted(progress), progress)
+            print(f"⚠️ Recovered interrupted job {job['id']} ({job['job_type']})")
+
+    def run_forever(self):
+        """Claim and execute queued jobs until the process receives SIGTERM or SIGINT"""
+        signal.signal(signal.SIGTERM, self._handle_shutdown)
+        signal.signal(signal.SIGINT, self._handle_shutdown)
+
+        print(f"👷 Job worker {self.worker_id} started (concurrency: {self.concurrency})")
+        self.recover_stale_jobs()
+
+        slots = threading.Semaphore(self.concurrency)
+        while not self._shutdown.is_set():
+            if not slots.acquire(timeout=self.poll_interval):
+                continue
+
+            job = None
+            try:
+                job = self.db.claim_job(self.worker_id)
+            except Exception as e:
+                print(f"⚠️ Could not claim job: {e}")
+
+            if not job:
+                slots.release()
+                self._shutdown.wait(self.poll_interval)
+                continue
+
+            def run(claimed=job):
+                try:
+                    self._execute(claimed)
+                finally:
+                    slots.release()
+
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        self._drain()
+
+    def _handle_shutdown(self, signum, frame):
+        print(f"👷 Job worker {self.worker_id} shutting down (signal {signum})")
+        self._shutdown.set()
+
+    def _drain(self, timeout: float = 30.0):
+        """Ask active jobs to stop and give them a moment to store their final progress"""
+        with self._active_lock:
+            active = dict(self._active)
+        for progress in active.values():
+            progress["should_stop"] = True
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._active_lock:
+                if not self._active:
+                    break
+            time.sleep(0.5)
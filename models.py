@@ -2,15 +2,77 @@
 Database models for email redirect tool
 """
 
+import base64
+import os
+import shutil
 import sqlite3
 import hashlib
+import json
+import threading
+import time
 from datetime import datetime
+from itertools import groupby
 from typing import List, Dict, Optional
 
+from dns_changes import (DNS_COMPLIANCE_LABELS, canonical_records, dns_compliance_for_records,
+                         dns_issues_for_records, dns_issues_from_compliance, records_hash, redirections_from_records)
+
+# Applied once to every connection - WAL lets dashboard reads run alongside sync writes
+CONNECTION_PRAGMAS = (
+    'PRAGMA auto_vacuum = INCREMENTAL',  # Takes effect for new database files, compact_database converts older ones
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',  # Durable across application crashes, fsync only at checkpoints
+    'PRAGMA cache_size = -20000',  # 20 MB page cache
+    'PRAGMA mmap_size = 268435456',  # 256 MB memory-mapped reads
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Database files whose schema this process has already brought up to date
+_migrated_paths = set()
+_migration_lock = threading.Lock()
+
+# Text indexed for full-text search - the redirections of a domain and the records of a snapshot
+SEARCH_REDIRECT_TARGETS_SQL = """(SELECT COALESCE(group_concat(redirect_name || ' ' || redirect_target, ' '), '')
+                                  FROM redirections WHERE domain_id = {domain_id})"""
+SEARCH_DNS_VALUES_SQL = """(SELECT COALESCE(group_concat(json_extract(r.value, '$.Name') || ' ' || json_extract(r.value, '$.Type')
+                                                     || ' ' || json_extract(r.value, '$.Address'), ' '), '')
+                            FROM dns_snapshots s, json_each(s.records) r
+                            WHERE s.content_hash = {content_hash})"""
+SEARCH_CURRENT_DNS_VALUES_SQL = SEARCH_DNS_VALUES_SQL.format(
+    content_hash='(SELECT content_hash FROM dns_snapshot_versions WHERE domain_name = {domain_name} '
+                 'ORDER BY version DESC LIMIT 1)')
+
+# domain_counters dimensions and the value each domain is counted under, the total has a single value
+DOMAIN_COUNTER_DIMENSIONS = {
+    'total': "''",
+    'client': "COALESCE({row}.client_id, '')",
+    'sync_status': "COALESCE({row}.sync_status, 'unchanged')",
+    'dns_issues': "COALESCE({row}.dns_issues, 'unchecked')",
+}
+
+# search_domains field names and the domain_search columns they restrict to
+SEARCH_FIELDS = {
+    'domain': 'domain_name',
+    'redirect': 'redirect_targets',
+    'dns': 'dns_values',
+}
+
 
 class Database:
+    # Schema migrations in order - PRAGMA user_version holds how many have been applied
+    MIGRATIONS = (
+        '_migrate_baseline',
+        '_migrate_lookup_indexes',
+        '_migrate_dns_snapshot_history',
+        '_migrate_domain_search',
+        '_migrate_domain_counters',
+        '_migrate_dns_compliance_flags',
+        '_migrate_job_resume_requests',
+        '_migrate_api_request_log',
+    )
+
     def __init__(self, db_path: str = None):
-        import os
         if db_path:
             self.db_path = db_path
         else:
@@ -22,232 +84,601 @@ class Database:
             else:
                 self.db_path = 'redirect_tool.db'
 
+        # One persistent connection per thread instead of a new one per call
+        self._local = threading.local()
+
         print(f"Using database at: {self.db_path}")
         self.init_database()
 
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Get this thread's connection, opened on first use with WAL journaling and tuned pragmas"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection, the next call opens a new one"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
     def init_database(self):
-        """Initialize database with required tables"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        """Apply pending schema migrations, at most once per database file per process"""
+        with _migration_lock:
+            if os.path.abspath(self.db_path) in _migrated_paths:
+                return
 
-            # Domains table
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS domains
-                           (
-                               id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               domain_number
-                               INTEGER
-                               UNIQUE
-                               NOT
-                               NULL,
-                               domain_name
-                               TEXT
-                               UNIQUE
-                               NOT
-                               NULL,
-                               client_id
-                               INTEGER,
-                               created_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP,
-                               updated_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP,
-                               FOREIGN
-                               KEY
-                           (
-                               client_id
-                           ) REFERENCES clients
-                           (
-                               id
-                           )
-                               )
-                           ''')
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
 
-            # Redirections table
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS redirections
-                           (
-                               id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               domain_id
-                               INTEGER
-                               NOT
-                               NULL,
-                               redirect_name
-                               TEXT
-                               NOT
-                               NULL,
-                               redirect_target
-                               TEXT
-                               NOT
-                               NULL,
-                               redirect_type
-                               TEXT
-                               DEFAULT
-                               'URL',
-                               created_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP,
-                               updated_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP,
-                               FOREIGN
-                               KEY
-                           (
-                               domain_id
-                           ) REFERENCES domains
-                           (
-                               id
+                # Take the write lock before reading the version, so concurrent processes migrate one at a time
+                cursor.execute('BEGIN IMMEDIATE')
+                version = cursor.execute('PRAGMA user_version').fetchone()[0]
+
+                for number in range(version + 1, len(self.MIGRATIONS) + 1):
+                    migration = getattr(self, self.MIGRATIONS[number - 1])
+                    print(f"🗄️ Applying schema migration {number}: {migration.__doc__}")
+                    migration(cursor)
+
+                if version < len(self.MIGRATIONS):
+                    cursor.execute(f'PRAGMA user_version = {len(self.MIGRATIONS)}')
+                conn.commit()
+
+            _migrated_paths.add(os.path.abspath(self.db_path))
+
+    def _migrate_baseline(self, cursor):
+        """Base schema - idempotent, so it also upgrades databases created before versioning"""
+        # Domains table
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS domains
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           domain_number
+                           INTEGER
+                           UNIQUE
+                           NOT
+                           NULL,
+                           domain_name
+                           TEXT
+                           UNIQUE
+                           NOT
+                           NULL,
+                           client_id
+                           INTEGER,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           updated_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           client_id
+                       ) REFERENCES clients
+                       (
+                           id
+                       )
                            )
-                               )
-                           ''')
+                       ''')
 
-            # Clients table
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS clients
-                           (
-                               id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               client_name
-                               TEXT
-                               UNIQUE
-                               NOT
-                               NULL,
-                               client_url
-                               TEXT,
-                               created_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP
+        # Redirections table
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS redirections
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           domain_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           redirect_name
+                           TEXT
+                           NOT
+                           NULL,
+                           redirect_target
+                           TEXT
+                           NOT
+                           NULL,
+                           redirect_type
+                           TEXT
+                           DEFAULT
+                           'URL',
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           updated_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           domain_id
+                       ) REFERENCES domains
+                       (
+                           id
+                       )
                            )
-                           ''')
+                       ''')
 
-            # Add client_url column if it doesn't exist (for existing databases)
-            try:
-                cursor.execute('ALTER TABLE clients ADD COLUMN client_url TEXT')
-            except sqlite3.OperationalError:
-                # Column already exists
-                pass
+        # Clients table
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS clients
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           client_name
+                           TEXT
+                           UNIQUE
+                           NOT
+                           NULL,
+                           client_url
+                           TEXT,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Add client_url column if it doesn't exist (for existing databases)
+        try:
+            cursor.execute('ALTER TABLE clients ADD COLUMN client_url TEXT')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
 
-            # Add sync_status column if it doesn't exist (for existing databases)
-            try:
-                cursor.execute('ALTER TABLE domains ADD COLUMN sync_status TEXT DEFAULT "unchanged"')
-            except sqlite3.OperationalError:
-                # Column already exists
-                pass
+        # Add sync_status column if it doesn't exist (for existing databases)
+        try:
+            cursor.execute('ALTER TABLE domains ADD COLUMN sync_status TEXT DEFAULT "unchanged"')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
 
-            # Add dns_issues column if it doesn't exist (for DNS validation)
+        # Add dns_issues column if it doesn't exist (for DNS validation)
+        try:
+            cursor.execute('ALTER TABLE domains ADD COLUMN dns_issues TEXT')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
+
+        # Add last_synced_at column if it doesn't exist (for incremental sync)
+        try:
+            cursor.execute('ALTER TABLE domains ADD COLUMN last_synced_at TIMESTAMP')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
+
+        # Add getList metadata columns if they don't exist (for the inventory pass)
+        for column in ('is_expired BOOLEAN', 'is_locked BOOLEAN', 'auto_renew BOOLEAN', 'expires TEXT',
+                       'is_our_dns BOOLEAN', 'in_account BOOLEAN DEFAULT TRUE', 'inventory_seen_at TIMESTAMP'):
             try:
-                cursor.execute('ALTER TABLE domains ADD COLUMN dns_issues TEXT')
+                cursor.execute(f'ALTER TABLE domains ADD COLUMN {column}')
             except sqlite3.OperationalError:
                 # Column already exists
                 pass
 
-            # Users table for authentication
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS users
-                           (
-                               id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               username
-                               TEXT
-                               UNIQUE
-                               NOT
-                               NULL,
-                               password_hash
-                               TEXT
-                               NOT
-                               NULL,
-                               created_at
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP
+        # Users table for authentication
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS users
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           username
+                           TEXT
+                           UNIQUE
+                           NOT
+                           NULL,
+                           password_hash
+                           TEXT
+                           NOT
+                           NULL,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Create default user
+        self._create_default_user(cursor)
+
+        # DNS records table for complete DNS backup and restore
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS dns_records
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           domain_name
+                           TEXT
+                           NOT
+                           NULL,
+                           record_name
+                           TEXT
+                           NOT
+                           NULL,
+                           record_type
+                           TEXT
+                           NOT
+                           NULL,
+                           record_address
+                           TEXT
+                           NOT
+                           NULL,
+                           ttl
+                           TEXT,
+                           mx_pref
+                           TEXT,
+                           backup_timestamp
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           is_current
+                           BOOLEAN
+                           DEFAULT
+                           TRUE,
+                           is_url_redirect
+                           BOOLEAN
+                           DEFAULT
+                           FALSE,
+                           UNIQUE
+                       (
+                           domain_name,
+                           record_name,
+                           record_type,
+                           record_address,
+                           is_current
+                       )
                            )
-                           ''')
+                       ''')
 
-            # Create default user
-            self._create_default_user(cursor)
+        # Background jobs queue shared by the web app and the standalone worker
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS jobs
+                       (
+                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                           job_type TEXT NOT NULL,
+                           progress_key TEXT NOT NULL,
+                           args TEXT NOT NULL DEFAULT '[]',
+                           status TEXT NOT NULL DEFAULT 'queued',
+                           progress TEXT,
+                           progress_version INTEGER DEFAULT 0,
+                           stop_requested BOOLEAN DEFAULT FALSE,
+                           worker_id TEXT,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                           started_at TIMESTAMP,
+                           finished_at TIMESTAMP,
+                           heartbeat_at TIMESTAMP
+                       )
+                       ''')
+
+        # One row per fired schedule slot, so only one process queues it
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS scheduled_runs
+                       (
+                           name TEXT NOT NULL,
+                           slot TEXT NOT NULL,
+                           job_id INTEGER,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                           PRIMARY KEY (name, slot)
+                       )
+                       ''')
+
+        # Append-only log of every per-domain operation a job performed
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS operation_ledger
+                       (
+                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                           job_id INTEGER,
+                           domain_name TEXT NOT NULL,
+                           operation TEXT NOT NULL,
+                           payload_hash TEXT NOT NULL,
+                           outcome TEXT NOT NULL,
+                           api_calls INTEGER DEFAULT 0,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Responses of bulk endpoints by idempotency key, so duplicate requests replay the first result
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS idempotency_keys
+                       (
+                           endpoint TEXT NOT NULL,
+                           idempotency_key TEXT NOT NULL,
+                           request_hash TEXT NOT NULL,
+                           status_code INTEGER,
+                           response TEXT,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                           PRIMARY KEY (endpoint, idempotency_key)
+                       )
+                       ''')
+
+        # Additional Namecheap accounts - domains without an account use the environment credentials
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS accounts
+                       (
+                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                           name TEXT UNIQUE NOT NULL,
+                           api_user TEXT NOT NULL,
+                           api_key TEXT NOT NULL,
+                           username TEXT,
+                           client_ip TEXT,
+                           requests_per_minute INTEGER DEFAULT 20,
+                           requests_per_hour INTEGER DEFAULT 700,
+                           requests_per_day INTEGER DEFAULT 8000,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Add account_id column if it doesn't exist (for multi-account support)
+        try:
+            cursor.execute('ALTER TABLE domains ADD COLUMN account_id INTEGER REFERENCES accounts (id)')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
 
-            # DNS records table for complete DNS backup and restore
-            cursor.execute('''
-                           CREATE TABLE IF NOT EXISTS dns_records
-                           (
-                               id
-                               INTEGER
-                               PRIMARY
-                               KEY
-                               AUTOINCREMENT,
-                               domain_name
-                               TEXT
-                               NOT
-                               NULL,
-                               record_name
-                               TEXT
-                               NOT
-                               NULL,
-                               record_type
-                               TEXT
-                               NOT
-                               NULL,
-                               record_address
-                               TEXT
-                               NOT
-                               NULL,
-                               ttl
-                               TEXT,
-                               mx_pref
-                               TEXT,
-                               backup_timestamp
-                               TIMESTAMP
-                               DEFAULT
-                               CURRENT_TIMESTAMP,
-                               is_current
-                               BOOLEAN
-                               DEFAULT
-                               TRUE,
-                               is_url_redirect
-                               BOOLEAN
-                               DEFAULT
-                               FALSE,
-                               UNIQUE
-                           (
-                               domain_name,
-                               record_name,
-                               record_type,
-                               record_address,
-                               is_current
-                           )
-                               )
+        # Create default "Unassigned" client
+        cursor.execute('''
+                       INSERT
+                       OR IGNORE INTO clients (client_name) VALUES ('Unassigned')
+                       ''')
+
+    def _migrate_lookup_indexes(self, cursor):
+        """Indexes for the per-domain redirection, DNS snapshot, client and sync status lookups"""
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_redirections_domain_id ON redirections (domain_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dns_records_domain_current ON dns_records (domain_name, is_current)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_domains_client_id ON domains (client_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_domains_sync_status ON domains (sync_status)')
+
+    def _migrate_dns_snapshot_history(self, cursor):
+        """Content-addressed DNS snapshots with a per-domain version chain, replacing dns_records"""
+        # One row per distinct record set, shared by every domain and version that has it
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS dns_snapshots
+                       (
+                           content_hash TEXT PRIMARY KEY,
+                           records TEXT NOT NULL,
+                           record_count INTEGER NOT NULL,
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # A new version only when a domain's content changes, checked_at moves on every unchanged sync
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS dns_snapshot_versions
+                       (
+                           id INTEGER PRIMARY KEY AUTOINCREMENT,
+                           domain_name TEXT NOT NULL,
+                           version INTEGER NOT NULL,
+                           content_hash TEXT NOT NULL REFERENCES dns_snapshots (content_hash),
+                           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                           checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                           UNIQUE (domain_name, version)
+                       )
+                       ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dns_snapshot_versions_hash ON dns_snapshot_versions (content_hash)')
+
+        # Convert the row-per-record history: past backups grouped by timestamp, then the current records
+        reader = cursor.connection.cursor()
+        reader.execute('''
+                       SELECT domain_name, record_name, record_type, record_address, ttl, mx_pref,
+                              backup_timestamp, is_current
+                       FROM dns_records
+                       ORDER BY domain_name, is_current, backup_timestamp
+                       ''')
+        migrated = 0
+        for domain_name, rows in groupby(reader, key=lambda row: row[0]):
+            groups = []
+            for row in rows:
+                group_key = 'current' if row[7] else row[6]
+                if not groups or groups[-1][0] != group_key:
+                    groups.append((group_key, []))
+                groups[-1][1].append(row)
+
+            version = 0
+            previous_hash = None
+            for _, group_rows in groups:
+                records = [{'Name': row[1], 'Type': row[2], 'Address': row[3], 'TTL': row[4], 'MXPref': row[5]}
+                           for row in group_rows]
+                content_hash = records_hash(records)
+                if content_hash == previous_hash:
+                    continue
+                stored_at = max(row[6] or '' for row in group_rows) or None
+                self._insert_dns_snapshot_version(cursor, domain_name, version + 1, records, content_hash, stored_at)
+                version += 1
+                previous_hash = content_hash
+            migrated += 1
+
+        cursor.execute('DROP TABLE IF EXISTS dns_records')
+        if migrated:
+            print(f"🗄️ Converted DNS backup history of {migrated} domains to snapshots")
+
+    def _migrate_domain_search(self, cursor):
+        """Full-text search index over domain names, redirections and current DNS record values"""
+        # rowid is the domain id, the triggers keep it in sync with every write path
+        cursor.execute('''
+                       CREATE VIRTUAL TABLE IF NOT EXISTS domain_search USING fts5
+                       (
+                           domain_name,
+                           redirect_targets,
+                           dns_values
+                       )
+                       ''')
+
+        triggers = {
+            'domain_search_domain_insert': f'''
+                AFTER INSERT ON domains BEGIN
+                    INSERT OR REPLACE INTO domain_search (rowid, domain_name, redirect_targets, dns_values)
+                    VALUES (NEW.id, NEW.domain_name,
+                            {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='NEW.id')},
+                            {SEARCH_CURRENT_DNS_VALUES_SQL.format(domain_name='NEW.domain_name')});
+                END''',
+            'domain_search_domain_rename': '''
+                AFTER UPDATE OF domain_name ON domains BEGIN
+                    UPDATE domain_search SET domain_name = NEW.domain_name WHERE rowid = NEW.id;
+                END''',
+            'domain_search_domain_delete': '''
+                AFTER DELETE ON domains BEGIN
+                    DELETE FROM domain_search WHERE rowid = OLD.id;
+                END''',
+            'domain_search_redirection_insert': f'''
+                AFTER INSERT ON redirections BEGIN
+                    UPDATE domain_search SET redirect_targets = {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='NEW.domain_id')}
+                    WHERE rowid = NEW.domain_id;
+                END''',
+            'domain_search_redirection_update': f'''
+                AFTER UPDATE ON redirections BEGIN
+                    UPDATE domain_search SET redirect_targets = {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='OLD.domain_id')}
+                    WHERE rowid = OLD.domain_id;
+                    UPDATE domain_search SET redirect_targets = {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='NEW.domain_id')}
+                    WHERE rowid = NEW.domain_id;
+                END''',
+            'domain_search_redirection_delete': f'''
+                AFTER DELETE ON redirections BEGIN
+                    UPDATE domain_search SET redirect_targets = {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='OLD.domain_id')}
+                    WHERE rowid = OLD.domain_id;
+                END''',
+            # A new snapshot version is always the domain's current one
+            'domain_search_dns_version_insert': f'''
+                AFTER INSERT ON dns_snapshot_versions BEGIN
+                    UPDATE domain_search SET dns_values = {SEARCH_DNS_VALUES_SQL.format(content_hash='NEW.content_hash')}
+                    WHERE rowid = (SELECT id FROM domains WHERE domain_name = NEW.domain_name);
+                END''',
+        }
+        for name, body in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+        cursor.execute('DELETE FROM domain_search')
+        cursor.execute(f'''
+                       INSERT INTO domain_search (rowid, domain_name, redirect_targets, dns_values)
+                       SELECT d.id, d.domain_name,
+                              {SEARCH_REDIRECT_TARGETS_SQL.format(domain_id='d.id')},
+                              {SEARCH_CURRENT_DNS_VALUES_SQL.format(domain_name='d.domain_name')}
+                       FROM domains d
+                       ''')
+
+    def _migrate_domain_counters(self, cursor):
+        """Domain counts per client, sync status and DNS issues, kept current by triggers"""
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS domain_counters
+                       (
+                           dimension TEXT NOT NULL,
+                           value TEXT NOT NULL,
+                           count INTEGER NOT NULL DEFAULT 0,
+                           PRIMARY KEY (dimension, value)
+                       )
+                       ''')
+
+        def increment(dimension, row):
+            return f'''
+                    INSERT INTO domain_counters (dimension, value, count)
+                    VALUES ('{dimension}', {DOMAIN_COUNTER_DIMENSIONS[dimension].format(row=row)}, 1)
+                    ON CONFLICT (dimension, value) DO UPDATE SET count = count + 1;'''
+
+        def decrement(dimension, row):
+            return f'''
+                    UPDATE domain_counters SET count = count - 1
+                    WHERE dimension = '{dimension}' AND value = {DOMAIN_COUNTER_DIMENSIONS[dimension].format(row=row)};'''
+
+        triggers = {
+            'domain_counters_insert': 'AFTER INSERT ON domains BEGIN'
+                                      + ''.join(increment(dimension, 'NEW') for dimension in DOMAIN_COUNTER_DIMENSIONS)
+                                      + ' END',
+            'domain_counters_delete': 'AFTER DELETE ON domains BEGIN'
+                                      + ''.join(decrement(dimension, 'OLD') for dimension in DOMAIN_COUNTER_DIMENSIONS)
+                                      + ' END',
+        }
+        for dimension, column in (('client', 'client_id'), ('sync_status', 'sync_status'), ('dns_issues', 'dns_issues')):
+            old_value = DOMAIN_COUNTER_DIMENSIONS[dimension].format(row='OLD')
+            new_value = DOMAIN_COUNTER_DIMENSIONS[dimension].format(row='NEW')
+            triggers[f'domain_counters_update_{dimension}'] = (
+                f'AFTER UPDATE OF {column} ON domains WHEN {old_value} IS NOT {new_value} BEGIN'
+                + decrement(dimension, 'OLD') + increment(dimension, 'NEW') + ' END')
+
+        for name, body in triggers.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+        self._recount_domains(cursor)
+
+    def _recount_domains(self, cursor):
+        """Recompute domain_counters from the domains table"""
+        cursor.execute('DELETE FROM domain_counters')
+        for dimension, expression in DOMAIN_COUNTER_DIMENSIONS.items():
+            value = expression.format(row='domains')
+            cursor.execute(f'''
+                           INSERT INTO domain_counters (dimension, value, count)
+                           SELECT '{dimension}', {value}, COUNT(*)
+                           FROM domains
+                           GROUP BY {value}
                            ''')
 
-            # Create default "Unassigned" client
-            cursor.execute('''
-                           INSERT
-                           OR IGNORE INTO clients (client_name) VALUES ('Unassigned')
-                           ''')
+    def _migrate_dns_compliance_flags(self, cursor):
+        """DNS compliance flags on domains, computed from the current snapshot, with an index per missing record"""
+        for flag in DNS_COMPLIANCE_LABELS:
+            try:
+                cursor.execute(f'ALTER TABLE domains ADD COLUMN {flag} BOOLEAN')
+            except sqlite3.OperationalError:
+                # Column already exists
+                pass
+            # Partial index in dashboard order - only the domains missing the record are in it
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_domains_missing_{flag[4:]} '
+                           f'ON domains (domain_number) WHERE {flag} = 0')
+
+        reader = cursor.connection.cursor()
+        reader.execute('''
+                       SELECT v.domain_name, s.records
+                       FROM dns_snapshot_versions v
+                                JOIN dns_snapshots s ON s.content_hash = v.content_hash
+                       WHERE v.version = (SELECT MAX(version)
+                                          FROM dns_snapshot_versions
+                                          WHERE domain_name = v.domain_name)
+                       ''')
+        for domain_name, records in reader:
+            self._update_dns_compliance(cursor, domain_name, json.loads(records))
+
+    def _migrate_job_resume_requests(self, cursor):
+        """Resume flag on jobs, so a job waiting out a rate limit pause in the worker can be resumed from the web app"""
+        try:
+            cursor.execute('ALTER TABLE jobs ADD COLUMN resume_requested BOOLEAN DEFAULT FALSE')
+        except sqlite3.OperationalError:
+            # Column already exists
+            pass
 
-            conn.commit()
+    def _migrate_api_request_log(self, cursor):
+        """Namecheap API request times of the last day per account, shared by the web and worker processes"""
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS api_requests
+                       (
+                           account_id INTEGER,
+                           requested_at REAL NOT NULL
+                       )
+                       ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_api_requests_account ON api_requests (account_id, requested_at)')
 
     def _create_default_user(self, cursor):
         """Create default user with specified credentials"""
@@ -363,7 +794,8 @@ class Database:
             cursor.execute('''
                 SELECT d.id, d.domain_number, d.domain_name, c.client_name, c.id as client_id,
                        d.updated_at, d.sync_status, d.dns_issues,
-                       r.redirect_name, r.redirect_target, r.redirect_type
+                       r.redirect_name, r.redirect_target, r.redirect_type,
+                       d.is_expired, d.is_our_dns, d.expires, d.in_account
                 FROM domains d
                 LEFT JOIN clients c ON d.client_id = c.id
                 LEFT JOIN redirections r ON d.id = r.domain_id
@@ -372,7 +804,7 @@ class Database:
 
             domains_map = {}
             for row in cursor.fetchall():
-                domain_id, domain_number, domain_name, client_name, client_id, updated_at, sync_status, dns_issues, redirect_name, redirect_target, redirect_type = row
+                domain_id, domain_number, domain_name, client_name, client_id, updated_at, sync_status, dns_issues, redirect_name, redirect_target, redirect_type, is_expired, is_our_dns, expires, in_account = row
 
                 if domain_id not in domains_map:
                     domains_map[domain_id] = {
@@ -385,7 +817,11 @@ class Database:
                         'redirect_url': '',
                         'updated_at': updated_at,
                         'sync_status': sync_status or 'unchanged',
-                        'dns_issues': dns_issues
+                        'dns_issues': dns_issues,
+                        'is_expired': bool(is_expired),
+                        'is_our_dns': is_our_dns is None or bool(is_our_dns),
+                        'expires': expires,
+                        'in_account': in_account is None or bool(in_account)
                     }
 
                 if redirect_name:
@@ -399,6 +835,269 @@ class Database:
 
             return list(domains_map.values())
 
+    # Sortable columns of the domain list, NULLs mapped to the values the dashboard shows for them
+    DOMAIN_SORT_COLUMNS = {
+        'domain_number': 'd.domain_number',
+        'domain_name': 'd.domain_name',
+        'client_name': "COALESCE(c.client_name, 'Unassigned')",
+        'sync_status': "COALESCE(d.sync_status, 'unchanged')",
+        'dns_issues': "COALESCE(d.dns_issues, '')",
+        'updated_at': "COALESCE(d.updated_at, '')",
+    }
+
+    def get_domains_page(self, client_id: Optional[int] = None, sync_status: Optional[str] = None,
+                         dns_issues: Optional[str] = None, search: Optional[str] = None,
+                         missing: Optional[str] = None, sort: str = 'domain_number', descending: bool = False,
+                         cursor: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Get one page of the domain list, filtered and sorted in SQL with keyset pagination
+
+        Args:
+            client_id: Only domains of this client
+            sync_status: Only domains with this sync status
+            dns_issues: Only domains with exactly these DNS issues, 'unchecked' for never checked
+            search: Case-insensitive substring of the domain name
+            missing: Only domains whose current records lack this one ('spf', 'dmarc', 'dkim'
+                or 'google_verification')
+            sort: One of DOMAIN_SORT_COLUMNS, ties are broken by domain id
+            descending: Sort direction
+            cursor: next_cursor of the previous page
+            limit: Page size, None for all remaining domains
+
+        Returns:
+            Dict: 'domains' in get_all_domains_with_redirections format, 'total_count'
+            of all matching domains and 'next_cursor' (None on the last page)
+
+        Raises:
+            ValueError: For an unknown sort column, missing record or a malformed cursor
+        """
+        if sort not in self.DOMAIN_SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column: {sort}")
+        sort_expression = self.DOMAIN_SORT_COLUMNS[sort]
+
+        conditions = []
+        params = []
+        if client_id is not None:
+            conditions.append('d.client_id = ?')
+            params.append(client_id)
+        if sync_status:
+            conditions.append("COALESCE(d.sync_status, 'unchanged') = ?")
+            params.append(sync_status)
+        if dns_issues == 'unchecked':
+            conditions.append('d.dns_issues IS NULL')
+        elif dns_issues:
+            conditions.append('d.dns_issues = ?')
+            params.append(dns_issues)
+        if search:
+            conditions.append("d.domain_name LIKE ? ESCAPE '\\'")
+            escaped = search.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        if missing:
+            if f'has_{missing}' not in DNS_COMPLIANCE_LABELS:
+                raise ValueError(f"Unknown DNS record: {missing}")
+            conditions.append(f'd.has_{missing} = 0')
+
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if cursor:
+            try:
+                after_value, after_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+            page_conditions.append(f"({sort_expression}, d.id) {'<' if descending else '>'} (?, ?)")
+            page_params.extend([after_value, after_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        page_where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ''
+        direction = 'DESC' if descending else 'ASC'
+
+        with self.get_connection() as conn:
+            cursor_ = conn.cursor()
+            cursor_.execute(f'''
+                            SELECT COUNT(*)
+                            FROM domains d
+                                     LEFT JOIN clients c ON d.client_id = c.id
+                            {where}
+                            ''', params)
+            total_count = cursor_.fetchone()[0]
+
+            # One row more than the page tells whether another page follows
+            cursor_.execute(f'''
+                            SELECT d.id, d.domain_number, d.domain_name, c.client_name, c.id as client_id,
+                                   d.updated_at, d.sync_status, d.dns_issues,
+                                   d.is_expired, d.is_our_dns, d.expires, d.in_account,
+                                   {sort_expression}, {', '.join(f'd.{flag}' for flag in DNS_COMPLIANCE_LABELS)}
+                            FROM domains d
+                                     LEFT JOIN clients c ON d.client_id = c.id
+                            {page_where}
+                            ORDER BY {sort_expression} {direction}, d.id {direction}
+                            LIMIT ?
+                            ''', (*page_params, limit + 1 if limit else -1))
+            rows = cursor_.fetchall()
+
+            next_cursor = None
+            if limit and len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = base64.urlsafe_b64encode(json.dumps([last[12], last[0]]).encode()).decode()
+
+            domains_map = {}
+            for row in rows:
+                domain_id, domain_number, domain_name, client_name, row_client_id, updated_at, row_sync_status, row_dns_issues, is_expired, is_our_dns, expires, in_account, _ = row[:13]
+                domains_map[domain_id] = {
+                    'id': domain_id,
+                    'domain_number': domain_number,
+                    'domain_name': domain_name,
+                    'client_name': client_name or 'Unassigned',
+                    'client_id': row_client_id,
+                    'redirections': [],
+                    'redirect_url': '',
+                    'updated_at': updated_at,
+                    'sync_status': row_sync_status or 'unchanged',
+                    'dns_issues': row_dns_issues,
+                    'is_expired': bool(is_expired),
+                    'is_our_dns': is_our_dns is None or bool(is_our_dns),
+                    'expires': expires,
+                    'in_account': in_account is None or bool(in_account)
+                }
+                # None until a snapshot with records has been stored
+                domains_map[domain_id].update(
+                    (flag, None if value is None else bool(value))
+                    for flag, value in zip(DNS_COMPLIANCE_LABELS, row[13:]))
+
+            # Redirections of the page only, staying below SQLite's bound parameter limit
+            domain_ids = list(domains_map)
+            for start in range(0, len(domain_ids), 500):
+                chunk = domain_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor_.execute(f'''
+                                SELECT domain_id, redirect_name, redirect_target, redirect_type
+                                FROM redirections
+                                WHERE domain_id IN ({placeholders})
+                                ORDER BY id
+                                ''', chunk)
+                for domain_id, redirect_name, redirect_target, redirect_type in cursor_.fetchall():
+                    domain = domains_map[domain_id]
+                    domain['redirections'].append({
+                        'name': redirect_name,
+                        'target': redirect_target,
+                        'type': redirect_type
+                    })
+                    if redirect_name == '@' and redirect_target:
+                        domain['redirect_url'] = redirect_target
+
+        return {
+            'domains': list(domains_map.values()),
+            'total_count': total_count,
+            'next_cursor': next_cursor
+        }
+
+    def get_dns_issue_values(self) -> List[str]:
+        """Distinct DNS issue values across all domains, for the dashboard filter - read from domain_counters"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT value
+                           FROM domain_counters
+                           WHERE dimension = 'dns_issues'
+                             AND value != 'unchecked'
+                             AND count > 0
+                           ORDER BY value
+                           ''')
+            return [row[0] for row in cursor.fetchall()]
+
+    # Summary Methods
+    def get_domain_summary(self) -> Dict:
+        """
+        Domain counts from domain_counters, without reading the domains table
+
+        Returns:
+            Dict: 'total', 'by_client' (client_id, client_name, count), 'by_sync_status'
+            and 'by_dns_issues' ('unchecked' for domains never checked)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT dc.dimension, dc.value, dc.count, c.client_name
+                           FROM domain_counters dc
+                                    LEFT JOIN clients c ON dc.dimension = 'client' AND c.id = dc.value
+                           WHERE dc.count > 0
+                           ORDER BY dc.dimension, dc.count DESC
+                           ''')
+
+            summary = {'total': 0, 'by_client': [], 'by_sync_status': {}, 'by_dns_issues': {}}
+            for dimension, value, count, client_name in cursor.fetchall():
+                if dimension == 'total':
+                    summary['total'] = count
+                elif dimension == 'client':
+                    summary['by_client'].append({
+                        'client_id': int(value) if value else None,
+                        'client_name': client_name or 'Unassigned',
+                        'count': count
+                    })
+                else:
+                    summary[f'by_{dimension}'][value] = count
+
+            return summary
+
+    def recount_domains(self):
+        """Recompute the domain counters, after imports whose INSERT OR REPLACE bypassed the delete trigger"""
+        with self.get_connection() as conn:
+            self._recount_domains(conn.cursor())
+            conn.commit()
+
+    # Search Methods
+    def search_domains(self, query: str, field: Optional[str] = None, limit: Optional[int] = 100) -> List[Dict]:
+        """
+        Full-text search over domain names, redirect targets and current DNS record values
+
+        Every whitespace-separated term has to match, as a prefix, e.g. 'include:_spf.oldmail'
+        finds TXT records with that SPF include and 'client.com' finds redirects to it.
+
+        Args:
+            query: Search terms
+            field: Restrict the search to one of SEARCH_FIELDS
+            limit: Maximum number of matches, None for all
+
+        Returns:
+            List[Dict]: Matches, best first, with domain_name, domain_number, client_name,
+            dns_issues, rank and a snippet of the matching text
+
+        Raises:
+            ValueError: For an unknown field or a query without search terms
+        """
+        if field and field not in SEARCH_FIELDS:
+            raise ValueError(f"Unknown search field: {field}")
+
+        # Quote every term so punctuation in hostnames and record values is matched literally
+        terms = ['"' + term.replace('"', '""') + '"*' for term in query.split()]
+        if not terms:
+            raise ValueError("Search query is empty")
+        match = ' '.join(terms)
+        if field:
+            match = f"{{{SEARCH_FIELDS[field]}}} : ({match})"
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT d.domain_name, d.domain_number, c.client_name, d.dns_issues, s.rank,
+                                  snippet(domain_search, -1, '[', ']', '…', 12)
+                           FROM domain_search s
+                                    JOIN domains d ON d.id = s.rowid
+                                    LEFT JOIN clients c ON d.client_id = c.id
+                           WHERE domain_search MATCH ?
+                           ORDER BY s.rank LIMIT ?
+                           ''', (match, limit if limit else -1))
+
+            return [{
+                'domain_name': row[0],
+                'domain_number': row[1],
+                'client_name': row[2] or 'Unassigned',
+                'dns_issues': row[3],
+                'rank': row[4],
+                'snippet': row[5]
+            } for row in cursor.fetchall()]
+
     def get_all_clients(self) -> List[Dict]:
         """Get all clients"""
         with self.get_connection() as conn:
@@ -474,15 +1173,192 @@ class Database:
                            ''', (client_id, domain_name))
 
     def update_domain_sync_status(self, domain_name: str, status: str):
-        """Update sync status for a domain"""
+        """Update sync status for a domain, a 'synced' status also stamps last_synced_at"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                            UPDATE domains
-                           SET sync_status = ?,
-                               updated_at  = CURRENT_TIMESTAMP
+                           SET sync_status    = ?,
+                               last_synced_at = CASE WHEN ? = 'synced' THEN CURRENT_TIMESTAMP ELSE last_synced_at END,
+                               updated_at     = CURRENT_TIMESTAMP
                            WHERE domain_name = ?
-                           ''', (status, domain_name))
+                           ''', (status, status, domain_name))
+
+    def apply_domain_inventory(self, inventory: List[Dict], account_id: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Store getList metadata for every domain and diff it against the previous inventory
+
+        New domains are inserted, domains missing from the account are flagged with
+        in_account = FALSE (their history and client assignment are kept).
+
+        Args:
+            inventory: Domains from NamecheapAPIClient.get_all_domains_paginated
+            account_id: Account the inventory was listed from (None for the environment
+                account). Listed domains are tagged with it and only domains of this
+                account can be reported as removed.
+
+        Returns:
+            Dict with 'new', 'removed' and 'expired' (newly expired) domain names
+        """
+        changes = {'new': [], 'removed': [], 'expired': []}
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT domain_name, in_account, is_expired, account_id FROM domains')
+            previous = {}
+            account_domains = set()
+            for domain_name, in_account, is_expired, domain_account_id in cursor.fetchall():
+                previous[domain_name] = (in_account, is_expired)
+                if domain_account_id == account_id:
+                    account_domains.add(domain_name)
+
+            cursor.execute('SELECT id FROM clients WHERE client_name = ?', ('Unassigned',))
+            unassigned_client = cursor.fetchone()
+            unassigned_client_id = unassigned_client[0] if unassigned_client else None
+
+            cursor.execute('SELECT MAX(domain_number) FROM domains')
+            next_number = (cursor.fetchone()[0] or 0) + 1
+
+            seen = set()
+            for domain in inventory:
+                domain_name = domain['name']
+                if not domain_name or domain_name in seen:
+                    continue
+                seen.add(domain_name)
+
+                metadata = (domain.get('is_expired', False), domain.get('is_locked', False),
+                            domain.get('auto_renew', False), domain.get('expires', ''),
+                            domain.get('is_our_dns', False))
+
+                if domain_name not in previous:
+                    cursor.execute('''
+                                   INSERT INTO domains (domain_number, domain_name, client_id, is_expired, is_locked,
+                                                        auto_renew, expires, is_our_dns, in_account, inventory_seen_at,
+                                                        account_id)
+                                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, TRUE, CURRENT_TIMESTAMP, ?)
+                                   ''', (next_number, domain_name, unassigned_client_id, *metadata, account_id))
+                    next_number += 1
+                    changes['new'].append(domain_name)
+                    continue
+
+                was_in_account, was_expired = previous[domain_name]
+                if was_in_account is not None and not was_in_account:
+                    # Domain came back to the account
+                    changes['new'].append(domain_name)
+                if domain.get('is_expired') and not was_expired:
+                    changes['expired'].append(domain_name)
+
+                cursor.execute('''
+                               UPDATE domains
+                               SET is_expired        = ?,
+                                   is_locked         = ?,
+                                   auto_renew        = ?,
+                                   expires           = ?,
+                                   is_our_dns        = ?,
+                                   in_account        = TRUE,
+                                   inventory_seen_at = CURRENT_TIMESTAMP,
+                                   account_id        = ?
+                               WHERE domain_name = ?
+                               ''', (*metadata, account_id, domain_name))
+
+            for domain_name in account_domains:
+                was_in_account = previous[domain_name][0]
+                if domain_name not in seen and (was_in_account is None or was_in_account):
+                    changes['removed'].append(domain_name)
+                    cursor.execute('UPDATE domains SET in_account = FALSE WHERE domain_name = ?', (domain_name,))
+
+            conn.commit()
+
+        return changes
+
+    def get_unmanaged_domains(self, domain_names: List[str]) -> Dict[str, str]:
+        """
+        Find domains whose hosts cannot be read or written through Namecheap, per the last inventory
+
+        Args:
+            domain_names: Domains a job is about to process
+
+        Returns:
+            Dict[str, str]: Domain name -> reason ('expired' or 'not using Namecheap DNS').
+            Domains without inventory metadata are never included.
+        """
+        unmanaged = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT domain_name, is_expired, is_our_dns
+                               FROM domains
+                               WHERE domain_name IN ({placeholders})
+                                 AND (is_expired = TRUE OR is_our_dns = FALSE)
+                               ''', chunk)
+                for domain_name, is_expired, is_our_dns in cursor.fetchall():
+                    unmanaged[domain_name] = 'expired' if is_expired else 'not using Namecheap DNS'
+
+        return unmanaged
+
+    def get_domains_needing_sync(self, domain_names: List[str], max_age_seconds: int,
+                                 issues_max_age_seconds: int) -> List[str]:
+        """
+        Apply the incremental sync freshness policy to a domain list
+
+        A domain needs a sync when it is not in the database yet, was never synced,
+        is not 'synced', or its last sync is older than the max age. Domains with
+        DNS issues use the shorter issues_max_age_seconds.
+
+        Args:
+            domain_names: Domains currently in the Namecheap account
+            max_age_seconds: Maximum age of a sync for domains without DNS issues
+            issues_max_age_seconds: Maximum age of a sync for domains with DNS issues
+
+        Returns:
+            List[str]: Stale domains, most urgent first (new/never synced, not_synced,
+            DNS issues, then oldest sync)
+        """
+        known = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT domain_name,
+                                      sync_status,
+                                      dns_issues,
+                                      last_synced_at,
+                                      CAST(strftime('%s', 'now') - strftime('%s', last_synced_at) AS INTEGER)
+                               FROM domains
+                               WHERE domain_name IN ({placeholders})
+                               ''', chunk)
+                for row in cursor.fetchall():
+                    known[row[0]] = row[1:]
+
+        stale = []
+        for position, domain_name in enumerate(domain_names):
+            if domain_name not in known:
+                stale.append((0, '', position, domain_name))
+                continue
+
+            sync_status, dns_issues, last_synced_at, age = known[domain_name]
+            has_issues = dns_issues is not None and dns_issues != 'ok'
+            if last_synced_at is None:
+                priority = 0
+            elif sync_status == 'not_synced':
+                priority = 1
+            elif has_issues and age >= issues_max_age_seconds:
+                priority = 2
+            elif sync_status != 'synced' or age >= max_age_seconds:
+                priority = 3
+            else:
+                continue
+            stale.append((priority, last_synced_at or '', position, domain_name))
+
+        stale.sort()
+        return [domain_name for _, _, _, domain_name in stale]
 
     def update_domain_dns_issues(self, domain_name: str, issues: str):
         """Update DNS issues for a domain"""
@@ -530,70 +1406,56 @@ class Database:
         - DMARC: Record with hostname "_dmarc"
         - DKIM: Record containing "v=DKIM1;"
 
+        Reads the compliance flags stored with the current snapshot, the records
+        are only scanned for a domain added after its snapshot was stored.
+
         Returns:
             'ok' if all records found, otherwise string describing missing records
         """
+        compliance = self.get_dns_compliance(domain_name)
+        if compliance is not None:
+            return dns_issues_from_compliance(compliance)
+
+        # None when nothing is stored yet - sync from api
+        return dns_issues_for_records(self.get_current_dns_records(domain_name))
+
+    def _update_dns_compliance(self, cursor, domain_name: str, dns_records: List[Dict]):
+        """Set the compliance flags of a domain from its current records, NULL when there are none"""
+        compliance = dns_compliance_for_records(dns_records) or dict.fromkeys(DNS_COMPLIANCE_LABELS)
+        assignments = ', '.join(f'{flag} = ?' for flag in DNS_COMPLIANCE_LABELS)
+        cursor.execute(f'UPDATE domains SET {assignments} WHERE domain_name = ?',
+                       (*(compliance[flag] for flag in DNS_COMPLIANCE_LABELS), domain_name))
+
+    def get_dns_compliance(self, domain_name: str) -> Optional[Dict[str, bool]]:
+        """Compliance flags of a domain, None when they have not been computed"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(DNS_COMPLIANCE_LABELS)} FROM domains WHERE domain_name = ?",
+                           (domain_name,))
+            row = cursor.fetchone()
 
-            # Get current DNS records for this domain
-            cursor.execute('''
-                           SELECT record_name, record_type, record_address
-                           FROM dns_records
-                           WHERE domain_name = ?
-                             AND is_current = TRUE
-                           ''', (domain_name,))
-
-            dns_records = cursor.fetchall()
-
-            if not dns_records:
-                # sync from api
-
-                return None
+        if not row or row[0] is None:
+            return None
+        return {flag: bool(value) for flag, value in zip(DNS_COMPLIANCE_LABELS, row)}
 
-            # Track found records
-            spf_found = False
-            google_verification_found = False
-            dmarc_found = False
-            dkim_found = False
-            for record_name, record_type, record_address in dns_records:
-                record_type = record_type.upper()
-                record_name = record_name.lower()
-                record_address_lower = record_address.strip().lower()
-
-                if 'v=spf1' in record_address_lower:
-                    spf_found = True
-
-                if 'google-site-verification' in record_address_lower:
-                    google_verification_found = True
-
-                if record_name == '_dmarc':
-                    dmarc_found = True
-
-                if 'v=dkim1;' in record_address_lower:
-                    dkim_found = True
-
-            # Build list of missing records
-            missing_records = []
-            if not spf_found:
-                missing_records.append('SPF')
-            if not google_verification_found:
-                missing_records.append('Google Verification')
-            if not dmarc_found:
-                missing_records.append('DMARC')
-            if not dkim_found:
-                missing_records.append('DKIM')
-
-            if missing_records:
-                return f"Missing: {', '.join(missing_records)}"
-            else:
-                return 'ok'
+    def get_missing_dns_record_counts(self) -> Dict[str, int]:
+        """Number of domains missing each required record, counted from the partial indexes"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            counts = {}
+            for flag in DNS_COMPLIANCE_LABELS:
+                cursor.execute(f'SELECT COUNT(*) FROM domains WHERE {flag} = 0')
+                counts[flag[4:]] = cursor.fetchone()[0]
+            return counts
 
     # DNS Backup and Restore Methods
     def backup_dns_records(self, domain_name: str, dns_records: List[Dict]) -> bool:
         """
         Backup complete DNS records for a domain before making changes
 
+        A new snapshot version is only added when the records differ from the
+        current version, otherwise the current version is marked as checked.
+
         Args:
             domain_name: The domain to backup
             dns_records: List of DNS records from Namecheap API
@@ -604,83 +1466,209 @@ class Database:
         try:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-
-                # Mark previous records as not current
-                cursor.execute('''
-                               UPDATE dns_records
-                               SET is_current = FALSE
-                               WHERE domain_name = ?
-                                 AND is_current = TRUE
-                               ''', (domain_name,))
-
-                # Insert current DNS records
-                for record in dns_records:
-                    is_url_redirect = record.get('Type', '').upper() == 'URL'
-
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO dns_records
-                        (domain_name, record_name, record_type, record_address, ttl, mx_pref, is_url_redirect, is_current)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, TRUE)
-                    ''', (
-                        domain_name,
-                        record.get('Name', '@'),
-                        record.get('Type', ''),
-                        record.get('Address', ''),
-                        record.get('TTL', ''),
-                        record.get('MXPref', ''),
-                        is_url_redirect
-                    ))
-
+                changed = self._store_dns_snapshot(cursor, domain_name, dns_records)
                 conn.commit()
+
+            if changed:
                 print(f"✅ Backed up {len(dns_records)} DNS records for {domain_name}")
-                return True
+            else:
+                print(f"✅ DNS records for {domain_name} unchanged since the last backup")
+            return True
 
         except Exception as e:
             print(f"❌ Failed to backup DNS records for {domain_name}: {e}")
             return False
 
-    def get_current_dns_records(self, domain_name: str) -> List[Dict]:
+    def _store_dns_snapshot(self, cursor, domain_name: str, dns_records: List[Dict],
+                            update_compliance: bool = True) -> bool:
+        """Add a snapshot version if the records changed, returns False when only checked_at moved
+
+        A new version also updates the domain's compliance flags, unless the caller sets them itself.
         """
-        Get current DNS records for a domain from backup
+        content_hash = records_hash(dns_records)
+        cursor.execute('''
+                       SELECT id, version, content_hash
+                       FROM dns_snapshot_versions
+                       WHERE domain_name = ?
+                       ORDER BY version DESC LIMIT 1
+                       ''', (domain_name,))
+        latest = cursor.fetchone()
+
+        if latest and latest[2] == content_hash:
+            cursor.execute('UPDATE dns_snapshot_versions SET checked_at = CURRENT_TIMESTAMP WHERE id = ?', (latest[0],))
+            return False
+
+        self._insert_dns_snapshot_version(cursor, domain_name, (latest[1] if latest else 0) + 1, dns_records, content_hash)
+        if update_compliance:
+            self._update_dns_compliance(cursor, domain_name, dns_records)
+        return True
+
+    def _insert_dns_snapshot_version(self, cursor, domain_name: str, version: int, dns_records: List[Dict],
+                                     content_hash: str, stored_at: Optional[str] = None):
+        """Store the content once by hash and append a version pointing at it"""
+        records = canonical_records(dns_records)
+        cursor.execute('''
+                       INSERT OR IGNORE INTO dns_snapshots (content_hash, records, record_count)
+                       VALUES (?, ?, ?)
+                       ''', (content_hash, json.dumps(records), len(records)))
+        cursor.execute('''
+                       INSERT INTO dns_snapshot_versions (domain_name, version, content_hash, created_at, checked_at)
+                       VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), COALESCE(?, CURRENT_TIMESTAMP))
+                       ''', (domain_name, version, content_hash, stored_at, stored_at))
+
+    def apply_dns_write(self, domain_name: str, dns_records: List[Dict]) -> Optional[str]:
+        """
+        Store a record set just written with setHosts as the domain's current snapshot
+
+        The DNS records, the redirections and domains.dns_issues are replaced in one
+        transaction, so the database matches Namecheap without a follow-up sync.
 
         Args:
-            domain_name: The domain to get records for
+            domain_name: The domain that was written
+            dns_records: The exact record set sent to Namecheap
 
         Returns:
-            List[Dict]: Current DNS records in Namecheap API format
+            Optional[str]: The recomputed DNS issues
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('SELECT id FROM domains WHERE domain_name = ?', (domain_name,))
+            row = cursor.fetchone()
+            dns_issues = self._replace_dns_snapshot(cursor, domain_name, row[0] if row else None, dns_records)
+
+            conn.commit()
+
+        print(f"💾 Stored {len(dns_records)} written DNS records for {domain_name}")
+        return dns_issues
+
+    def apply_domain_snapshot(self, domain_name: str, dns_records: List[Dict]) -> Dict:
+        """
+        Store a domain's full host list from a sync in a single transaction
+
+        Upserts the domain, replaces the current DNS records and the redirections,
+        recomputes dns_issues and marks the domain as synced. An empty host list
+        keeps the stored snapshot and only updates the sync status.
+
+        Args:
+            domain_name: The synced domain
+            dns_records: All host records returned by getHosts
+
+        Returns:
+            Dict: domain_number, created (True for a new domain), dns_issues and
+            redirections (number of URL redirections stored)
+        """
+        return self.apply_domain_snapshots([(domain_name, dns_records)])[0]
+
+    def apply_domain_snapshots(self, snapshots: List[tuple]) -> List[Dict]:
+        """
+        Store the host lists of many domains in one transaction, see apply_domain_snapshot
+
+        Args:
+            snapshots: (domain_name, dns_records) pairs, applied in order
+
+        Returns:
+            List[Dict]: The apply_domain_snapshot result of each pair
         """
+        results = []
         with self.get_connection() as conn:
             cursor = conn.cursor()
+
+            for domain_name, dns_records in snapshots:
+                cursor.execute('SELECT id, domain_number FROM domains WHERE domain_name = ?', (domain_name,))
+                existing = cursor.fetchone()
+                created = existing is None
+                if created:
+                    cursor.execute('''
+                                   INSERT
+                                   OR IGNORE INTO domains (domain_number, domain_name, client_id)
+                                   VALUES ((SELECT COALESCE(MAX(domain_number), 0) + 1 FROM domains), ?,
+                                           (SELECT id FROM clients WHERE client_name = 'Unassigned'))
+                                   ''', (domain_name,))
+                    cursor.execute('SELECT id, domain_number FROM domains WHERE domain_name = ?', (domain_name,))
+                    existing = cursor.fetchone()
+                domain_id, domain_number = existing
+
+                dns_issues = None
+                if dns_records:
+                    dns_issues = self._replace_dns_snapshot(cursor, domain_name, domain_id, dns_records)
+
+                results.append({
+                    'domain_number': domain_number,
+                    'created': created,
+                    'dns_issues': dns_issues,
+                    'redirections': len(redirections_from_records(dns_records))
+                })
+
+            cursor.executemany('''
+                               UPDATE domains
+                               SET sync_status    = 'synced',
+                                   last_synced_at = CURRENT_TIMESTAMP,
+                                   updated_at     = CURRENT_TIMESTAMP
+                               WHERE domain_name = ?
+                               ''', [(domain_name,) for domain_name, _ in snapshots])
+
+            conn.commit()
+
+        return results
+
+    def _replace_dns_snapshot(self, cursor, domain_name: str, domain_id: Optional[int],
+                              dns_records: List[Dict]) -> Optional[str]:
+        """Store a DNS snapshot and replace the redirections, dns_issues and compliance flags of a domain within the caller's transaction"""
+        compliance = dns_compliance_for_records(dns_records)
+        dns_issues = dns_issues_from_compliance(compliance)
+        compliance = compliance or dict.fromkeys(DNS_COMPLIANCE_LABELS)
+
+        self._store_dns_snapshot(cursor, domain_name, dns_records, update_compliance=not domain_id)
+
+        if domain_id:
+            redirections = [(domain_id, redirect['name'], redirect['target'], redirect['type'])
+                            for redirect in redirections_from_records(dns_records)]
+            # Unchanged redirections are left alone, which also spares the search index update
             cursor.execute('''
-                           SELECT record_name, record_type, record_address, ttl, mx_pref, is_url_redirect
-                           FROM dns_records
-                           WHERE domain_name = ?
-                             AND is_current = TRUE
-                           ORDER BY record_type, record_name
-                           ''', (domain_name,))
+                           SELECT domain_id, redirect_name, redirect_target, redirect_type
+                           FROM redirections
+                           WHERE domain_id = ?
+                           ORDER BY id
+                           ''', (domain_id,))
+            if cursor.fetchall() != redirections:
+                cursor.execute('DELETE FROM redirections WHERE domain_id = ?', (domain_id,))
+                cursor.executemany('''
+                                   INSERT INTO redirections (domain_id, redirect_name, redirect_target, redirect_type)
+                                   VALUES (?, ?, ?, ?)
+                                   ''', redirections)
+
+            cursor.execute(f'''
+                           UPDATE domains
+                           SET dns_issues = ?,
+                               {', '.join(f'{flag} = ?' for flag in DNS_COMPLIANCE_LABELS)},
+                               updated_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           ''', (dns_issues, *(compliance[flag] for flag in DNS_COMPLIANCE_LABELS), domain_id))
 
-            records = []
-            for row in cursor.fetchall():
-                record = {
-                    'Name': row[0],
-                    'Type': row[1],
-                    'Address': row[2],
-                    'TTL': row[3] or '1800'
-                }
+        return dns_issues
 
-                # Add MXPref for MX records
-                if row[1].upper() == 'MX' and row[4]:
-                    record['MXPref'] = row[4]
+    def get_current_dns_records(self, domain_name: str) -> List[Dict]:
+        """
+        Get current DNS records for a domain from backup
 
-                records.append(record)
+        Args:
+            domain_name: The domain to get records for
 
-            return records
+        Returns:
+            List[Dict]: Current DNS records in Namecheap API format
+        """
+        snapshot = self.get_current_dns_snapshots([domain_name]).get(domain_name)
+        return snapshot['records'] if snapshot else []
 
     def update_redirect_in_backup(self, domain_name: str, redirect_name: str, new_target: str) -> List[Dict]:
         """
-        Update a URL redirect in the DNS backup and return complete record set
+        Build the complete record set for a URL redirect update from the DNS backup
         This also removes any existing parking page records (CNAME, A records) for the same name
 
+        The backup itself is not changed - set_hosts stores the record set once
+        Namecheap has accepted it.
+
         Args:
             domain_name: The domain to update
             redirect_name: The redirect name (e.g., '@', 'www')
@@ -689,82 +1677,703 @@ class Database:
         Returns:
             List[Dict]: Complete DNS records with updated redirect
         """
+        records = []
+        removed_count = 0
+        updated = False
+        for record in self.get_current_dns_records(domain_name):
+            address = record['Address']
+            if record['Name'] == redirect_name:
+                # STEP 1: Remove any existing parking page records for this name
+                # This includes CNAME records pointing to parking services like parkingpage.namecheap.com
+                if record['Type'] in ('CNAME', 'A') or 'parking' in address.lower():
+                    removed_count += 1
+                    continue
+
+                # STEP 2: Update existing URL redirect record if it exists
+                if record['Type'] == 'URL':
+                    record = dict(record, Address=new_target)
+                    updated = True
+            records.append(record)
+
+        if removed_count > 0:
+            print(f"🗑️  Removed {removed_count} parking page record(s) for {redirect_name}")
+
+        # STEP 3: If no URL redirect was updated, add new redirect
+        if updated:
+            print(f"✏️  Updated URL redirect: {redirect_name} -> {new_target}")
+        else:
+            records.append({'Name': redirect_name, 'Type': 'URL', 'Address': new_target, 'TTL': '300'})
+            print(f"➕ Added new URL redirect: {redirect_name} -> {new_target}")
+
+        return records
+
+    def get_dns_backup_history(self, domain_name: str, limit: int = 10) -> List[Dict]:
+        """
+        Get DNS backup history for a domain, one entry per distinct snapshot version
+
+        Args:
+            domain_name: The domain to get history for
+            limit: Maximum number of backups to return
+
+        Returns:
+            List[Dict]: DNS backup history, newest first
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT v.created_at, s.record_count, v.version, v.content_hash, v.checked_at
+                           FROM dns_snapshot_versions v
+                                    JOIN dns_snapshots s ON s.content_hash = v.content_hash
+                           WHERE v.domain_name = ?
+                           ORDER BY v.version DESC LIMIT ?
+                           ''', (domain_name, limit))
+
+            history = []
+            for row in cursor.fetchall():
+                history.append({
+                    'timestamp': row[0],
+                    'record_count': row[1],
+                    'version': row[2],
+                    'content_hash': row[3],
+                    'checked_at': row[4]
+                })
+
+            return history
+
+    def get_domains_with_fresh_dns_records(self, domain_names: List[str], max_age_seconds: int) -> set:
+        """
+        Find which of the given domains have current DNS records stored recently enough
 
-            # STEP 1: Remove any existing parking page records for this name
-            # This includes CNAME records pointing to parking services like parkingpage.namecheap.com
-            parking_indicators = [
-                'parkingpage.namecheap.com', 'parking', 'namecheap'
-            ]
+        Args:
+            domain_names: Domains to look up
+            max_age_seconds: Maximum age of the stored records
+
+        Returns:
+            set: Domain names whose current records were stored or confirmed within max_age_seconds
+        """
+        fresh = set()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT domain_name
+                               FROM dns_snapshot_versions
+                               WHERE domain_name IN ({placeholders})
+                               GROUP BY domain_name
+                               HAVING MAX(checked_at) >= datetime('now', ?)
+                               ''', (*chunk, f'-{int(max_age_seconds)} seconds'))
+                fresh.update(row[0] for row in cursor.fetchall())
+
+        return fresh
+
+    def get_current_dns_snapshots(self, domain_names: List[str]) -> Dict[str, Dict]:
+        """
+        Get the current DNS records of many domains at once
 
-            # Delete any records for this name that might be parking pages
+        Args:
+            domain_names: Domains to look up
+
+        Returns:
+            Dict[str, Dict]: Domain name -> {'records': records in Namecheap API format,
+            'stored_at': when the records were last stored or confirmed by a sync,
+            'version': snapshot version}. Domains without stored records are not included.
+        """
+        snapshots = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT v.domain_name, s.records, v.checked_at, v.version
+                               FROM dns_snapshot_versions v
+                                        JOIN dns_snapshots s ON s.content_hash = v.content_hash
+                               WHERE v.domain_name IN ({placeholders})
+                                 AND v.version = (SELECT MAX(version)
+                                                  FROM dns_snapshot_versions
+                                                  WHERE domain_name = v.domain_name)
+                               ''', chunk)
+
+                for domain_name, records, checked_at, version in cursor.fetchall():
+                    snapshots[domain_name] = {
+                        'records': json.loads(records),
+                        'stored_at': checked_at,
+                        'version': version
+                    }
+
+        return snapshots
+
+    # DNS History Retention Methods
+    def delete_expired_dns_versions(self, keep_versions: int, keep_days: int, limit: int = 500) -> int:
+        """
+        Delete snapshot versions outside the retention policy, at most limit per call
+
+        A version is kept while it is one of the domain's keep_versions newest, or
+        was current within the last keep_days. The current version is always kept.
+
+        Returns:
+            int: Number of versions deleted
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
                            DELETE
-                           FROM dns_records
-                           WHERE domain_name = ?
-                             AND record_name = ?
-                             AND is_current = TRUE
-                             AND (record_type IN ('CNAME', 'A') OR record_address LIKE '%parking%' OR record_address LIKE '%parkingpage.namecheap.com%')
-                           ''', (domain_name, redirect_name))
+                           FROM dns_snapshot_versions
+                           WHERE id IN (SELECT v.id
+                                        FROM dns_snapshot_versions v
+                                        WHERE v.checked_at < datetime('now', ?)
+                                          AND v.version <= (SELECT MAX(version)
+                                                            FROM dns_snapshot_versions
+                                                            WHERE domain_name = v.domain_name) - ?
+                                        LIMIT ?)
+                           ''', (f'-{int(keep_days)} days', max(1, keep_versions), limit))
+            return cursor.rowcount
+
+    def delete_orphaned_dns_snapshots(self, limit: int = 500) -> int:
+        """
+        Delete stored record sets no snapshot version points at anymore, at most limit per call
+
+        Returns:
+            int: Number of snapshots deleted
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           DELETE
+                           FROM dns_snapshots
+                           WHERE content_hash IN (SELECT s.content_hash
+                                                  FROM dns_snapshots s
+                                                  WHERE NOT EXISTS (SELECT 1
+                                                                    FROM dns_snapshot_versions v
+                                                                    WHERE v.content_hash = s.content_hash)
+                                                  LIMIT ?)
+                           ''', (limit,))
+            return cursor.rowcount
+
+    def get_database_size(self) -> Dict[str, int]:
+        """Size of the database in bytes, and how much of it is free pages"""
+        conn = self.get_connection()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return {'bytes': page_count * page_size, 'free_bytes': freelist_count * page_size}
+
+    def compact_database(self) -> Dict:
+        """
+        Return free pages to the file system after deletions
 
-            removed_count = cursor.rowcount
-            if removed_count > 0:
-                print(f"🗑️  Removed {removed_count} parking page record(s) for {redirect_name}")
+        Runs PRAGMA optimize, then an incremental vacuum. A database created before
+        auto_vacuum was enabled is converted once with a full VACUUM, when the disk
+        has room for the temporary copy. The WAL file is truncated afterwards.
 
-            # STEP 2: Update existing URL redirect record if it exists
+        Returns:
+            Dict: bytes_before, bytes_after, reclaimed_bytes and vacuum ('incremental',
+            'full' or 'skipped')
+        """
+        bytes_before = self.get_database_size()['bytes']
+        conn = self.get_connection()
+        conn.execute('PRAGMA optimize')
+
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            conn.execute('PRAGMA incremental_vacuum').fetchall()
+            vacuum = 'incremental'
+        elif shutil.disk_usage(os.path.dirname(os.path.abspath(self.db_path))).free > 2 * bytes_before:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            vacuum = 'full'
+        else:
+            print("⚠️ Not enough free disk space to convert the database to incremental vacuum")
+            vacuum = 'skipped'
+
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        bytes_after = self.get_database_size()['bytes']
+        return {
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'reclaimed_bytes': max(0, bytes_before - bytes_after),
+            'vacuum': vacuum
+        }
+
+    # Background Job Queue Methods
+    _JOB_COLUMNS = '''id, job_type, progress_key, args, status, progress, progress_version,
+                      stop_requested, worker_id, created_at, started_at, finished_at, heartbeat_at'''
+
+    def _job_from_row(self, row) -> Dict:
+        """Convert a jobs row into a dict with decoded args and progress"""
+        return {
+            'id': row[0],
+            'job_type': row[1],
+            'progress_key': row[2],
+            'args': json.loads(row[3]) if row[3] else [],
+            'status': row[4],
+            'progress': json.loads(row[5]) if row[5] else None,
+            'progress_version': row[6],
+            'stop_requested': bool(row[7]),
+            'worker_id': row[8],
+            'created_at': row[9],
+            'started_at': row[10],
+            'finished_at': row[11],
+            'heartbeat_at': row[12]
+        }
+
+    def enqueue_job(self, job_type: str, progress_key: str, args: List, progress: Dict) -> int:
+        """Queue a background job and return its id"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
             cursor.execute('''
-                           UPDATE dns_records
-                           SET record_address   = ?,
-                               backup_timestamp = CURRENT_TIMESTAMP
-                           WHERE domain_name = ?
-                             AND record_name = ?
-                             AND record_type = 'URL'
-                             AND is_current = TRUE
-                           ''', (new_target, domain_name, redirect_name))
+                           INSERT INTO jobs (job_type, progress_key, args, progress)
+                           VALUES (?, ?, ?, ?)
+                           ''', (job_type, progress_key, json.dumps(args), json.dumps(progress, default=str)))
+            return cursor.lastrowid
+
+    def claim_job(self, worker_id: str, job_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        Atomically claim a queued job for a worker
+
+        Args:
+            worker_id: Identifier of the claiming worker process
+            job_id: Claim this specific job instead of the oldest queued one
+
+        Returns:
+            Dict: The claimed job, or None if nothing was claimed
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if job_id is None:
+                cursor.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+                result = cursor.fetchone()
+                if not result:
+                    return None
+                job_id = result[0]
 
-            # STEP 3: If no URL redirect was updated, insert new redirect
+            cursor.execute('''
+                           UPDATE jobs
+                           SET status       = 'running',
+                               worker_id    = ?,
+                               started_at   = CURRENT_TIMESTAMP,
+                               heartbeat_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                             AND status = 'queued'
+                           ''', (worker_id, job_id))
             if cursor.rowcount == 0:
+                return None
+
+            cursor.execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+            return self._job_from_row(cursor.fetchone())
+
+    def update_job_progress(self, job_id: int, progress: Optional[Dict] = None) -> bool:
+        """Store a job's progress snapshot (if given), refresh its heartbeat and return its stop flag"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if progress is not None:
                 cursor.execute('''
-                               INSERT INTO dns_records
-                                   (domain_name, record_name, record_type, record_address, ttl, is_url_redirect, is_current)
-                               VALUES (?, ?, 'URL', ?, '300', TRUE, TRUE)
-                               ''', (domain_name, redirect_name, new_target))
-                print(f"➕ Added new URL redirect: {redirect_name} -> {new_target}")
+                               UPDATE jobs
+                               SET progress         = ?,
+                                   progress_version = progress_version + 1,
+                                   heartbeat_at     = CURRENT_TIMESTAMP
+                               WHERE id = ?
+                               ''', (json.dumps(progress, default=str), job_id))
             else:
-                print(f"✏️  Updated URL redirect: {redirect_name} -> {new_target}")
+                cursor.execute('UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ?', (job_id,))
 
-            conn.commit()
+            cursor.execute('SELECT stop_requested FROM jobs WHERE id = ?', (job_id,))
+            result = cursor.fetchone()
+            return bool(result[0]) if result else False
 
-        # Return complete updated record set
-        return self.get_current_dns_records(domain_name)
+    def finish_job(self, job_id: int, status: str, progress: Dict):
+        """Mark a job as finished with its final status and progress"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           UPDATE jobs
+                           SET status           = ?,
+                               progress         = ?,
+                               progress_version = progress_version + 1,
+                               finished_at      = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           ''', (status, json.dumps(progress, default=str), job_id))
+
+    def request_job_stop(self, job_id: int):
+        """Ask the worker running a job to stop it"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE jobs SET stop_requested = TRUE WHERE id = ?', (job_id,))
 
-    def get_dns_backup_history(self, domain_name: str, limit: int = 10) -> List[Dict]:
+    def request_job_resume(self, job_id: int):
+        """Ask the worker running a job to end its rate limit pause"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE jobs SET resume_requested = TRUE WHERE id = ?', (job_id,))
+
+    def take_job_resume_request(self, job_id: int) -> bool:
+        """Clear a job's resume flag, returns whether it was set"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE jobs SET resume_requested = FALSE WHERE id = ? AND resume_requested', (job_id,))
+            return cursor.rowcount > 0
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        """Get a job by id"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self._JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,))
+            result = cursor.fetchone()
+            return self._job_from_row(result) if result else None
+
+    def get_latest_job(self, progress_key: str) -> Optional[Dict]:
+        """Get the most recent job that reports into the given progress key"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                           SELECT {self._JOB_COLUMNS}
+                           FROM jobs
+                           WHERE progress_key = ?
+                           ORDER BY id DESC LIMIT 1
+                           ''', (progress_key,))
+            result = cursor.fetchone()
+            return self._job_from_row(result) if result else None
+
+    def get_latest_job_version(self, progress_key: str) -> Optional[tuple]:
+        """Id, status and progress_version of the most recent job of a progress key, without decoding its progress"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT id, status, progress_version
+                           FROM jobs
+                           WHERE progress_key = ?
+                           ORDER BY id DESC LIMIT 1
+                           ''', (progress_key,))
+            return cursor.fetchone()
+
+    def has_unfinished_job(self, progress_key: str, heartbeat_timeout: int) -> bool:
+        """Whether a job of the given progress key is queued, or running with a live worker heartbeat"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT 1
+                           FROM jobs
+                           WHERE progress_key = ?
+                             AND (status = 'queued'
+                               OR (status = 'running' AND heartbeat_at >= datetime('now', ?)))
+                           LIMIT 1
+                           ''', (progress_key, f'-{int(heartbeat_timeout)} seconds'))
+            return cursor.fetchone() is not None
+
+    def get_stale_running_jobs(self, heartbeat_timeout: int) -> List[Dict]:
+        """Get running jobs whose worker has not sent a heartbeat within the timeout (seconds)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                           SELECT {self._JOB_COLUMNS}
+                           FROM jobs
+                           WHERE status = 'running'
+                             AND heartbeat_at < datetime('now', ?)
+                           ''', (f'-{int(heartbeat_timeout)} seconds',))
+            return [self._job_from_row(row) for row in cursor.fetchall()]
+
+    # Scheduler Methods
+    def claim_scheduled_run(self, name: str, slot: str) -> bool:
+        """Record that a schedule fired for a slot, returns False if it was already recorded"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT OR IGNORE INTO scheduled_runs (name, slot) VALUES (?, ?)', (name, slot))
+            return cursor.rowcount == 1
+
+    def set_scheduled_run_job(self, name: str, slot: str, job_id: int):
+        """Attach the queued job to a scheduled run"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE scheduled_runs SET job_id = ? WHERE name = ? AND slot = ?', (job_id, name, slot))
+
+    def get_last_scheduled_run(self, name: str) -> Optional[Dict]:
+        """Get the latest run of a schedule with the status of its job"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT s.slot, s.job_id, j.status
+                           FROM scheduled_runs s
+                           LEFT JOIN jobs j ON j.id = s.job_id
+                           WHERE s.name = ?
+                           ORDER BY s.slot DESC LIMIT 1
+                           ''', (name,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'slot': row[0], 'job_id': row[1], 'job_status': row[2]}
+
+    def get_account_domain_names(self) -> List[str]:
+        """Get names of all domains still in the Namecheap account"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT domain_name
+                           FROM domains
+                           WHERE in_account IS NULL OR in_account = TRUE
+                           ORDER BY domain_number
+                           ''')
+            return [row[0] for row in cursor.fetchall()]
+
+    # Namecheap Account Methods
+    _ACCOUNT_COLUMNS = '''id, name, api_user, api_key, username, client_ip,
+                          requests_per_minute, requests_per_hour, requests_per_day, created_at'''
+
+    def _account_from_row(self, row) -> Dict:
+        return {
+            'id': row[0],
+            'name': row[1],
+            'api_user': row[2],
+            'api_key': row[3],
+            'username': row[4],
+            'client_ip': row[5],
+            'requests_per_minute': row[6],
+            'requests_per_hour': row[7],
+            'requests_per_day': row[8],
+            'created_at': row[9]
+        }
+
+    def add_account(self, name: str, api_user: str, api_key: str, username: str = None, client_ip: str = None,
+                    requests_per_minute: int = 20, requests_per_hour: int = 700, requests_per_day: int = 8000) -> int:
         """
-        Get DNS backup history for a domain
+        Add a Namecheap account with its own credentials and quota
 
-        Args:
-            domain_name: The domain to get history for
-            limit: Maximum number of backups to return
+        Returns:
+            int: The account id
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO accounts (name, api_user, api_key, username, client_ip,
+                                                 requests_per_minute, requests_per_hour, requests_per_day)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                           ''', (name, api_user, api_key, username, client_ip,
+                                 requests_per_minute, requests_per_hour, requests_per_day))
+            return cursor.lastrowid
+
+    def get_accounts(self) -> List[Dict]:
+        """Get all additional Namecheap accounts, including credentials"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self._ACCOUNT_COLUMNS} FROM accounts ORDER BY id')
+            return [self._account_from_row(row) for row in cursor.fetchall()]
+
+    def get_account(self, account_id: int) -> Optional[Dict]:
+        """Get one Namecheap account, including credentials"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT {self._ACCOUNT_COLUMNS} FROM accounts WHERE id = ?', (account_id,))
+            row = cursor.fetchone()
+            return self._account_from_row(row) if row else None
+
+    def get_account_domain_counts(self) -> Dict[Optional[int], int]:
+        """Number of domains in each account (None for the environment account)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT account_id, COUNT(*)
+                           FROM domains
+                           WHERE in_account IS NULL OR in_account = TRUE
+                           GROUP BY account_id
+                           ''')
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def assign_domains_to_account(self, domain_names: List[str], account_id: Optional[int]):
+        """Tag domains with the account they are managed through (None for the environment account)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('UPDATE domains SET account_id = ? WHERE domain_name = ?',
+                               [(account_id, domain_name) for domain_name in domain_names])
+
+    def get_domain_accounts(self, domain_names: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Look up the account of many domains at once
 
         Returns:
-            List[Dict]: DNS backup history
+            Dict[str, Optional[int]]: Domain name -> account id. Unknown domains and
+            domains of the environment account map to None.
         """
+        accounts = {domain_name: None for domain_name in domain_names}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT domain_name, account_id
+                               FROM domains
+                               WHERE domain_name IN ({placeholders})
+                                 AND account_id IS NOT NULL
+                               ''', chunk)
+                accounts.update({row[0]: row[1] for row in cursor.fetchall()})
+
+        return accounts
+
+    # Operation Ledger Methods
+    def record_operation(self, job_id: Optional[int], domain_name: str, operation: str, payload_hash: str,
+                         outcome: str, api_calls: int):
+        """Append one per-domain operation to the ledger"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                           SELECT DISTINCT backup_timestamp, COUNT(*) as record_count
-                           FROM dns_records
-                           WHERE domain_name = ?
-                           GROUP BY backup_timestamp
-                           ORDER BY backup_timestamp DESC LIMIT ?
-                           ''', (domain_name, limit))
+                           INSERT INTO operation_ledger (job_id, domain_name, operation, payload_hash, outcome, api_calls)
+                           VALUES (?, ?, ?, ?, ?, ?)
+                           ''', (job_id, domain_name, operation, payload_hash, outcome, api_calls))
 
-            history = []
+    def get_completed_operations(self, operation: str, payload_hashes: Dict[str, str],
+                                 max_age_seconds: int) -> Dict[str, int]:
+        """
+        Find domains where the same operation with the same payload already succeeded
+
+        Args:
+            operation: Operation name
+            payload_hashes: Domain name -> payload hash the job is about to apply
+            max_age_seconds: Ignore ledger entries older than this
+
+        Returns:
+            Dict[str, int]: Domain name -> id of the job that applied the payload
+        """
+        completed = {}
+        domain_names = list(payload_hashes)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Stay below SQLite's bound parameter limit
+            for start in range(0, len(domain_names), 500):
+                chunk = domain_names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                               SELECT domain_name, payload_hash, job_id
+                               FROM operation_ledger
+                               WHERE operation = ?
+                                 AND outcome = 'successful'
+                                 AND domain_name IN ({placeholders})
+                                 AND created_at >= datetime('now', ?)
+                               ORDER BY id
+                               ''', (operation, *chunk, f'-{int(max_age_seconds)} seconds'))
+                for domain_name, entry_hash, job_id in cursor.fetchall():
+                    if entry_hash == payload_hashes[domain_name]:
+                        completed[domain_name] = job_id
+
+        return completed
+
+    def get_job_operations(self, job_id: int) -> Dict:
+        """
+        Get a job's ledger entries with totals per outcome
+
+        Returns:
+            Dict with 'operations' (oldest first), 'outcomes' (count per outcome) and 'api_calls'
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT domain_name, operation, payload_hash, outcome, api_calls, created_at
+                           FROM operation_ledger
+                           WHERE job_id = ?
+                           ORDER BY id
+                           ''', (job_id,))
+
+            operations = []
+            outcomes = {}
+            api_calls = 0
             for row in cursor.fetchall():
-                history.append({
-                    'timestamp': row[0],
-                    'record_count': row[1]
+                operations.append({
+                    'domain_name': row[0],
+                    'operation': row[1],
+                    'payload_hash': row[2],
+                    'outcome': row[3],
+                    'api_calls': row[4],
+                    'created_at': row[5]
                 })
+                outcomes[row[3]] = outcomes.get(row[3], 0) + 1
+                api_calls += row[4] or 0
+
+            return {'operations': operations, 'outcomes': outcomes, 'api_calls': api_calls}
+
+    # API Request Log Methods
+    def record_api_request(self, account_id: Optional[int] = None):
+        """Log a Namecheap API request of an account (None for the environment account), dropping entries older than a day"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO api_requests (account_id, requested_at) VALUES (?, ?)', (account_id, now))
+            cursor.execute('DELETE FROM api_requests WHERE account_id IS ? AND requested_at <= ?',
+                           (account_id, now - 86400))
+
+    def get_api_request_counts(self, account_id: Optional[int] = None) -> tuple:
+        """Requests of an account in the last minute, hour and day, made by any process"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT COALESCE(SUM(requested_at > ?), 0),
+                                  COALESCE(SUM(requested_at > ?), 0),
+                                  COUNT(*)
+                           FROM api_requests
+                           WHERE account_id IS ?
+                             AND requested_at > ?
+                           ''', (now - 60, now - 3600, account_id, now - 86400))
+            return tuple(cursor.fetchone())
+
+    # Idempotency Key Methods
+    def claim_idempotency_key(self, endpoint: str, key: str, request_hash: str,
+                              window_seconds: int) -> Optional[Dict]:
+        """
+        Claim an idempotency key for a request, atomically across processes
+
+        Args:
+            endpoint: Endpoint the key is scoped to
+            key: Client-supplied idempotency key
+            request_hash: Hash of the request body
+            window_seconds: Keys older than this are forgotten and can be claimed again
+
+        Returns:
+            Optional[Dict]: None when the key was claimed for this request, otherwise the
+            earlier request ('request_hash', 'status_code', 'response' - response is None
+            while that request is still being handled)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           DELETE
+                           FROM idempotency_keys
+                           WHERE endpoint = ?
+                             AND idempotency_key = ?
+                             AND created_at < datetime('now', ?)
+                           ''', (endpoint, key, f'-{int(window_seconds)} seconds'))
+            cursor.execute('''
+                           INSERT OR IGNORE INTO idempotency_keys (endpoint, idempotency_key, request_hash)
+                           VALUES (?, ?, ?)
+                           ''', (endpoint, key, request_hash))
+            if cursor.rowcount == 1:
+                return None
 
-            return history
\ No newline at end of file
+            cursor.execute('''
+                           SELECT request_hash, status_code, response
+                           FROM idempotency_keys
+                           WHERE endpoint = ?
+                             AND idempotency_key = ?
+                           ''', (endpoint, key))
+            row = cursor.fetchone()
+            return {'request_hash': row[0], 'status_code': row[1], 'response': row[2]}
+
+    def store_idempotent_response(self, endpoint: str, key: str, status_code: int, response: str):
+        """Store the response of the request that claimed an idempotency key"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           UPDATE idempotency_keys
+                           SET status_code = ?,
+                               response    = ?
+                           WHERE endpoint = ?
+                             AND idempotency_key = ?
+                           ''', (status_code, response, endpoint, key))
+
+    def release_idempotency_key(self, endpoint: str, key: str):
+        """Forget a claimed idempotency key, so a retry of a failed request runs again"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM idempotency_keys WHERE endpoint = ? AND idempotency_key = ?',
+                           (endpoint, key))
@@ -17,11 +17,26 @@ class NamecheapAPIError(Exception):
     """Custom exception for Namecheap API errors"""
     pass
 
+# Store of request timestamps shared by all processes, set with share_request_counts
+request_log = None
+
+def share_request_counts(log):
+    """
+    Count requests of every process for budgets and status, not only those of this one
+
+    Args:
+        log: Object with record_api_request(account_id) and
+            get_api_request_counts(account_id) -> (minute, hour, day)
+    """
+    global request_log
+    request_log = log
+
 class RateLimitState:
     """Thread-safe rate limiting state tracker"""
 
-    def __init__(self):
+    def __init__(self, account_id: Optional[int] = None):
         self.lock = threading.Lock()
+        self.account_id = account_id
         self.request_timestamps = []
         self.is_paused = False
         self.pause_until = None
@@ -39,6 +54,12 @@ class RateLimitState:
             one_day_ago = now - 86400
             self.request_timestamps = [ts for ts in self.request_timestamps if ts > one_day_ago]
 
+        if request_log is not None:
+            try:
+                request_log.record_api_request(self.account_id)
+            except Exception as e:
+                print(f"⚠️ Could not log API request: {e}")
+
     def _get_counts_unlocked(self):
         """Get request counts (must be called with lock held)"""
         now = time.time()
@@ -52,10 +73,19 @@ class RateLimitState:
 
         return minute_count, hour_count, day_count
 
+    def _get_shared_counts_unlocked(self):
+        """Request counts of all processes when they are shared, else of this one (must be called with lock held)"""
+        if request_log is not None:
+            try:
+                return request_log.get_api_request_counts(self.account_id)
+            except Exception as e:
+                print(f"⚠️ Could not read shared API request counts: {e}")
+        return self._get_counts_unlocked()
+
     def get_counts(self):
         """Get request counts for last minute, hour, and day"""
         with self.lock:
-            return self._get_counts_unlocked()
+            return self._get_shared_counts_unlocked()
 
     def should_wait(self):
         """Check if we should wait before making a request, returns wait time in seconds"""
@@ -80,6 +110,15 @@ class RateLimitState:
 
             return 0
 
+    def get_budget(self, headroom=0.3):
+        """Requests background work may still make this hour and day, keeping a headroom share of each window free"""
+        with self.lock:
+            minute_count, hour_count, day_count = self._get_shared_counts_unlocked()
+            return {
+                "hour": max(0, int(self.requests_per_hour * (1 - headroom)) - hour_count),
+                "day": max(0, int(self.requests_per_day * (1 - headroom)) - day_count)
+            }
+
     def set_paused(self, duration_seconds=900, reason="Rate limit exceeded"):
         """Pause requests for specified duration (default 15 minutes)"""
         with self.lock:
@@ -97,7 +136,7 @@ class RateLimitState:
     def get_status(self):
         """Get current rate limit status"""
         with self.lock:
-            minute_count, hour_count, day_count = self._get_counts_unlocked()
+            minute_count, hour_count, day_count = self._get_shared_counts_unlocked()
             return {
                 "is_paused": self.is_paused,
                 "pause_until": self.pause_until,
@@ -115,19 +154,58 @@ class RateLimitState:
 
 rate_limit_state = RateLimitState()
 
+# API calls made by the current thread, so jobs can attribute quota use to a domain
+api_call_counter = threading.local()
+
+def get_thread_api_calls() -> int:
+    """Number of API requests made so far by the calling thread"""
+    return getattr(api_call_counter, 'count', 0)
+
+# One rate limiter per additional Namecheap account, keyed by account id
+account_rate_limits = {}
+account_rate_limits_lock = threading.Lock()
+
+def get_account_rate_limit(account: Dict) -> RateLimitState:
+    """Get the rate limiter of an account, applying its configured quota"""
+    with account_rate_limits_lock:
+        state = account_rate_limits.get(account['id'])
+        if state is None:
+            state = account_rate_limits[account['id']] = RateLimitState(account['id'])
+    state.requests_per_minute = account.get('requests_per_minute') or state.requests_per_minute
+    state.requests_per_hour = account.get('requests_per_hour') or state.requests_per_hour
+    state.requests_per_day = account.get('requests_per_day') or state.requests_per_day
+    return state
+
 class NamecheapAPIClient:
     """Client for Namecheap API operations"""
 
-    def __init__(self):
-        """Initialize Namecheap API client"""
+    def __init__(self, account: Optional[Dict] = None):
+        """
+        Initialize Namecheap API client
+
+        Args:
+            account: Account row from the accounts table, or None for the credentials
+                in the NAMECHEAP_* environment variables
+        """
         self.base_url = "https://api.namecheap.com/xml.response"
-        self.rate_limit = rate_limit_state
-        self.api_user = os.environ.get('NAMECHEAP_API_USER')
-        self.api_key = os.environ.get('NAMECHEAP_API_KEY')
-        self.username = os.environ.get('NAMECHEAP_USERNAME', self.api_user)
-        
-        # Auto-detect our outbound IP with fallback to configured one
-        self.client_ip = self._detect_outbound_ip()
+        # Database written record sets are stored in, created on first use unless set by the app
+        self.hosts_db = None
+        self.account_id = account['id'] if account else None
+
+        if account:
+            self.rate_limit = get_account_rate_limit(account)
+            self.api_user = account['api_user']
+            self.api_key = account['api_key']
+            self.username = account.get('username') or self.api_user
+            self.client_ip = account.get('client_ip') or self._detect_outbound_ip()
+        else:
+            self.rate_limit = rate_limit_state
+            self.api_user = os.environ.get('NAMECHEAP_API_USER')
+            self.api_key = os.environ.get('NAMECHEAP_API_KEY')
+            self.username = os.environ.get('NAMECHEAP_USERNAME', self.api_user)
+
+            # Auto-detect our outbound IP with fallback to configured one
+            self.client_ip = self._detect_outbound_ip()
 
         print(f"Namecheap API Client initialized:")
         print(f"  API User: {self.api_user}")
@@ -175,6 +253,7 @@ class NamecheapAPIClient:
             time.sleep(wait_time)
 
         self.rate_limit.record_request()
+        api_call_counter.count = get_thread_api_calls() + 1
 
         # Base parameters for all requests
         base_params = {
@@ -376,6 +455,7 @@ class NamecheapAPIClient:
             paging_info = domain_result.get('Paging', {})
             if isinstance(paging_info, dict):
                 total_items = paging_info.get('TotalItems', 0)
+                self.last_domain_list_total = int(total_items or 0)
                 current_page = paging_info.get('CurrentPage', page)
                 page_size_actual = paging_info.get('PageSize', page_size)
                 print(f"📄 Page {current_page}: {total_items} total domains, {page_size_actual} per page")
@@ -404,7 +484,10 @@ class NamecheapAPIClient:
                         'user': domain.get('User', ''),
                         'created': domain.get('Created', ''),
                         'expires': domain.get('Expires', ''),
-                        'auto_renew': domain.get('AutoRenew', False)
+                        'auto_renew': str(domain.get('AutoRenew', '')).lower() == 'true',
+                        'is_expired': str(domain.get('IsExpired', '')).lower() == 'true',
+                        'is_locked': str(domain.get('IsLocked', '')).lower() == 'true',
+                        'is_our_dns': str(domain.get('IsOurDNS', '')).lower() == 'true'
                     })
             
             print(f"Retrieved {len(domains)} domains from page {page}")
@@ -418,6 +501,7 @@ class NamecheapAPIClient:
         """Get ALL domains by fetching all pages"""
         import time
 
+        self.last_domain_list_total = None
         all_domains = []
         page = 1
         page_size = 100  # Request 100 per page, but Namecheap might limit to 20
@@ -715,9 +799,7 @@ class NamecheapAPIClient:
         try:
             print(f"🔄 SAFE redirect update for {domain}: {name} -> {target}")
 
-            # Import database here to avoid circular imports
-            from models import Database
-            db = Database()
+            db = self._get_hosts_db()
 
             # STEP 1: Get current DNS records and backup
             print(f"📋 Step 1: Backing up current DNS records...")
@@ -778,74 +860,25 @@ class NamecheapAPIClient:
             # STEP 3: Send complete record set to Namecheap
             print(f"🚀 Step 3: Sending complete DNS records to Namecheap...")
 
-            # Split domain for Namecheap API
-            domain_parts = domain.split('.')
-            if len(domain_parts) < 2:
-                print(f"❌ Invalid domain format: {domain}")
-                return False
-
-            sld = domain_parts[0]
-            tld = '.'.join(domain_parts[1:])
-
-            # Handle common multi-part TLDs
-            common_tlds = ['co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au']
-            for common_tld in common_tlds:
-                if domain.endswith('.' + common_tld):
-                    sld = domain.replace('.' + common_tld, '')
-                    tld = common_tld
-                    break
+            # Send the record set - it is also stored as the current snapshot
+            self.set_hosts(domain, complete_records)
 
-            # Build setHosts parameters with ALL records
-            params = {'SLD': sld, 'TLD': tld}
-
-            for i, record in enumerate(complete_records, 1):
-                params[f'HostName{i}'] = record['Name']
-                params[f'RecordType{i}'] = record['Type']
-                params[f'Address{i}'] = record['Address']
-                params[f'TTL{i}'] = record['TTL']
-                if record.get('MXPref'):
-                    params[f'MXPref{i}'] = record['MXPref']
-
-            # Make API call with complete record set
-            response = self._make_request('namecheap.domains.dns.setHosts', **params)
-
-            # STEP 4: Verify response
-            command_response = None
-            for key, value in response.items():
-                if 'CommandResponse' in key:
-                    command_response = value
-                    break
+            # STEP 4: Namecheap accepted the record set
+            print(f"✅ Successfully updated redirect for {domain}")
+            print(f"✅ All {len(complete_records)} DNS records sent successfully")
 
-            if command_response:
-                hosts_result = None
-                for key, value in command_response.items():
-                    if 'DomainDNSSetHostsResult' in key:
-                        hosts_result = value
-                        break
-
-                if hosts_result and hosts_result.get('IsSuccess') == 'true':
-                    print(f"✅ Successfully updated redirect for {domain}")
-                    print(f"✅ All {len(complete_records)} DNS records sent successfully")
-
-                    # STEP 5: Verify DNS records are actually set correctly
-                    print(f"🔍 Step 5: Verifying DNS records after update...")
-                    import time
-                    time.sleep(3)  # Wait for DNS propagation
-
-                    # Get updated DNS records to verify
-                    updated_hosts = self._get_all_hosts(domain)
-                    if updated_hosts and len(updated_hosts) >= len(complete_records):
-                        print(f"✅ Verification passed: {len(updated_hosts)} records found")
-                        return True
-                    else:
-                        print(f"⚠️ Verification warning: Expected {len(complete_records)}, found {len(updated_hosts) if updated_hosts else 0}")
-                        return True  # Still consider success if API returned success
-                else:
-                    print(f"❌ Namecheap API returned failure: {hosts_result}")
-                    return False
+            # STEP 5: Verify DNS records are actually set correctly
+            print(f"🔍 Step 5: Verifying DNS records after update...")
+            import time
+            time.sleep(3)  # Wait for DNS propagation
 
-            print(f"❌ Unexpected response format from Namecheap")
-            return False
+            # Get updated DNS records to verify
+            updated_hosts = self._get_all_hosts(domain)
+            if updated_hosts and len(updated_hosts) >= len(complete_records):
+                print(f"✅ Verification passed: {len(updated_hosts)} records found")
+            else:
+                print(f"⚠️ Verification warning: Expected {len(complete_records)}, found {len(updated_hosts) if updated_hosts else 0}")
+            return True  # Still consider success if API returned success
 
         except Exception as e:
             print(f"❌ Error in safe redirect update: {e}")
@@ -894,12 +927,22 @@ class NamecheapAPIClient:
 
         return False
 
-    def _get_all_hosts(self, domain: str) -> List[Dict]:
-        """Get all DNS host records for a domain"""
+    def _get_all_hosts(self, domain: str, raise_errors: bool = False) -> List[Dict]:
+        """
+        Get all DNS host records for a domain
+
+        Args:
+            domain: The domain to read
+            raise_errors: Raise when the records could not be fetched instead of returning
+                an empty list, so callers that store the result can tell a failure from a
+                domain without records
+        """
         try:
             # Split domain into SLD and TLD as required by Namecheap API
             domain_parts = domain.split('.')
             if len(domain_parts) < 2:
+                if raise_errors:
+                    raise NamecheapAPIError(f"Invalid domain format: {domain}")
                 print(f"❌ Invalid domain format: {domain}")
                 return []
             
@@ -973,15 +1016,100 @@ class NamecheapAPIClient:
             return normalized_hosts
             
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error getting all hosts for {domain}: {e}")
             return []
 
+    def set_hosts(self, domain: str, records: List[Dict]) -> bool:
+        """
+        Replace all DNS host records of a domain with setHosts
+
+        On success the exact record set sent is stored as the domain's current DNS
+        snapshot, with its redirections and DNS issues, so no re-sync is needed.
+
+        Args:
+            domain: The domain to write
+            records: Complete record set in Namecheap API format (Name/Type/Address/TTL/MXPref)
+
+        Returns:
+            bool: True when Namecheap accepted the record set
+
+        Raises:
+            NamecheapAPIError: If the domain is invalid or Namecheap rejected the record set
+        """
+        # Split domain into SLD and TLD as required by Namecheap API
+        domain_parts = domain.split('.')
+        if len(domain_parts) < 2:
+            raise NamecheapAPIError(f"Invalid domain format: {domain}")
+
+        sld = domain_parts[0]
+        tld = '.'.join(domain_parts[1:])
+
+        # Handle common multi-part TLDs
+        common_tlds = ['co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au']
+        for common_tld in common_tlds:
+            if domain.endswith('.' + common_tld):
+                sld = domain.replace('.' + common_tld, '')
+                tld = common_tld
+                break
+
+        # Build setHosts parameters with ALL records
+        params = {'SLD': sld, 'TLD': tld}
+
+        for i, record in enumerate(records, 1):
+            params[f'HostName{i}'] = record['Name']
+            params[f'RecordType{i}'] = record['Type']
+            params[f'Address{i}'] = record['Address']
+            params[f'TTL{i}'] = record['TTL']
+            if record.get('MXPref'):
+                params[f'MXPref{i}'] = record['MXPref']
+
+        response = self._make_request('namecheap.domains.dns.setHosts', **params)
+
+        # Check response
+        command_response = None
+        for key, value in response.items():
+            if 'CommandResponse' in key:
+                command_response = value
+                break
+
+        if not command_response:
+            raise NamecheapAPIError("Unexpected response format from Namecheap")
+
+        hosts_result = None
+        for key, value in command_response.items():
+            if 'DomainDNSSetHostsResult' in key:
+                hosts_result = value
+                break
+
+        if not hosts_result or hosts_result.get('IsSuccess') != 'true':
+            raise NamecheapAPIError(f"Namecheap API returned failure: {hosts_result}")
+
+        self._store_written_hosts(domain, records)
+        return True
+
+    def _get_hosts_db(self):
+        """Database the client stores written records in, created on first use when not set by the app"""
+        if self.hosts_db is None:
+            # Import database here to avoid circular imports
+            from models import Database
+            self.hosts_db = Database()
+        return self.hosts_db
+
+    def _store_written_hosts(self, domain: str, records: List[Dict]):
+        """Persist a successfully written record set, without failing the write itself"""
+        try:
+            self._get_hosts_db().apply_dns_write(domain, records)
+        except Exception as e:
+            print(f"⚠️ DNS records for {domain} were written but could not be stored locally: {e}")
+
 class EmailRedirectionManager:
     """Manager for bulk email redirection operations"""
     
-    def __init__(self):
-        """Initialize the email redirection manager"""
-        self.api_client = NamecheapAPIClient()
+    def __init__(self, account: Optional[Dict] = None):
+        """Initialize the email redirection manager, for an additional account if given"""
+        self.api_client = NamecheapAPIClient(account)
         self.results = []
         
         # Test connection on initialization
@@ -992,6 +1120,23 @@ class EmailRedirectionManager:
         """Get all domains from Namecheap account"""
         domain_data = self.api_client.get_all_domains_paginated()
         return [domain['name'] for domain in domain_data]
+
+    def get_domain_inventory(self) -> List[Dict]:
+        """
+        Get all domains with the getList metadata (expiry, lock, auto-renew, DNS provider)
+
+        An empty list is only accepted when Namecheap reported TotalItems = 0, so a new
+        or emptied account does not fail every sync.
+
+        Raises:
+            NamecheapAPIError: If Namecheap reported no total or more domains than were
+                fetched, so a failed page is never mistaken for removed domains
+        """
+        domain_data = self.api_client.get_all_domains_paginated() or []
+        expected = getattr(self.api_client, 'last_domain_list_total', None)
+        if expected is None or len(domain_data) < expected:
+            raise NamecheapAPIError(f"Incomplete domain list: got {len(domain_data)} of {expected if expected is not None else 'unknown'} domains")
+        return domain_data
     
     def bulk_set_forwarding(self, domains: List[str], forwarding_rules: List[Dict]) -> Dict:
         """
@@ -0,0 +1,149 @@
+"""
+Periodic scheduler for email redirect tool
+Queues routine refresh jobs (inventory, staleness refresh, DNS compliance) on
+cron-like schedules, sized to what is left of the Namecheap API quota
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Share of the hourly and daily API windows kept free for interactive use
+SCHEDULER_HEADROOM = float(os.environ.get('SCHEDULER_HEADROOM', 0.3))
+
+
+def _cron_field_matches(field: str, value: int) -> bool:
+    """Match one cron field (*, */n, a-b, a-b/n, lists) against a value"""
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/')
+            step = int(step_text)
+
+        if part == '*':
+            if value % step == 0:
+                return True
+            continue
+
+        if '-' in part:
+            start, end = (int(bound) for bound in part.split('-'))
+        else:
+            start = end = int(part)
+        if start <= value <= end and (value - start) % step == 0:
+            return True
+
+    return False
+
+
+def cron_matches(expression: str, moment: datetime) -> bool:
+    """
+    Check a 5-field cron expression (minute hour day-of-month month day-of-week) against a time
+
+    Day of week follows cron: 0 is Sunday.
+    """
+    minute, hour, day, month, weekday = expression.split()
+    return (_cron_field_matches(minute, moment.minute) and
+            _cron_field_matches(hour, moment.hour) and
+            _cron_field_matches(day, moment.day) and
+            _cron_field_matches(month, moment.month) and
+            _cron_field_matches(weekday, (moment.weekday() + 1) % 7))
+
+
+class Scheduler:
+    """Queues planned jobs on their schedule, at most once per slot across all processes"""
+
+    def __init__(self, db, job_runner, rate_limit, headroom: float = SCHEDULER_HEADROOM,
+                 check_interval: float = 20.0):
+        """
+        Args:
+            db: Database holding the jobs and scheduled_runs tables
+            job_runner: JobRunner the planned jobs are submitted to
+            rate_limit: RateLimitState the API budget is read from
+            headroom: Share of each rate limit window left for interactive use
+        """
+        self.db = db
+        self.job_runner = job_runner
+        self.rate_limit = rate_limit
+        self.headroom = headroom
+        self.check_interval = check_interval
+        self.schedules = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name: str, cron: str, plan: Callable[[Dict], Optional[tuple]], progress_key: str):
+        """
+        Add a schedule
+
+        Args:
+            name: Unique schedule name
+            cron: 5-field cron expression, evaluated in server local time
+            plan: Called with the API budget when the schedule fires; returns
+                (job_type, args, progress) to queue, or None to skip this slot
+            progress_key: Progress dict the planned job reports into - the slot is
+                skipped while a job of that family is still queued or running
+        """
+        self.schedules[name] = {"cron": cron, "plan": plan, "progress_key": progress_key}
+
+    def budget(self) -> Dict[str, int]:
+        """API calls background work may still spend this hour and day"""
+        return self.rate_limit.get_budget(self.headroom)
+
+    def start(self):
+        """Run the schedule loop in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"⏰ Scheduler started with {len(self.schedules)} schedules (headroom {int(self.headroom * 100)}%)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_due(datetime.now())
+            except Exception as e:
+                print(f"⚠️ Scheduler error: {e}")
+            self._stop.wait(self.check_interval)
+
+    def run_due(self, moment: datetime):
+        """Queue every schedule that fires at this minute and has not been claimed yet"""
+        slot = moment.strftime('%Y-%m-%dT%H:%M')
+        for name, schedule in self.schedules.items():
+            if not cron_matches(schedule["cron"], moment):
+                continue
+            if not self.db.claim_scheduled_run(name, slot):
+                # Another process (or an earlier check this minute) already handled the slot
+                continue
+
+            latest_job = self.db.get_latest_job(schedule["progress_key"])
+            if latest_job and latest_job['status'] in ('queued', 'running'):
+                print(f"⏰ {name}: skipped, a {schedule['progress_key']} job is still active")
+                continue
+
+            budget = self.budget()
+            planned = schedule["plan"](budget)
+            if not planned:
+                print(f"⏰ {name}: nothing to do (budget: {budget['hour']}/hour, {budget['day']}/day)")
+                continue
+
+            job_type, args, progress = planned
+            job_id = self.job_runner.submit(job_type, args=args, progress=progress)
+            self.db.set_scheduled_run_job(name, slot, job_id)
+            print(f"⏰ {name}: queued job {job_id} ({job_type})")
+
+    def get_status(self) -> Dict:
+        """Schedules with their last run, plus the current background budget"""
+        return {
+            "budget": self.budget(),
+            "headroom": self.headroom,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "schedules": [
+                {"name": name, "cron": schedule["cron"], "last_run": self.db.get_last_scheduled_run(name)}
+                for name, schedule in self.schedules.items()
+            ]
+        }
@@ -0,0 +1,112 @@
+"""
+Group-commit writer for email redirect tool
+Stores the host lists fetched by the sync jobs on a dedicated thread, committing
+many domains per transaction so API waits and disk writes overlap
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# Domains per transaction, and the longest a queued snapshot waits for its batch to fill
+SNAPSHOT_BATCH_SIZE = int(os.environ.get('SNAPSHOT_BATCH_SIZE', 25))
+SNAPSHOT_FLUSH_MS = int(os.environ.get('SNAPSHOT_FLUSH_MS', 500))
+# Fetching threads block once this many snapshots are waiting to be written
+SNAPSHOT_QUEUE_SIZE = int(os.environ.get('SNAPSHOT_QUEUE_SIZE', 200))
+
+
+class SnapshotWriter:
+    """Commits queued domain snapshots in batches of batch_size domains or every flush_ms milliseconds"""
+
+    def __init__(self, db, batch_size: int = SNAPSHOT_BATCH_SIZE, flush_ms: int = SNAPSHOT_FLUSH_MS,
+                 queue_size: int = SNAPSHOT_QUEUE_SIZE):
+        """
+        Args:
+            db: Database the snapshots are applied to with apply_domain_snapshots
+            batch_size: Most domains committed in one transaction
+            flush_ms: Longest a snapshot waits for its batch to fill
+            queue_size: Snapshots queued before submit blocks
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, domain_name: str, dns_records: List[Dict],
+               on_error: Optional[Callable[[str, Exception], None]] = None):
+        """
+        Queue a domain's host list for apply_domain_snapshot, blocking while the queue is full
+
+        Args:
+            on_error: Called on the writer thread with the domain name and the exception
+                if the snapshot could not be stored
+        """
+        self._ensure_started()
+        self._queue.put((domain_name, dns_records, on_error))
+
+    def flush(self):
+        """Block until every snapshot queued so far is committed"""
+        if not (self._thread and self._thread.is_alive()):
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            flushes = []
+            deadline = time.monotonic() + self.flush_interval
+
+            # Collect until the batch is full, the interval has passed or a flush is requested
+            while True:
+                if isinstance(item, threading.Event):
+                    flushes.append(item)
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for done in flushes:
+                done.set()
+
+    def _write(self, batch: List[tuple]):
+        if not batch:
+            return
+
+        try:
+            self.db.apply_domain_snapshots([(domain_name, dns_records) for domain_name, dns_records, _ in batch])
+            return
+        except Exception as e:
+            print(f"⚠️ Storing {len(batch)} DNS snapshots failed, retrying one domain at a time: {e}")
+
+        # Isolate the failing domain so the rest of the batch is still stored
+        for domain_name, dns_records, on_error in batch:
+            try:
+                self.db.apply_domain_snapshot(domain_name, dns_records)
+            except Exception as e:
+                print(f"❌ Could not store DNS records for {domain_name}: {e}")
+                if on_error:
+                    try:
+                        on_error(domain_name, e)
+                    except Exception as callback_error:
+                        print(f"⚠️ Snapshot error handler failed for {domain_name}: {callback_error}")
@@ -2,6 +2,7 @@
 
 # Startup script for the application with database backup
 echo "🚀 Starting Email Redirect Tool..."
+APP_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 # Ensure data directory exists
 if [ ! -d "/opt/render/project/data" ]; then
@@ -14,10 +15,9 @@ if [ -f "/opt/render/project/data/redirect_tool.db" ]; then
     echo "✅ Database found at: /opt/render/project/data/redirect_tool.db"
     echo "📊 Database size: $(du -h /opt/render/project/data/redirect_tool.db | cut -f1)"
 
-    # Create a backup of the database before starting
-    BACKUP_NAME="/opt/render/project/data/redirect_tool_backup_$(date +%Y%m%d_%H%M%S).db"
-    cp /opt/render/project/data/redirect_tool.db "$BACKUP_NAME"
-    echo "💾 Created database backup: $BACKUP_NAME"
+    # Create a backup of the database before starting - the database runs in WAL mode,
+    # so copy it with sqlite's backup API rather than cp to include the -wal contents
+    python "$APP_DIR/db_utils.py" backup /opt/render/project/data/redirect_tool.db /opt/render/project/data
 
     # Keep only the 3 most recent backups to save space
     cd /opt/render/project/data
@@ -30,5 +30,14 @@ fi
 # Set environment variable to ensure app uses persistent path
 export DATABASE_PATH=/opt/render/project/data/redirect_tool.db
 
+# Background jobs are queued by the web workers and executed by the job worker
+export JOB_RUNNER=external
+export WORKER_CONCURRENCY=${WORKER_CONCURRENCY:-2}
+
+echo "👷 Starting job worker (concurrency: $WORKER_CONCURRENCY)..."
+cd "$APP_DIR"
+(while true; do python -m worker; echo "⚠️ Job worker exited, restarting in 5s..."; sleep 5; done) &
+
 echo "🌐 Starting Gunicorn server..."
-exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --timeout 600 --graceful-timeout 600 app:app
\ No newline at end of file
+# Threaded workers so open progress streams do not block other requests
+exec gunicorn --bind 0.0.0.0:$PORT --workers 2 --worker-class gthread --threads ${GUNICORN_THREADS:-8} --timeout 600 --graceful-timeout 600 app:app
\ No newline at end of file
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Standalone job worker for email redirect tool
+Runs queued sync and bulk DNS jobs outside the gunicorn web workers
+
+Usage: JOB_RUNNER=external python -m worker
+"""
+
+import os
+
+# Jobs queued by the web app are executed here, never inline in this process
+os.environ['JOB_RUNNER'] = 'external'
+
+import app as web
+
+
+def main():
+    if web.SCHEDULER_ENABLED:
+        # The worker owns the API quota, so it also queues the periodic refresh jobs
+        web.scheduler.start()
+    web.job_runner.run_forever()
+
+
+if __name__ == '__main__':
+    main()